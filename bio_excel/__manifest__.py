@@ -16,6 +16,8 @@
              'security/res_groups.xml',
              'views/product_pricelist_views.xml',
              'views/stock_picking_views.xml',
+             'views/picking_export_profile_views.xml',
+             'data/picking_export_profile_data.xml',
              'wizard/export_bill_action.xml',
              'wizard/export_bill_wizard_views.xml',
              'wizard/pricelist_import_wizard_views.xml',
@@ -1,3 +1,5 @@
 from . import product_pricelist
 from . import stock_picking
-from . import mrp_production_schedule
\ No newline at end of file
+from . import mrp_production_schedule
+from . import picking_export_profile
+from . import product_supplierinfo
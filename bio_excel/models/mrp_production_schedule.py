@@ -1,5 +1,5 @@
-import base64
 import logging
+import tempfile
 from io import BytesIO
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
@@ -21,11 +21,14 @@ class MrpProductionSchedule(models.Model):
     excel_filename = fields.Char('Filename', readonly=True)
 
     @api.model
-    def action_export_product_demand(self, ids=None):
+    def action_export_product_demand(self, ids=None, indirect_only=False):
         """Export Product Demand data to Excel
 
         Args:
             ids: List of production schedule IDs to export
+            indirect_only: Only compute the indirect demand instead of the full
+                MPS state (see _export_product_demand_indirect_only), the file
+                is the same
         """
         _logger.info('Product Demand export called with IDs: %s', ids)
 
@@ -44,6 +47,9 @@ class MrpProductionSchedule(models.Model):
         if not production_schedule_ids:
             raise UserError(_('No production schedules found to export.'))
 
+        if indirect_only:
+            return self._action_download_product_demand(production_schedule_ids._export_product_demand_indirect_only())
+
         # Get computed state with indirect_demand_qty values
         try:
             production_schedule_states = production_schedule_ids.get_production_schedule_view_state()
@@ -198,15 +204,108 @@ class MrpProductionSchedule(models.Model):
         file_data = output.read()
         output.close()
 
-        # Encode file to base64
-        excel_file = base64.b64encode(file_data)
+        return self._action_download_product_demand(file_data)
+
+    def _export_product_demand_indirect_only(self):
+        """Build the Product Demand workbook from the indirect demand only
+
+        Only the propagation of the quantities to replenish through the BOMs
+        is computed (the actual demand, RFQ and previous years quantities of
+        the full MPS state are not read). The file has the same columns and
+        rows as action_export_product_demand: one column per period with
+        indirect demand and one row per production schedule, in the order of
+        the selection. The workbook is written in constant_memory mode to a
+        temporary file.
 
+        Returns:
+            bytes: content of the xlsx file
+        """
+        date_range = self.env.company._get_date_range()
+        indirect_demand_by_schedule = {
+            prod_schedule.id: indirect_demand
+            for prod_schedule, indirect_demand in self._get_indirect_demand_by_schedule(date_range)
+            if any(indirect_demand)
+        }
+        # Only the periods with indirect demand, as in the full export
+        period_indexes = [
+            index for index in range(len(date_range))
+            if any(indirect_demand[index] for indirect_demand in indirect_demand_by_schedule.values())
+        ]
+        if not period_indexes:
+            _logger.warning('No indirect demand data found for selected production schedules (IDs: %s)', self.ids)
+            raise UserError(_('No data to export. Selected production schedules have no Indirect Demand Forecast values.'))
+
+        with tempfile.TemporaryFile() as output:
+            workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+            worksheet = workbook.add_worksheet('Product Demand')
+
+            header_format = workbook.add_format({
+                'bold': True,
+                'bg_color': '#D3D3D3',
+                'border': 1,
+                'align': 'center',
+                'valign': 'vcenter'
+            })
+
+            data_format = workbook.add_format({
+                'border': 1,
+                'align': 'center',
+                'valign': 'vcenter'
+            })
+
+            number_format = workbook.add_format({
+                'border': 1,
+                'align': 'center',
+                'valign': 'vcenter',
+                'num_format': '#,##0.00'
+            })
+
+            date_format = workbook.add_format({
+                'border': 1,
+                'align': 'center',
+                'valign': 'vcenter',
+                'num_format': 'dd.mm.yyyy'
+            })
+
+            total_col = len(period_indexes) + 2
+            # Set column widths (before any row in constant_memory mode)
+            worksheet.set_column(0, 0, 20)  # Product Internal Reference
+            worksheet.set_column(1, 1, 30)  # Product Name
+            worksheet.set_column(2, total_col, 12)  # Date columns and Total
+
+            worksheet.write(0, 0, 'Product Internal Reference', header_format)
+            worksheet.write(0, 1, 'Product Name', header_format)
+            for col, index in enumerate(period_indexes, 2):
+                worksheet.write(0, col, date_range[index][0], date_format)
+            worksheet.write(0, total_col, 'Total', header_format)
+
+            row = 1
+            for prod_schedule in self:
+                indirect_demand = indirect_demand_by_schedule.get(prod_schedule.id)
+                # Skip the schedules without indirect demand
+                if not indirect_demand:
+                    continue
+                product = prod_schedule.product_id
+                worksheet.write(row, 0, product.default_code or '', data_format)
+                worksheet.write(row, 1, product.name or '', data_format)
+                for col, index in enumerate(period_indexes, 2):
+                    worksheet.write(row, col, indirect_demand[index], number_format)
+                worksheet.write(row, total_col, sum(indirect_demand), number_format)
+                row += 1
+
+            workbook.close()
+            output.seek(0)
+            return output.read()
+
+    @api.model
+    def _action_download_product_demand(self, file_data):
+        """Store the Product Demand file and return the action to download it"""
         # Create attachment for download
         filename = 'production_schedule_export.xlsx'
         attachment = self.env['ir.attachment'].create({
             'name': filename,
             'type': 'binary',
-            'datas': excel_file,
+            'raw': file_data,
             'res_model': 'mrp.production.schedule',
             'res_id': 0,
             'mimetype': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
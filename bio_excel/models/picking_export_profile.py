@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, tools
+
+
+class PickingExportProfile(models.Model):
+    _name = 'bio.picking.export.profile'
+    _description = 'Transfers Export Profile'
+    _order = 'sequence, id'
+
+    name = fields.Char(string='Name', required=True)
+    sequence = fields.Integer(string='Sequence', default=10)
+    active = fields.Boolean(default=True)
+    company_id = fields.Many2one(
+        'res.company', string='Company',
+        help='Company of the exported transfers, the profile is shared by all the companies when empty')
+    vendor_company_id = fields.Many2one(
+        'res.company', string='Vendor Codes Company',
+        help='The product codes are the vendor codes of this company, or the internal references when empty')
+    document_company = fields.Char(string='Company (firma)', required=True, default='Biosfera')
+    partner_code = fields.Char(string='Partner Code (kod kontrahenta)', required=True, default='Biosfera')
+    incoming_document_type = fields.Char(string='Receipt Document Type', default='PPM')
+    outgoing_document_type = fields.Char(string='Delivery Document Type', default='PWM')
+    warehouse_name = fields.Char(string='Warehouse (magazyn)', default='magazyn pruszków')
+
+    @api.model
+    def _get_default_profile(self, company=None):
+        """Profile of the company, or the first shared profile when the
+        company has none
+
+        Args:
+            company: res.company of the exported transfers, the current
+                company by default
+        """
+        company = company or self.env.company
+        profiles = self.search([('company_id', 'in', [company.id, False])])
+        return profiles.sorted(lambda profile: not profile.company_id)[:1]
+
+    @api.model
+    def _create_default_profile(self):
+        """Profile of the export to Biosfera Polska, with the vendor codes of
+        the company of the same name when it exists
+        """
+        if self.with_context(active_test=False).search_count([]):
+            return
+        name = 'Biosfera Polska sp. z o.o.'
+        vendor_company = self.env['res.company'].search([('name', '=', name)], limit=1)
+        self.create({
+            'name': name,
+            'vendor_company_id': vendor_company.id,
+        })
+
+    def _get_export_values(self):
+        """Plain values of the profile used to build the workbooks"""
+        self.ensure_one()
+        return {
+            'document_company': self.document_company,
+            'partner_code': self.partner_code,
+            'incoming_document_type': self.incoming_document_type or '',
+            'outgoing_document_type': self.outgoing_document_type or '',
+            'warehouse_name': self.warehouse_name or '',
+        }
+
+    def _get_vendor_codes(self, products):
+        """Vendor code of the products for the company of the profile
+
+        :return: dict product id -> vendor code, False without vendor code
+        """
+        self.ensure_one()
+        if not self.vendor_company_id:
+            return {}
+        code_by_template = self._get_vendor_code_map(self.vendor_company_id.id)
+        return {product.id: code_by_template.get(product.product_tmpl_id.id) for product in products}
+
+    @api.model
+    @tools.ormcache('company_id')
+    def _get_vendor_code_map(self, company_id):
+        """Vendor code of every product template for the company, built with
+        one query and kept until a vendor pricelist line changes
+
+        :return: dict template id -> vendor code of its first vendor line of
+            the company with a code (in the order of seller_ids)
+        """
+        code_by_template = {}
+        for seller in self.env['product.supplierinfo'].sudo().search_read([
+            ('company_id', '=', company_id),
+            ('product_code', '!=', False),
+        ], ['product_tmpl_id', 'product_code']):
+            code_by_template.setdefault(seller['product_tmpl_id'][0], seller['product_code'])
+        return code_by_template
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api
+
+# Fields of the vendor pricelist lines read by the vendor code map of the
+# transfers export profiles
+VENDOR_CODE_FIELDS = {'product_code', 'product_tmpl_id', 'product_id', 'company_id', 'partner_id', 'sequence', 'min_qty', 'price'}
+
+
+class SupplierInfo(models.Model):
+    _inherit = 'product.supplierinfo'
+
+    def _invalidate_vendor_code_map(self):
+        """Clear the vendor code map of the transfers export profiles, only
+        when a line with a vendor code is modified (the lines added by the
+        purchase orders have none)
+        """
+        if any(seller.product_code for seller in self):
+            self.env['bio.picking.export.profile'].clear_caches()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        sellers = super().create(vals_list)
+        sellers._invalidate_vendor_code_map()
+        return sellers
+
+    def write(self, vals):
+        if VENDOR_CODE_FIELDS & vals.keys():
+            # Before and after the write, for a code being added or removed.
+            self._invalidate_vendor_code_map()
+            res = super().write(vals)
+            self._invalidate_vendor_code_map()
+            return res
+        return super().write(vals)
+
+    def unlink(self):
+        self._invalidate_vendor_code_map()
+        return super().unlink()
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
-import base64
+import tempfile
 from io import BytesIO
 import xlsxwriter
 import zipfile
@@ -66,80 +66,113 @@ class StockPicking(models.Model):
             'atrybut #5',  # 50
         ]
 
-    def _kod_towaru__biosfera_polska_export_xls(self, move):
+    def _kod_towaru__biosfera_polska_export_xls(self, move, vendor_codes=None, profile=None):
         if not move.product_id:
             return ""
 
-        vendor_code = move.product_id.seller_ids.filtered(
-            lambda r: r.company_id.id == 6 and r.product_code
-        )[:1]
-
-        return vendor_code.product_code if vendor_code else move.product_id.default_code
+        if vendor_codes is None:
+            profile = profile or self.env['bio.picking.export.profile']._get_default_profile(move.company_id)
+            vendor_codes = profile._get_vendor_codes(move.product_id) if profile else {}
+        return vendor_codes.get(move.product_id.id) or move.product_id.default_code
+
+    def _data_biosfera_polska_export_xls(self, profile):
+        """Read the data of all the pickings in one pass
+
+        :return: list of dict with the file name and the rows of each picking,
+            only made of plain Python values
+        """
+        moves = self.move_ids_without_package
+        vendor_codes = profile._get_vendor_codes(moves.product_id)
+        pickings_data = []
+        for picking in self:
+            date_str = picking.scheduled_date.strftime('%d-%m-%Y') if picking.scheduled_date else ''
+            pickings_data.append({
+                'name': picking.name,
+                'picking_type_code': picking.picking_type_code,
+                'filename': f'{picking.name.replace("/", "-")}_{date_str}.xlsx',
+                'rows': [
+                    (self._kod_towaru__biosfera_polska_export_xls(move, vendor_codes), move.quantity_done)
+                    for move in picking.move_ids_without_package
+                ],
+            })
+        return pickings_data
+
+    @api.model
+    def _render_biosfera_polska_export_xls(self, headers, profile_values, picking_data):
+        """Build the workbook of a picking from the plain data of
+        _data_biosfera_polska_export_xls.
+        """
+        format_green = {'bold': True, 'align': 'left', 'valign': 'vcenter', 'bg_color': '#C6EFCE'}
+        format_yellow = {'bold': True, 'align': 'left', 'valign': 'vcenter', 'bg_color': '#FFEB9C'}
+        yellow_cell = (0, 3, 4, 8, 10, 17, 18, 20)
 
-    def action_biosfera_polska_export_xls(self):
+        # Створюємо Excel для кожного picking
+        output = BytesIO()
+        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+        header_format_green = workbook.add_format(format_green)
+        header_format_yellow = workbook.add_format(format_yellow)
+        worksheet = workbook.add_worksheet('dokumenty_import')
+        worksheet.set_column(0, len(headers) - 1, 30.13)
+
+        for col, header in enumerate(headers):
+            if col in yellow_cell:
+                worksheet.write(0, col, header, header_format_yellow)
+            else:
+                worksheet.write(0, col, header, header_format_green)
+
+        # Записуємо назви товарів
+        row = 1
+        for product_code, quantity_done in picking_data['rows']:
+            worksheet.write(row, 0, profile_values['document_company'])
+            if picking_data['picking_type_code'] == 'incoming':
+                worksheet.write(row, 3, profile_values['incoming_document_type'])
+            elif picking_data['picking_type_code'] == 'outgoing':
+                worksheet.write(row, 3, profile_values['outgoing_document_type'])
+            worksheet.write(row, 4, picking_data['name'])
+            worksheet.write(row, 8, profile_values['warehouse_name'])
+            # worksheet.write(row, 10, picking.partner_id.name if picking.partner_id else "")
+            worksheet.write(row, 10, profile_values['partner_code'])
+            worksheet.write(row, 17, row)
+            worksheet.write(row, 18, product_code)
+            worksheet.write(row, 20, quantity_done)
+
+            row += 1
+
+        workbook.close()
+        return output.getvalue()
+
+    def action_biosfera_polska_export_xls(self, profile=None):
         if not self:
             raise UserError(_('No document selected'))
 
-        # Створюємо ZIP архів
-        zip_output = BytesIO()
-
-        format_green = {'bold': True, 'align': 'left', 'valign': 'vcenter', 'bg_color': '#C6EFCE'}
-        format_yellow = {'bold': True, 'align': 'left', 'valign': 'vcenter', 'bg_color': '#FFEB9C'}
+        if not profile:
+            if len(self.company_id) > 1:
+                raise UserError(_('Select the transfers of a single company.'))
+            profile = self.env['bio.picking.export.profile']._get_default_profile(self.company_id)
+        if not profile:
+            raise UserError(_('No transfers export profile is configured for %s.', self.company_id.name))
         headers = self._headers_biosfera_polska_export_xls()
-        yellow_cell = (0, 3, 4, 8, 10, 17, 18, 20)
-
-        with zipfile.ZipFile(zip_output, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for picking in self:
-                # Створюємо Excel для кожного picking
-                output = BytesIO()
-                workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-                header_format_green = workbook.add_format(format_green)
-                header_format_yellow = workbook.add_format(format_yellow)
-                worksheet = workbook.add_worksheet('dokumenty_import')
-                worksheet.set_column(0, len(headers) - 1, 30.13)
-
-                for col, header in enumerate(headers):
-                    if col in yellow_cell:
-                        worksheet.write(0, col, header, header_format_yellow)
-                    else:
-                        worksheet.write(0, col, header, header_format_green)
-
-                # Записуємо назви товарів
-                row = 1
-                for move in picking.move_ids_without_package:
-                    worksheet.write(row, 0, "Biosfera")
-                    if picking.picking_type_code == 'incoming':
-                        worksheet.write(row, 3, "PPM")
-                    elif picking.picking_type_code == 'outgoing':
-                        worksheet.write(row, 3, "PWM")
-                    worksheet.write(row, 4, picking.name)
-                    worksheet.write(row, 8, "magazyn pruszków")
-                    # worksheet.write(row, 10, picking.partner_id.name if picking.partner_id else "")
-                    worksheet.write(row, 10, "Biosfera")
-                    worksheet.write(row, 17, row)
-                    worksheet.write(row, 18, self._kod_towaru__biosfera_polska_export_xls(move))
-                    worksheet.write(row, 20, move.quantity_done)
-
-                    row += 1
-
-                workbook.close()
-                output.seek(0)
-
-                # Назва файлу
-                date_str = picking.scheduled_date.strftime('%d-%m-%Y') if picking.scheduled_date else ''
-                filename = f'{picking.name.replace("/", "-")}_{date_str}.xlsx'
-
-                # Додаємо до ZIP
-                zip_file.writestr(filename, output.getvalue())
-
-        zip_output.seek(0)
-
-        # Створюємо attachment для ZIP
-        attachment = self.env['ir.attachment'].create({
-            'name': f'transfers_export_{fields.Date.today().strftime("%d-%m-%Y")}.zip',
-            'datas': base64.b64encode(zip_output.getvalue()),
-            'mimetype': 'application/zip'
-        })
+        pickings_data = self._data_biosfera_polska_export_xls(profile)
+
+        # Створюємо ZIP архів у тимчасовому файлі. Each workbook is added to
+        # the ZIP as soon as it is built, only one of them is kept in memory.
+        profile_values = profile._get_export_values()
+        with tempfile.TemporaryFile() as zip_output:
+            with zipfile.ZipFile(zip_output, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+                for picking_data in pickings_data:
+                    workbook_data = self._render_biosfera_polska_export_xls(headers, profile_values, picking_data)
+                    # Додаємо до ZIP
+                    zip_file.writestr(picking_data['filename'], workbook_data)
+
+            zip_output.seek(0)
+
+            # Створюємо attachment для ZIP. The attachment needs the content
+            # of the whole ZIP, it is read back in memory once.
+            attachment = self.env['ir.attachment'].create({
+                'name': f'transfers_export_{fields.Date.today().strftime("%d-%m-%Y")}.zip',
+                'raw': zip_output.read(),
+                'mimetype': 'application/zip'
+            })
 
         return {
             'type': 'ir.actions.act_url',
@@ -69,12 +69,13 @@ patch(MrpMpsControlPanel.prototype, 'bio_excel.MrpMpsControlPanel', {
             // Get context from props (similar to onExportData in original MPS code)
             const context = this.props.context || {};
 
-            // Call export method with selected IDs
+            // Call export method with selected IDs, only the indirect demand
+            // is exported so the full MPS state is not computed
             const action = await orm.call(
                 'mrp.production.schedule',
                 'action_export_product_demand',
                 [selectedIds],
-                { context: context }
+                { indirect_only: true, context: context }
             );
 
             if (action && action.url) {
@@ -0,0 +1 @@
+from . import spreadsheet_reader
@@ -0,0 +1,121 @@
+import base64
+import io
+import mmap
+import tempfile
+from datetime import datetime
+
+# Try to import Excel parsing libraries
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+try:
+    import xlrd
+    from xlrd import xldate
+except ImportError:
+    xlrd = None
+
+XLSX_SIGNATURE = b'PK\x03\x04'
+# Number of base64 characters decoded at once, a multiple of 4
+DECODE_CHUNK_SIZE = 4 * 256 * 1024
+
+
+class SpreadsheetReaderError(Exception):
+    """Raised when the file cannot be read, with a message for the user"""
+
+
+def decode_to_tempfile(encoded_data):
+    """Decode a base64 upload into a temporary file, chunk by chunk, so the
+    decoded content is not held in memory next to the encoded one
+
+    Args:
+        encoded_data: base64 content of the file (bytes or str)
+
+    Returns:
+        file: temporary binary file, at its beginning, removed when closed
+    """
+    if isinstance(encoded_data, str):
+        encoded_data = encoded_data.encode()
+    if b'\n' in encoded_data:
+        # Line breaks would shift the chunks off the 4 characters boundaries
+        encoded_data = b''.join(encoded_data.split())
+    temp_file = tempfile.TemporaryFile()
+    try:
+        for start in range(0, len(encoded_data), DECODE_CHUNK_SIZE):
+            temp_file.write(base64.b64decode(encoded_data[start:start + DECODE_CHUNK_SIZE]))
+        temp_file.seek(0)
+    except Exception:
+        temp_file.close()
+        raise
+    return temp_file
+
+
+def iter_sheet_rows(file_data):
+    """Yield the rows of the first sheet of a .xlsx or .xls file one by one
+
+    The .xlsx files are read with openpyxl in read-only mode, so the rows are
+    parsed while they are consumed instead of loading the whole workbook. The
+    .xls files are read with xlrd, loading the sheets on demand.
+
+    Empty cells are returned as '' and dates as datetime for both formats.
+
+    Args:
+        file_data: content of the file (bytes) or binary file object, as
+            returned by decode_to_tempfile
+
+    Yields:
+        list: values of the row, row by row
+    """
+    if not isinstance(file_data, (bytes, bytearray)):
+        signature = file_data.read(4)
+        file_data.seek(0)
+    else:
+        signature = file_data[:4]
+    if signature == XLSX_SIGNATURE:
+        rows = _iter_xlsx_rows(file_data)
+    else:
+        rows = _iter_xls_rows(file_data)
+    yield from rows
+
+
+def _iter_xlsx_rows(file_data):
+    if not openpyxl:
+        raise SpreadsheetReaderError('Python library "openpyxl" is not installed. Please install it: pip install openpyxl')
+    try:
+        if isinstance(file_data, (bytes, bytearray)):
+            file_data = io.BytesIO(file_data)
+        workbook = openpyxl.load_workbook(file_data, read_only=True, data_only=True)
+    except Exception as e:
+        raise SpreadsheetReaderError('Error parsing Excel file with openpyxl: %s' % str(e))
+    try:
+        worksheet = workbook.worksheets[0]
+        for row in worksheet.iter_rows(values_only=True):
+            yield ['' if value is None else value for value in row]
+    finally:
+        workbook.close()
+
+
+def _iter_xls_rows(file_data):
+    if not xlrd:
+        raise SpreadsheetReaderError('Python library "xlrd" is not installed. Please install it: pip install xlrd')
+    try:
+        if not isinstance(file_data, (bytes, bytearray)):
+            # Mapped as xlrd does for the files opened by name
+            file_data = mmap.mmap(file_data.fileno(), 0, access=mmap.ACCESS_READ)
+        workbook = xlrd.open_workbook(file_contents=file_data, on_demand=True)
+        sheet = workbook.sheet_by_index(0)
+    except Exception as e:
+        raise SpreadsheetReaderError('Error parsing Excel file with xlrd: %s' % str(e))
+    try:
+        for row_idx in range(sheet.nrows):
+            values = sheet.row_values(row_idx)
+            for col_idx, cell_type in enumerate(sheet.row_types(row_idx)):
+                if cell_type == xlrd.XL_CELL_DATE:
+                    try:
+                        values[col_idx] = datetime(*xldate.xldate_as_tuple(values[col_idx], workbook.datemode))
+                    except xldate.XLDateError:
+                        continue
+            yield values
+    finally:
+        workbook.release_resources()
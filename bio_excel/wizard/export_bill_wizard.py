@@ -1,10 +1,12 @@
-import io
-import base64
+import tempfile
 import xlsxwriter
 from datetime import datetime
 
 from odoo import models, fields, api
 
+# Number of bills of which the lines are read at once by the export
+EXPORT_CHUNK_SIZE = 200
+
 
 class ExportBillWizard(models.TransientModel):
     _name = 'bio.export.bill.wizard'
@@ -12,51 +14,90 @@ class ExportBillWizard(models.TransientModel):
 
     move_ids = fields.Many2many('account.move', string='Bills')
 
+    def _iter_export_lines(self):
+        """Read the invoice lines of the bills by chunks of EXPORT_CHUNK_SIZE
+        bills, with only the exported columns
+
+        Yields:
+            tuple: (move values, line values, product values) as plain dicts,
+                in the order of the bills and of their invoice lines
+        """
+        AccountMoveLine = self.env['account.move.line']
+        Product = self.env['product.product']
+        move_ids = self.move_ids.ids
+        for start in range(0, len(move_ids), EXPORT_CHUNK_SIZE):
+            chunk_ids = move_ids[start:start + EXPORT_CHUNK_SIZE]
+            moves = self.env['account.move'].browse(chunk_ids).read(
+                ['name', 'date_of_receipt_by_buyer', 'invoice_date'])
+            lines = AccountMoveLine.search_read([
+                ('move_id', 'in', chunk_ids),
+                ('display_type', 'in', ('product', 'line_section', 'line_note')),
+            ], ['move_id', 'product_id', 'quantity', 'product_uom_id', 'debit', 'price_subtotal', 'currency_id'])
+            product_ids = list({line['product_id'][0] for line in lines if line['product_id']})
+            products = {product['id']: product for product in Product.browse(product_ids).read(['default_code', 'name'])}
+
+            lines_by_move = {}
+            for line in lines:
+                lines_by_move.setdefault(line['move_id'][0], []).append(line)
+            for move in moves:
+                for line in lines_by_move.get(move['id'], []):
+                    product = products.get(line['product_id'] and line['product_id'][0], {})
+                    yield move, line, product
+            # Free the cache before the next chunk
+            self.env.invalidate_all()
+
     def action_export_excel(self):
         self.ensure_one()
 
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output)
-        worksheet = workbook.add_worksheet()
-
-        header_format = workbook.add_format({'bold': True, 'align': 'center', 'valign': 'vcenter'})
-
-        headers = [
-            'Vendor bill number', 'Date of receipt by buyer',
-            'Vendor Bill date', 'Internal Reference',
-            'Product name', 'PCS', 'UOM',
-            'EUR/HUF', 'EUR', 'HUF', 'Exchange rate'
-        ]
-
-        for col, header in enumerate(headers):
-            worksheet.write(0, col, header, header_format)
-
-        row = 1
-        for move in self.move_ids:
-            for line in move.invoice_line_ids:
-                worksheet.write(row, 0, move.name)
-                worksheet.write(row, 1, str(move.date_of_receipt_by_buyer or ''))
-                worksheet.write(row, 2, str(move.invoice_date or ''))
-                worksheet.write(row, 3, line.product_id.default_code or '')
-                worksheet.write(row, 4, line.product_id.name or '')
-                worksheet.write(row, 5, line.quantity)
-                worksheet.write(row, 6, line.product_uom_id.name or '')
-                worksheet.write(row, 7, line.debit/line.quantity if line.quantity != 0 and line.currency_id.name == 'EUR' else 0)  # EUR/HUF
-                worksheet.write(row, 8, line.price_subtotal if line.currency_id.name == 'EUR' else 0)  # EUR
-                worksheet.write(row, 9, line.price_subtotal if line.currency_id.name == 'HUF' else line.debit)  # HUF
-                worksheet.write(row, 10, line.debit/line.price_subtotal if line.price_subtotal != 0 else 1) #'Exchange rate'
+        # constant_memory: every row is flushed to a temporary file as soon as
+        # the next one is written, so the rows are not held in memory while
+        # the workbook is built. The attachment needs the whole file, it is
+        # read back in memory once at the end.
+        with tempfile.TemporaryFile() as output:
+            workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+            worksheet = workbook.add_worksheet()
+
+            header_format = workbook.add_format({'bold': True, 'align': 'center', 'valign': 'vcenter'})
+
+            headers = [
+                'Vendor bill number', 'Date of receipt by buyer',
+                'Vendor Bill date', 'Internal Reference',
+                'Product name', 'PCS', 'UOM',
+                'EUR/HUF', 'EUR', 'HUF', 'Exchange rate'
+            ]
+
+            for col, header in enumerate(headers):
+                worksheet.write(0, col, header, header_format)
+
+            row = 1
+            for move, line, product in self._iter_export_lines():
+                currency = line['currency_id'] and line['currency_id'][1]
+                quantity = line['quantity']
+                debit = line['debit']
+                price_subtotal = line['price_subtotal']
+                worksheet.write(row, 0, move['name'])
+                worksheet.write(row, 1, str(move['date_of_receipt_by_buyer'] or ''))
+                worksheet.write(row, 2, str(move['invoice_date'] or ''))
+                worksheet.write(row, 3, product.get('default_code') or '')
+                worksheet.write(row, 4, product.get('name') or '')
+                worksheet.write(row, 5, quantity)
+                worksheet.write(row, 6, line['product_uom_id'] and line['product_uom_id'][1] or '')
+                worksheet.write(row, 7, debit/quantity if quantity != 0 and currency == 'EUR' else 0)  # EUR/HUF
+                worksheet.write(row, 8, price_subtotal if currency == 'EUR' else 0)  # EUR
+                worksheet.write(row, 9, price_subtotal if currency == 'HUF' else debit)  # HUF
+                worksheet.write(row, 10, debit/price_subtotal if price_subtotal != 0 else 1) #'Exchange rate'
                 row += 1
 
-        workbook.close()
-        output.seek(0)
+            workbook.close()
+            output.seek(0)
 
-        filename = f'bill_export_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.xlsx'
-        attachment = self.env['ir.attachment'].create({
-            'name': filename,
-            'type': 'binary',
-            'datas': base64.b64encode(output.read()),
-            'mimetype': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        })
+            filename = f'bill_export_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.xlsx'
+            attachment = self.env['ir.attachment'].create({
+                'name': filename,
+                'type': 'binary',
+                'raw': output.read(),
+                'mimetype': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            })
 
         return {
             'type': 'ir.actions.act_url',
@@ -1,15 +1,13 @@
-import base64
-import io
-from datetime import datetime
+from datetime import date, datetime
+from itertools import islice
 from odoo import fields, models, _, api
 from odoo.exceptions import UserError
 
-# Try to import Excel parsing library
-try:
-    import xlrd
-    from xlrd import xldate
-except ImportError:
-    xlrd = None
+from ..tools.spreadsheet_reader import SpreadsheetReaderError, decode_to_tempfile, iter_sheet_rows
+
+# Number of rows of the file whose products and BOMs are searched together,
+# and of wizard lines created at once
+IMPORT_CHUNK_SIZE = 1000
 
 
 class MrpProductionSheduleImportWizard(models.TransientModel):
@@ -53,6 +51,16 @@ class MrpProductionSheduleImportWizard(models.TransientModel):
         help='Column number where dates start (A=0, B=1, C=2, etc.)')
 
     # Import options
+    direct_import = fields.Boolean(
+        string='Direct Import',
+        help='Validate the Excel file without creating a line for each cell: only a summary is '
+             'displayed and the forecasts are imported directly from the file. The lines in error '
+             'can still be displayed on demand.')
+    is_parsed = fields.Boolean(string='Parsed', readonly=True)
+    ready_count = fields.Integer(string='Ready For Import', readonly=True)
+    product_not_found_count = fields.Integer(string='Product Not Found', readonly=True)
+    bill_not_found_count = fields.Integer(string='BOM Not Found', readonly=True)
+    summary = fields.Text(string='Summary', readonly=True)
     set_replenish_equal_forecast = fields.Boolean(
         string='Suggested Replenishment = Forecasted Demand',
         default=True,
@@ -89,29 +97,46 @@ class MrpProductionSheduleImportWizard(models.TransientModel):
         """Parse Excel file and create wizard lines"""
         self.ensure_one()
 
-        if not self.excel_file:
-            raise UserError(_('Please upload an Excel file.'))
-
-        if not xlrd:
-            raise UserError(_('Python library "xlrd" is not installed. Please install it: pip install xlrd'))
-
-        # Decode the file
-        try:
-            file_data = base64.b64decode(self.excel_file)
-        except Exception as e:
-            raise UserError(_('Error reading file: %s') % str(e))
-
         # Clear existing lines
         self.line_ids.unlink()
 
-        # Parse Excel file using xlrd
-        date_columns, lines_to_create = self._parse_excel_xlrd(file_data)
+        lines_values = self._parse_excel_file()
 
-        # Create lines
-        if lines_to_create:
-            self.env['bio.mrp.production.schedule.lines.import.wizard'].create(lines_to_create)
+        if self.direct_import:
+            # Only keep a summary, the file is parsed again at import
+            self.write(self._get_summary_values(lines_values))
+        elif self._create_lines(lines_values):
+            self.is_parsed = True
 
         # Return view with lines
+        return self._action_reopen()
+
+    def action_show_error_lines(self):
+        """Create the lines in error of a direct import in order to review them"""
+        self.ensure_one()
+        self.line_ids.unlink()
+        self._create_lines(
+            line_vals for line_vals in self._parse_excel_file() if line_vals['state'] != 'ready_for_import'
+        )
+        return self._action_reopen()
+
+    def _create_lines(self, lines_values):
+        """Create the wizard lines by chunks of IMPORT_CHUNK_SIZE lines
+
+        Returns:
+            int: number of lines created
+        """
+        lines_values = iter(lines_values)
+        count = 0
+        while True:
+            chunk = list(islice(lines_values, IMPORT_CHUNK_SIZE))
+            if not chunk:
+                break
+            self.env['bio.mrp.production.schedule.lines.import.wizard'].create(chunk)
+            count += len(chunk)
+        return count
+
+    def _action_reopen(self):
         return {
             'type': 'ir.actions.act_window',
             'res_model': 'bio.mrp.production.schedule.import.wizard',
@@ -120,23 +145,76 @@ class MrpProductionSheduleImportWizard(models.TransientModel):
             'target': 'new',
         }
 
-    def _parse_excel_xlrd(self, file_data):
-        """Parse Excel file using xlrd library (.xls format)"""
+    def _parse_excel_file(self):
+        """Decode the Excel file into a temporary file and parse it
+
+        Yields:
+            dict: values of the lines, chunk of rows by chunk of rows
+        """
+        if not self.excel_file:
+            raise UserError(_('Please upload an Excel file.'))
+
+        # Decode the file
         try:
-            workbook = xlrd.open_workbook(file_contents=file_data)
-            sheet = workbook.sheet_by_index(0)
+            file_data = decode_to_tempfile(self.excel_file)
         except Exception as e:
-            raise UserError(_('Error parsing Excel file with xlrd: %s') % str(e))
+            raise UserError(_('Error reading file: %s') % str(e))
+
+        # Parse Excel file (.xlsx or .xls) row by row
+        with file_data:
+            try:
+                yield from self._parse_excel(iter_sheet_rows(file_data))
+            except SpreadsheetReaderError as e:
+                raise UserError(str(e))
+
+    def _get_summary_values(self, lines_values, sample_size=20):
+        """Count the lines by state and list a sample of the product codes in error"""
+        counts = dict.fromkeys(['ready_for_import', 'product_not_found', 'bill_not_found'], 0)
+        failing_codes = {}
+        for line_vals in lines_values:
+            counts[line_vals['state']] = counts.get(line_vals['state'], 0) + 1
+            if line_vals['state'] != 'ready_for_import':
+                codes = failing_codes.setdefault(line_vals['state'], [])
+                if len(codes) < sample_size and line_vals['default_code'] not in codes:
+                    codes.append(line_vals['default_code'])
+
+        state_labels = dict(self.env['bio.mrp.production.schedule.lines.import.wizard']._fields['state']._description_selection(self.env))
+        summary = [_('%s: %d line(s)') % (state_labels[state], count) for state, count in counts.items() if count]
+        for state, codes in failing_codes.items():
+            summary.append(_('%s (sample): %s') % (state_labels[state], ', '.join(codes)))
+        return {
+            'is_parsed': True,
+            'ready_count': counts['ready_for_import'],
+            'product_not_found_count': counts['product_not_found'],
+            'bill_not_found_count': counts['bill_not_found'],
+            'summary': '\n'.join(summary),
+        }
+
+    def _parse_excel(self, sheet_rows):
+        """Parse the rows of the Excel file, consumed one by one
+
+        The data rows are processed by chunks of IMPORT_CHUNK_SIZE rows, whose
+        products and BOMs are searched together.
+
+        Args:
+            sheet_rows: iterator on the rows of the sheet (see iter_sheet_rows)
 
+        Yields:
+            dict: values of the lines, one by date column of each row
+        """
+        sheet_rows = iter(sheet_rows)
         # Convert header row number from 1-based to 0-based index
         header_row_idx = self.header_row_number - 1
 
         # Parse header row (dates)
-        if sheet.nrows < header_row_idx + 1:
+        header_row = None
+        for row_idx, row in enumerate(sheet_rows):
+            if row_idx == header_row_idx:
+                header_row = row
+                break
+        if header_row is None:
             raise UserError(_('Excel file does not have enough rows. Header row %d not found.') % self.header_row_number)
 
-        header_row = sheet.row_values(header_row_idx)
-
         # Extract dates from header starting from configured column
         date_columns = []
         for col_idx in range(self.first_date_column-1, len(header_row)):
@@ -144,36 +222,46 @@ class MrpProductionSheduleImportWizard(models.TransientModel):
             if cell_value:
                 try:
                     forecast_date = None
-                    # Check if it's a date number (xlrd stores dates as float)
-                    if isinstance(cell_value, float):
-                        # Convert Excel date number to Python date
-                        date_tuple = xldate.xldate_as_tuple(cell_value, workbook.datemode)
-                        forecast_date = datetime(*date_tuple).date()
+                    # Dates cells are read as datetime
+                    if isinstance(cell_value, datetime):
+                        forecast_date = cell_value.date()
+                    elif isinstance(cell_value, date):
+                        forecast_date = cell_value
                     elif isinstance(cell_value, str):
                         # Try to parse date from DD.MM.YYYY format
                         forecast_date = datetime.strptime(cell_value.strip(), '%d.%m.%Y').date()
 
                     if forecast_date:
                         date_columns.append((col_idx, forecast_date))
-                except (ValueError, xlrd.xldate.XLDateError):
+                except ValueError:
                     # Skip invalid dates
                     continue
 
         if not date_columns:
             raise UserError(_('No valid dates found in header row %d starting from column %d. Expected format: DD.MM.YYYY (e.g., 01.12.2025)') % (self.header_row_number, self.first_date_column))
 
-        # Parse data rows (starting from row after header)
-        lines_to_create = []
-        for row_idx in range(header_row_idx + 1, sheet.nrows):
-            row = sheet.row_values(row_idx)
+        rows = self._parse_data_rows(sheet_rows, date_columns)
+        while True:
+            chunk = list(islice(rows, IMPORT_CHUNK_SIZE))
+            if not chunk:
+                break
+            yield from self._get_lines_values(chunk)
 
+    def _parse_data_rows(self, sheet_rows, date_columns):
+        """Parse the data rows (starting from row after header), only keeping
+        the positive quantities of each row
+
+        Yields:
+            tuple: (default code, list of (date, quantity))
+        """
+        for row in sheet_rows:
             # Get values from configured columns
             default_code = row[self.default_code_column-1] if self.default_code_column-1 < len(row) else None
 
             if not default_code:
                 continue  # Skip empty rows
 
-            if self.manufacturing_period == 'month' and not row[5]:
+            if self.manufacturing_period == 'month' and (len(row) <= 5 or not row[5]):
                 continue
 
             if default_code == "vendor code":
@@ -185,10 +273,7 @@ class MrpProductionSheduleImportWizard(models.TransientModel):
             else:
                 default_code = str(default_code).strip()
 
-            # Find product by default_code
-            product = self.env['product.product'].search([('default_code', '=', default_code)], limit=1)
-
-            # Create line for each date column
+            quantities = []
             for col_idx, forecast_date in date_columns:
                 qty = row[col_idx] if col_idx < len(row) else 0
 
@@ -203,67 +288,126 @@ class MrpProductionSheduleImportWizard(models.TransientModel):
 
                 if forecast_qty <= 0:
                     continue
+                quantities.append((forecast_date, forecast_qty))
+            yield default_code, quantities
 
+    def _get_lines_values(self, rows):
+        """Values of the lines of a chunk of parsed rows
+
+        Yields:
+            dict: values of the lines, one by date column of each row
+        """
+        # Find all the products and their BOM of the chunk at once, the date
+        # columns of a row reuse them
+        products_by_code = self._find_products_by_code({default_code for default_code, quantities in rows})
+        boms_by_product, bom_counts = self._find_boms(self.env['product.product'].concat(*products_by_code.values()))
+
+        for default_code, quantities in rows:
+            product = products_by_code.get(default_code, self.env['product.product'])
+            if product:
+                bom = boms_by_product.get(product)
+                if bom:
+                    product_vals = {
+                        'product_id': product.id,
+                        'bom_id': bom.id,
+                        'state': 'ready_for_import',
+                        'message': _('Product and BOM found'),
+                    }
+                else:
+                    product_vals = {
+                        'product_id': product.id,
+                        'state': 'bill_not_found',
+                        'message': _('BOM not found for product "%s" (template has %d BOMs total)') % (default_code, bom_counts.get(product.product_tmpl_id.id, 0)),
+                    }
+            else:
+                product_vals = {
+                    'state': 'product_not_found',
+                    'message': _('Product with code "%s" not found in database') % default_code,
+                }
+
+            # Create line for each date column
+            for forecast_date, forecast_qty in quantities:
                 line_vals = {
                     'bio_mrp_production_schedule_wizard_id': self.id,
                     'default_code': default_code,
                     'forecast_date': forecast_date,
                     'forecast_qty': forecast_qty,
                 }
+                line_vals.update(product_vals)
+                yield line_vals
 
-                if product:
-                    # Search for BOM - try multiple approaches to maximize compatibility
-                    bom = False
-
-                    # Approach 1: Most specific - with company and product variant
-                    if self.warehouse_id.company_id:
-                        bom = self.env['mrp.bom'].search([
-                            ('product_tmpl_id', '=', product.product_tmpl_id.id),
-                            '|', ('product_id', '=', product.id), ('product_id', '=', False),
-                            ('type', '=', 'normal'),
-                            '|', ('company_id', '=', self.warehouse_id.company_id.id), ('company_id', '=', False)
-                        ], order='product_id DESC, company_id DESC', limit=1)
-
-                    # Approach 2: Without company filter
-                    if not bom:
-                        bom = self.env['mrp.bom'].search([
-                            ('product_tmpl_id', '=', product.product_tmpl_id.id),
-                            '|', ('product_id', '=', product.id), ('product_id', '=', False),
-                            ('type', '=', 'normal'),
-                        ], order='product_id DESC', limit=1)
-
-                    # Approach 3: Simplest - just by template and type (last resort)
-                    if not bom:
-                        bom = self.env['mrp.bom'].search([
-                            ('product_tmpl_id', '=', product.product_tmpl_id.id),
-                            ('type', '=', 'normal'),
-                        ], limit=1)
-
-                    if bom:
-                        line_vals.update({
-                            'product_id': product.id,
-                            'bom_id': bom.id,
-                            'state': 'ready_for_import',
-                            'message': _('Product and BOM found'),
-                        })
-                    else:
-                        # Count total BOMs for debugging
-                        total_boms = self.env['mrp.bom'].search_count([
-                            ('product_tmpl_id', '=', product.product_tmpl_id.id),
-                        ])
-                        line_vals.update({
-                            'product_id': product.id,
-                            'state': 'bill_not_found',
-                            'message': _('BOM not found for product "%s" (template has %d BOMs total)') % (default_code, total_boms),
-                        })
-                else:
-                    line_vals.update({
-                        'state': 'product_not_found',
-                        'message': _('Product with code "%s" not found in database') % default_code,
-                    })
-                lines_to_create.append(line_vals)
+    def _find_products_by_code(self, default_codes):
+        """Find the products of all the default codes in one search
 
-        return date_columns, lines_to_create
+        Returns:
+            dict: default_code -> product.product, the first one in the default
+            order when several products share a code
+        """
+        products_by_code = {}
+        if not default_codes:
+            return products_by_code
+        for product in self.env['product.product'].search([('default_code', 'in', list(default_codes))]):
+            products_by_code.setdefault(product.default_code, product)
+        return products_by_code
+
+    def _find_boms(self, products):
+        """Find the BOM of each product with one search for all the templates
+
+        The BOM is chosen in the same order as the former searches by product:
+        1. BOM of the variant or the template, for the warehouse company or
+           without company (template and no company BOMs first, as sorted by
+           "product_id DESC, company_id DESC")
+        2. BOM of the variant or the template in any company
+        3. any BOM of the template
+
+        Returns:
+            tuple: (dict product.product -> mrp.bom, dict template id -> number
+            of BOMs of any type, for the templates without BOM found)
+        """
+        boms_by_product = {}
+        if not products:
+            return boms_by_product, {}
+        boms_by_template = {}
+        for bom in self.env['mrp.bom'].search([
+            ('product_tmpl_id', 'in', products.product_tmpl_id.ids),
+            ('type', '=', 'normal'),
+        ]):
+            boms_by_template.setdefault(bom.product_tmpl_id.id, []).append(bom)
+
+        company = self.warehouse_id.company_id
+        for product in products:
+            template_boms = boms_by_template.get(product.product_tmpl_id.id, [])
+            product_boms = [bom for bom in template_boms if bom.product_id in (product, self.env['product.product'])]
+            bom = False
+
+            # Approach 1: Most specific - with company and product variant
+            if company:
+                company_boms = [bom for bom in product_boms if bom.company_id in (company, self.env['res.company'])]
+                company_boms.sort(key=lambda bom: (bool(bom.product_id), bool(bom.company_id)))
+                bom = company_boms and company_boms[0]
+
+            # Approach 2: Without company filter
+            if not bom:
+                product_boms.sort(key=lambda bom: bool(bom.product_id))
+                bom = product_boms and product_boms[0]
+
+            # Approach 3: Simplest - just by template and type (last resort)
+            if not bom:
+                bom = template_boms and template_boms[0]
+
+            if bom:
+                boms_by_product[product] = bom
+
+        # Count total BOMs for debugging
+        templates_without_bom = products.filtered(lambda p: p not in boms_by_product).product_tmpl_id
+        bom_counts = {}
+        if templates_without_bom:
+            bom_counts = {
+                group['product_tmpl_id'][0]: group['product_tmpl_id_count']
+                for group in self.env['mrp.bom'].read_group(
+                    [('product_tmpl_id', 'in', templates_without_bom.ids)], ['product_tmpl_id'], ['product_tmpl_id'])
+            }
+        return boms_by_product, bom_counts
 
     def _set_replenish_equal_forecast_with_indirect_demand(self, production_schedules):
         """Set replenish_qty = forecast_qty + indirect_demand_qty for imported schedules
@@ -372,71 +516,111 @@ class MrpProductionSheduleImportWizard(models.TransientModel):
         """Import validated lines to mrp.production.schedule"""
         self.ensure_one()
 
-        lines_to_import = self.line_ids.filtered(lambda l: l.state == 'ready_for_import')
-
-        if not lines_to_import:
+        if self.direct_import:
+            # Import straight from the file, without wizard lines
+            lines_to_import = self.env['bio.mrp.production.schedule.lines.import.wizard']
+            values_to_import = [
+                line_vals for line_vals in self._parse_excel_file() if line_vals['state'] == 'ready_for_import'
+            ]
+        else:
+            lines_to_import = self.line_ids.filtered(lambda l: l.state == 'ready_for_import')
+            values_to_import = [{
+                'product_id': line.product_id.id,
+                'bom_id': line.bom_id.id,
+                'forecast_date': line.forecast_date,
+                'forecast_qty': line.forecast_qty,
+            } for line in lines_to_import]
+
+        if not values_to_import:
             raise UserError(_('No valid lines to import. Please upload and validate Excel file first.'))
 
         # Group lines by (product, BOM) to handle cases where BOM.product_id might be False
         lines_by_product_bom = {}
-        for line in lines_to_import:
-            key = (line.product_id, line.bom_id)
+        for line_vals in values_to_import:
+            key = (self.env['product.product'].browse(line_vals['product_id']), self.env['mrp.bom'].browse(line_vals['bom_id']))
             if key not in lines_by_product_bom:
                 lines_by_product_bom[key] = []
-            lines_by_product_bom[key].append(line)
+            lines_by_product_bom[key].append(line_vals)
 
         production_schedule_model = self.env['mrp.production.schedule']
         forecast_model = self.env['mrp.product.forecast']
 
-        imported_schedules = self.env['mrp.production.schedule']  # Empty recordset
-        imported_forecasts_count = 0
-
+        # Find the existing production schedules of all the products at once
+        schedules_by_key = {}
+        for production_schedule in production_schedule_model.search([
+            ('product_id', 'in', list({line_vals['product_id'] for line_vals in values_to_import})),
+            ('warehouse_id', '=', self.warehouse_id.id),
+        ]):
+            schedules_by_key.setdefault((production_schedule.product_id, production_schedule.bom_id), production_schedule)
+
+        # Create the missing ones together. A product has only one schedule by
+        # warehouse: when it is imported with several BOMs, the next BOMs are
+        # set on the schedule one after the other as before.
+        keys_to_create = []
+        keys_to_create_later = []
+        for key in lines_by_product_bom:
+            if key in schedules_by_key:
+                continue
+            if any(product == key[0] for product, bom in keys_to_create):
+                keys_to_create_later.append(key)
+            else:
+                keys_to_create.append(key)
+        new_schedules = production_schedule_model.create([{
+            'product_id': product.id,
+            'bom_id': bom.id,
+            'warehouse_id': self.warehouse_id.id,
+            'company_id': self.warehouse_id.company_id.id,
+        } for product, bom in keys_to_create])
+        schedules_by_key.update(zip(keys_to_create, new_schedules))
+        for product, bom in keys_to_create_later:
+            schedules_by_key[product, bom] = production_schedule_model.create({
+                'product_id': product.id,
+                'bom_id': bom.id,
+                'warehouse_id': self.warehouse_id.id,
+                'company_id': self.warehouse_id.company_id.id,
+            })
+
+        # Track all schedules (both new and existing)
+        imported_schedules = production_schedule_model.union(*[schedules_by_key[key] for key in lines_by_product_bom])
+
+        # Find the existing forecasts of all the schedules and dates at once
+        forecast_ids_by_key = {}
+        for forecast in forecast_model.search_read([
+            ('production_schedule_id', 'in', imported_schedules.ids),
+            ('date', 'in', list({line_vals['forecast_date'] for line_vals in values_to_import})),
+        ], ['production_schedule_id', 'date']):
+            forecast_ids_by_key.setdefault((forecast['production_schedule_id'][0], forecast['date']), forecast['id'])
+
+        # The last line of a schedule and date gives its quantity
+        quantities_by_key = {}
         for (product, bom), lines in lines_by_product_bom.items():
-            # Find or create production schedule using product from line (not from BOM)
-            production_schedule = production_schedule_model.search([
-                ('product_id', '=', product.id),
-                ('bom_id', '=', bom.id),
-                ('warehouse_id', '=', self.warehouse_id.id),
-            ], limit=1)
-
-            if not production_schedule:
-                production_schedule = production_schedule_model.create({
-                    'product_id': product.id,
-                    'bom_id': bom.id,
-                    'warehouse_id': self.warehouse_id.id,
-                    'company_id': self.warehouse_id.company_id.id,
+            production_schedule = schedules_by_key[product, bom]
+            for line_vals in lines:
+                quantities_by_key[production_schedule.id, line_vals['forecast_date']] = line_vals['forecast_qty']
+
+        forecast_ids_by_qty = {}
+        forecasts_to_create = []
+        for (production_schedule_id, forecast_date), forecast_qty in quantities_by_key.items():
+            forecast_id = forecast_ids_by_key.get((production_schedule_id, forecast_date))
+            if forecast_id:
+                forecast_ids_by_qty.setdefault(forecast_qty, []).append(forecast_id)
+            else:
+                forecasts_to_create.append({
+                    'production_schedule_id': production_schedule_id,
+                    'date': forecast_date,
+                    'forecast_qty': forecast_qty,
                 })
+        # Update existing forecasts, with one write by quantity
+        for forecast_qty, forecast_ids in forecast_ids_by_qty.items():
+            forecast_model.browse(forecast_ids).write({'forecast_qty': forecast_qty})
+        # Create new forecasts
+        forecast_model.create(forecasts_to_create)
 
-            # Track all schedules (both new and existing)
-            imported_schedules |= production_schedule
-
-            # Create or update forecasts for each date
-            for line in lines:
-                # Find existing forecast for this date
-                existing_forecast = forecast_model.search([
-                    ('production_schedule_id', '=', production_schedule.id),
-                    ('date', '=', line.forecast_date),
-                ], limit=1)
-
-                if existing_forecast:
-                    # Update existing forecast
-                    existing_forecast.write({
-                        'forecast_qty': line.forecast_qty,
-                    })
-                else:
-                    # Create new forecast
-                    forecast_model.create({
-                        'production_schedule_id': production_schedule.id,
-                        'date': line.forecast_date,
-                        'forecast_qty': line.forecast_qty,
-                    })
-                    imported_forecasts_count += 1
-
-                # Mark line as imported
-                line.write({'state': 'imported'})
+        # Mark lines as imported
+        lines_to_import.write({'state': 'imported'})
 
         total_schedules = len(lines_by_product_bom)
-        total_forecasts = len(lines_to_import)
+        total_forecasts = len(values_to_import)
 
         # Apply Suggested=Forecasted logic if checkbox is enabled
         if self.set_replenish_equal_forecast and imported_schedules:
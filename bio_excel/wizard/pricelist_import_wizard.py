@@ -1,10 +1,14 @@
-import base64
-import xlrd
 from datetime import timedelta
+from itertools import islice
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
 from dateutil import tz
 
+from ..tools.spreadsheet_reader import SpreadsheetReaderError, decode_to_tempfile, iter_sheet_rows
+
+# Number of Excel rows processed together
+IMPORT_CHUNK_SIZE = 1000
+
 
 class PricelistImportWizard(models.TransientModel):
     _name = 'pricelist.import.wizard'
@@ -55,48 +59,60 @@ class PricelistImportWizard(models.TransientModel):
                 raise ValidationError(_('File must be in .xlsx or .xls format.'))
 
     def _parse_excel_file(self):
-        """Parse Excel file and return data"""
+        """Parse Excel file and yield its data rows one by one"""
         if not self.excel_file:
             raise UserError(_('Please select an Excel file.'))
 
+        if self.header_row is None or self.internal_ref_col is None or self.price_col is None:
+            raise UserError(
+                _('Required columns not found. Please ensure your Excel file contains "Internal Reference" and "Price" columns.'))
+
         try:
-            file_data = base64.b64decode(self.excel_file)
-            workbook = xlrd.open_workbook(file_contents=file_data)
-            worksheet = workbook.sheet_by_index(0)
-
-            if self.header_row is None or self.internal_ref_col is None or self.price_col is None:
-                raise UserError(
-                    _('Required columns not found. Please ensure your Excel file contains "Internal Reference" and "Price" columns.'))
-
-            # Parse data rows
-            data_rows = []
-            for row_idx in range(self.header_row, worksheet.nrows):
-                try:
-                    internal_ref = str(worksheet.cell_value(row_idx, self.internal_ref_col-1)).strip()
-                    price_cell = worksheet.cell_value(row_idx, self.price_col-1)
-
-                    if not internal_ref:
-                        continue
-
-                    # Convert price to float
-                    if isinstance(price_cell, str):
-                        price = float(price_cell.replace(',', '.')) if price_cell.strip() else 0.0
-                    else:
-                        price = float(price_cell) if price_cell else 0.0
-
-                    data_rows.append({
-                        'internal_reference': internal_ref,
-                        'price': price,
-                        'row_number': row_idx + 1
-                    })
-                except (ValueError, TypeError) as e:
-                    # Skip invalid rows but continue processing
+            # Decode the file into a temporary file, not in memory
+            file_data = decode_to_tempfile(self.excel_file)
+        except Exception as e:
+            raise UserError(_('Error reading Excel file: %s') % str(e))
+
+        with file_data:
+            try:
+                yield from self._parse_excel_rows(iter_sheet_rows(file_data))
+            except UserError:
+                raise
+            except SpreadsheetReaderError as e:
+                raise UserError(str(e))
+            except Exception as e:
+                raise UserError(_('Error reading Excel file: %s') % str(e))
+
+    def _parse_excel_rows(self, sheet_rows):
+        """Yield the data rows of the sheet, skipping the invalid ones"""
+        last_col = max(self.internal_ref_col, self.price_col)
+        for row_idx, row in enumerate(sheet_rows):
+            if row_idx < self.header_row:
+                continue
+            # Skip the short rows, without the reference or the price columns
+            if len(row) < last_col:
+                continue
+            try:
+                internal_ref = str(row[self.internal_ref_col-1]).strip()
+                price_cell = row[self.price_col-1]
+
+                if not internal_ref:
                     continue
 
-            return data_rows
+                # Convert price to float
+                if isinstance(price_cell, str):
+                    price = float(price_cell.replace(',', '.')) if price_cell.strip() else 0.0
+                else:
+                    price = float(price_cell) if price_cell else 0.0
 
-        except Exception as e:
-            raise UserError(_('Error reading Excel file: %s') % str(e))
+                yield {
+                    'internal_reference': internal_ref,
+                    'price': price,
+                    'row_number': row_idx + 1
+                }
+            except (ValueError, TypeError) as e:
+                # Skip invalid rows but continue processing
+                continue
 
     def _find_products(self, internal_references):
         """Find products by internal reference"""
@@ -109,10 +125,28 @@ class PricelistImportWizard(models.TransientModel):
         return product_dict
 
     def _process_pricelist_items(self, data_rows):
-        """Process and update pricelist items"""
-        if not data_rows:
+        """Process and update pricelist items, by chunks of rows"""
+        data_rows = iter(data_rows)
+        result = {
+            'created': 0,
+            'updated': 0,
+            'skipped': 0
+        }
+        has_rows = False
+        while True:
+            chunk = list(islice(data_rows, IMPORT_CHUNK_SIZE))
+            if not chunk:
+                break
+            has_rows = True
+            chunk_result = self._process_pricelist_items_chunk(chunk)
+            for key in result:
+                result[key] += chunk_result[key]
+        if not has_rows:
             raise UserError(_('No valid data found in the Excel file.'))
+        return result
 
+    def _process_pricelist_items_chunk(self, data_rows):
+        """Process and update the pricelist items of a chunk of rows"""
         # Get all internal references
         internal_references = [row['internal_reference'] for row in data_rows]
         product_dict = self._find_products(internal_references)
@@ -125,6 +159,21 @@ class PricelistImportWizard(models.TransientModel):
         start_date = fields.Datetime.to_string(self.start_date)
         end_date = fields.Datetime.to_string(self.end_date)
 
+        # Find the existing pricelist items of all the products at once
+        existing_items = {}
+        templates = self.env['product.template'].concat(*product_dict.values())
+        if templates:
+            for item in self.env['product.pricelist.item'].search([
+                ('pricelist_id', '=', self.pricelist_id.id),
+                ('product_tmpl_id', 'in', templates.ids),
+                ('date_start', '=', start_date),
+                ('date_end', '=', end_date),
+            ]):
+                existing_items.setdefault(item.product_tmpl_id.id, item)
+
+        # The last row of a product gives its price
+        prices_to_create = {}
+        prices_to_update = {}
         for row in data_rows:
             internal_ref = row['internal_reference']
             new_price = row['price']
@@ -135,36 +184,43 @@ class PricelistImportWizard(models.TransientModel):
                 skipped_count += 1
                 continue
 
-            # Check if pricelist item already exists
-            existing_item = self.env['product.pricelist.item'].search([
-                ('pricelist_id', '=', self.pricelist_id.id),
-                ('product_tmpl_id', '=', product.id),
-                ('date_start', '=', start_date),
-                ('date_end', '=', end_date),
-            ], limit=1)
-
+            existing_item = existing_items.get(product.id)
             if existing_item:
                 # Update existing item
-                existing_item.write({
-                    'fixed_price': new_price,
-                })
+                prices_to_update[existing_item] = new_price
+                updated_count += 1
+            elif product.id in prices_to_create:
+                # Created by a previous row, updated by this one
+                prices_to_create[product.id] = new_price
                 updated_count += 1
             else:
                 # Create new item
-                self.env['product.pricelist.item'].create({
-                    'applied_on': '1_product',
-                    'base': 'list_price',
-                    'compute_price': 'fixed',
-                    'company_id': self.pricelist_id.company_id.id or False,
-                    'currency_id': self.pricelist_id.currency_id.id or False,
-                    'pricelist_id': self.pricelist_id.id,
-                    'product_tmpl_id': product.id,
-                    'fixed_price': new_price,
-                    'date_start': start_date,
-                    'date_end': end_date,
-                })
+                prices_to_create[product.id] = new_price
                 created_count += 1
 
+        # Update the existing items, with one write by price
+        items_by_price = {}
+        for item, price in prices_to_update.items():
+            items_by_price.setdefault(price, self.env['product.pricelist.item'])
+            items_by_price[price] |= item
+        for price, items in items_by_price.items():
+            items.write({
+                'fixed_price': price,
+            })
+
+        self.env['product.pricelist.item'].create([{
+            'applied_on': '1_product',
+            'base': 'list_price',
+            'compute_price': 'fixed',
+            'company_id': self.pricelist_id.company_id.id or False,
+            'currency_id': self.pricelist_id.currency_id.id or False,
+            'pricelist_id': self.pricelist_id.id,
+            'product_tmpl_id': product_id,
+            'fixed_price': price,
+            'date_start': start_date,
+            'date_end': end_date,
+        } for product_id, price in prices_to_create.items()])
+
         return {
             'created': created_count,
             'updated': updated_count,
@@ -187,6 +243,8 @@ class PricelistImportWizard(models.TransientModel):
                 'tag': 'display_notification',
                 'params': {
                     'title': _('Import Successful'),
+                    'message': _('%(created)s price(s) created, %(updated)s updated, %(skipped)s skipped.',
+                                 created=result['created'], updated=result['updated'], skipped=result['skipped']),
                     'type': 'success',
                     'sticky': False,
                 }
@@ -26,6 +26,7 @@ procure.
     'data': [
         'security/ir.model.access.csv',
         'security/mrp_mps_security.xml',
+        'data/mrp_mps_cron.xml',
         'views/mrp_mps_views.xml',
         'views/mrp_mps_menu_views.xml',
         'views/mrp_bom_views.xml',
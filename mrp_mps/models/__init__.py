@@ -3,9 +3,17 @@
 
 from . import mrp_bom
 from . import mrp_mps
+from . import mrp_mps_demand_history
+from . import mrp_mps_indirect_demand
+from . import mrp_mps_replenish_job
+from . import mrp_mps_state_invalidation
+from . import mrp_production
 from . import product_product
+from . import product_supplierinfo
 from . import product_template
 from . import purchase_order
 from . import res_company
 from . import res_config_settings
+from . import stock_move
 from . import stock_rule
+from . import uom_uom
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
-from odoo import fields, models
+from odoo import api, fields, models
 
 
 class MrpBom(models.Model):
@@ -31,3 +31,61 @@ class MrpBom(models.Model):
             for product_id in bom.bom_line_ids.product_id.ids + ids:
                 schedule_count += product_schedule_counts.get(product_id, 0)
             bom.schedule_count = schedule_count
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        boms = super().create(vals_list)
+        self.env['mrp.production.schedule']._invalidate_bom_graph()
+        boms._invalidate_stored_indirect_demand()
+        return boms
+
+    def write(self, vals):
+        if {'active', 'product_id', 'product_tmpl_id', 'bom_line_ids', 'product_qty', 'product_uom_id', 'type', 'sequence', 'company_id'} & vals.keys():
+            # Before and after the write, for the products and components
+            # added or removed.
+            self._invalidate_stored_indirect_demand()
+            res = super().write(vals)
+            self.env['mrp.production.schedule']._invalidate_bom_graph()
+            self._invalidate_stored_indirect_demand()
+            return res
+        return super().write(vals)
+
+    def unlink(self):
+        self._invalidate_stored_indirect_demand()
+        res = super().unlink()
+        self.env['mrp.production.schedule']._invalidate_bom_graph()
+        return res
+
+    def _invalidate_stored_indirect_demand(self):
+        """ Outdate the stored indirect demand of the products of the BoMs
+        in self and of their components.
+        """
+        products = self.product_id | self.filtered(lambda bom: not bom.product_id).product_tmpl_id.product_variant_ids
+        self.env['mrp.production.schedule']._invalidate_stored_indirect_demand(products)
+
+
+class MrpBomLine(models.Model):
+    _inherit = 'mrp.bom.line'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        self.env['mrp.production.schedule']._invalidate_bom_graph()
+        lines.bom_id._invalidate_stored_indirect_demand()
+        return lines
+
+    def write(self, vals):
+        if {'bom_id', 'product_id', 'bom_product_template_attribute_value_ids', 'product_qty', 'product_uom_id'} & vals.keys():
+            self.bom_id._invalidate_stored_indirect_demand()
+            res = super().write(vals)
+            # The BoM graph keeps the ratios of the lines.
+            self.env['mrp.production.schedule']._invalidate_bom_graph()
+            self.bom_id._invalidate_stored_indirect_demand()
+            return res
+        return super().write(vals)
+
+    def unlink(self):
+        self.bom_id._invalidate_stored_indirect_demand()
+        res = super().unlink()
+        self.env['mrp.production.schedule']._invalidate_bom_graph()
+        return res
@@ -1,15 +1,59 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
+import copy
+import logging
+from bisect import bisect_right
 from collections import defaultdict, namedtuple
 from dateutil.relativedelta import relativedelta
 from math import log10
 
-from odoo import api, fields, models, _
+from odoo import api, fields, models, tools, _
+from odoo.exceptions import UserError
 from odoo.tools.date_utils import add, subtract
+from odoo.tools import str2bool
 from odoo.tools.float_utils import float_round
+from odoo.tools.lru import LRU
 from odoo.osv.expression import OR, AND
-from collections import OrderedDict
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Guard against cycles in the destination moves when their delay is computed
+# by the database.
+MAX_DEST_MOVES_DEPTH = 50
+
+# Number of schedule states kept by each worker when the view state cache is
+# enabled.
+VIEW_STATE_CACHE_SIZE = 8192
+
+# Fields of the schedules used to compute their state or the state of their
+# components.
+VIEW_STATE_FIELDS = {'product_id', 'warehouse_id', 'bom_id', 'company_id', 'forecast_target_qty', 'min_to_replenish_qty', 'max_to_replenish_qty'}
+
+
+def _float_round_array(values, rounding, rounding_method='HALF-UP'):
+    """ float_round applied on each row of values with the precision
+    rounding of the row (the same normalization and epsilon tie-breaking).
+    """
+    rounding = np.reshape(rounding, (-1,) + (1,) * (np.ndim(values) - 1))
+    normalized = values / rounding
+    sign = np.copysign(1.0, normalized)
+    with np.errstate(divide='ignore'):
+        epsilon = np.exp2(np.log2(np.abs(normalized)) - 52)
+    if rounding_method == 'UP':
+        normalized = normalized - sign * epsilon
+        rounded = np.ceil(np.abs(normalized)) * sign
+    else:
+        normalized = normalized + sign * epsilon
+        # Half away from zero, as float_utils.round.
+        truncated = np.trunc(normalized)
+        rounded = np.where(np.abs(normalized - truncated) == 0.5, truncated + sign, np.rint(normalized))
+    return np.where(values == 0, 0.0, rounded * rounding)
 
 
 class MrpProductionSchedule(models.Model):
@@ -47,6 +91,9 @@ class MrpProductionSchedule(models.Model):
     max_to_replenish_qty = fields.Float(
         'Maximum to Replenish', default=1000,
         help="The maximum replenishment you would like to launch for each period in the MPS. Note that if the demand is higher than that amount, the remaining quantity will be transferred to the next period automatically.")
+    # Changed each time the cached view state of the schedule is outdated,
+    # see _invalidate_view_state.
+    state_version = fields.Integer(compute='_compute_state_version')
 
     _sql_constraints = [
         ('warehouse_product_ref_uniq', 'unique (warehouse_id, product_id)', 'The combination of warehouse and product must be unique !'),
@@ -127,46 +174,60 @@ class MrpProductionSchedule(models.Model):
         If based_on_lead_time is False then it will run the procurement for the
         first period that need a replenishment
         """
+        return self._replenish(based_on_lead_time=based_on_lead_time)
+
+    @api.model
+    def action_replenish_all(self, domain=False, based_on_lead_time=True):
+        """ Replenish all the schedules matching the domain. With the system
+        parameter `mrp_mps.replenish_all_in_background`, the replenishment is
+        done in background by a mrp.mps.replenish.job.
+
+        return: a dict with the id of the job if any and the action to display
+        """
+        production_schedules = self.search(domain or [])
+        if str2bool(self.env['ir.config_parameter'].sudo().get_param('mrp_mps.replenish_all_in_background', 'False')):
+            job = self.env['mrp.mps.replenish.job']._create_job(production_schedules, based_on_lead_time=based_on_lead_time)
+            return {'job_id': job.id, 'action': False}
+        return {'job_id': False, 'action': production_schedules._replenish(based_on_lead_time=based_on_lead_time)}
+
+    def _replenish(self, based_on_lead_time=False, progress_callback=None, chunk_size=None):
+        """ See action_replenish. The kits and their components are searched
+        for all the schedules at once and the procurements are run by chunks of
+        schedules (system parameter `mrp_mps.replenish_chunk_size`, all at once
+        by default).
+
+        param chunk_size: number of schedules by chunk, 0 to run everything at
+        once and raise the errors, the system parameter if None
+        param progress_callback: called with the number of schedules processed
+        and the total after each chunk
+        return: a notification action if some chunks failed
+        """
         production_schedule_states = self.get_production_schedule_view_state()
         production_schedule_states = {mps['id']: mps for mps in production_schedule_states}
-        procurements = []
-        forecasts_values = []
-        forecasts_to_set_as_launched = self.env['mrp.product.forecast']
+        forecasts_by_period = self._get_forecasts_by_period(self.env.company._get_date_range())
+        kit_components = self._get_kit_components()
+        batches = []
         for production_schedule in self:
             production_schedule_state = production_schedule_states[production_schedule.id]
             # Check for kit. If a kit and its component are both in the MPS we want to skip the
             # the kit procurement but instead only refill the components not in MPS
-            bom = self.env['mrp.bom']._bom_find(
-                production_schedule.product_id,
-                company_id=production_schedule.company_id.id,
-                bom_type='phantom')[production_schedule.product_id]
-            product_ratio = []
-            if bom:
-                dummy, bom_lines = bom.explode(production_schedule.product_id, 1)
-                product_ids = [l[0].product_id.id for l in bom_lines]
-                product_ids_with_forecast = self.env['mrp.production.schedule'].search([
-                    ('company_id', '=', production_schedule.company_id.id),
-                    ('warehouse_id', '=', production_schedule.warehouse_id.id),
-                    ('product_id', 'in', product_ids)
-                ]).product_id.ids
-                product_ratio += [
-                    (l[0], l[0].product_qty * l[1]['qty'])
-                    for l in bom_lines if l[0].product_id.id not in product_ids_with_forecast
-                ]
+            product_ratio = kit_components.get(production_schedule.id)
+            procurements = []
+            forecasts_values = []
+            forecasts_to_set_as_launched = self.env['mrp.product.forecast']
 
             # Cells with values 'to_replenish' means that they are based on
             # lead times. There is at maximum one forecast by schedule with
             # 'forced_replenish', it's the cell that need a modification with
             #  the smallest start date.
             replenishment_field = based_on_lead_time and 'to_replenish' or 'forced_replenish'
-            forecasts_to_replenish = filter(lambda f: f[replenishment_field], production_schedule_state['forecast_ids'])
-            for forecast in forecasts_to_replenish:
-                existing_forecasts = production_schedule.forecast_ids.filtered(lambda p:
-                    p.date >= forecast['date_start'] and p.date <= forecast['date_stop']
-                )
+            for index, forecast in enumerate(production_schedule_state['forecast_ids']):
+                if not forecast[replenishment_field]:
+                    continue
+                existing_forecasts = forecasts_by_period.get((production_schedule.id, index))
                 extra_values = production_schedule._get_procurement_extra_values(forecast)
                 quantity = forecast['replenish_qty'] - forecast['incoming_qty']
-                if not bom:
+                if product_ratio is None:
                     procurements.append(self.env['procurement.group'].Procurement(
                         production_schedule.product_id,
                         quantity,
@@ -187,7 +248,7 @@ class MrpProductionSchedule(models.Model):
                         ))
 
                 if existing_forecasts:
-                    forecasts_to_set_as_launched |= existing_forecasts
+                    forecasts_to_set_as_launched |= self.env['mrp.product.forecast'].browse(existing_forecasts['ids'])
                 else:
                     forecasts_values.append({
                         'forecast_qty': 0,
@@ -195,21 +256,100 @@ class MrpProductionSchedule(models.Model):
                         'procurement_launched': True,
                         'production_schedule_id': production_schedule.id
                     })
+            batches.append((procurements, forecasts_to_set_as_launched, forecasts_values))
+
+        if chunk_size is None:
+            chunk_size = int(self.env['ir.config_parameter'].sudo().get_param('mrp_mps.replenish_chunk_size', 0))
+        if not chunk_size:
+            self._run_replenish_batches(batches)
+            if progress_callback:
+                progress_callback(len(batches), len(batches))
+            return
+
+        errors = []
+        for start in range(0, len(batches), chunk_size):
+            try:
+                with self.env.cr.savepoint():
+                    self._run_replenish_batches(batches[start:start + chunk_size])
+            except Exception as error:
+                # Any error only cancels its chunk, rolled back to the savepoint
+                _logger.warning('MPS replenishment failed for schedules %d to %d: %s', start + 1, start + chunk_size, error,
+                                exc_info=not isinstance(error, UserError))
+                errors.append(str(error))
+            done = min(start + chunk_size, len(batches))
+            _logger.info('MPS replenishment: %d/%d schedule(s) processed', done, len(batches))
+            if progress_callback:
+                progress_callback(done, len(batches))
+        if errors:
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _('Some replenishments failed'),
+                    'message': '\n'.join(errors),
+                    'sticky': True,
+                    'type': 'warning',
+                },
+            }
+
+    def _run_replenish_batches(self, batches):
+        """ Run the procurements of the batches built by _replenish and mark
+        their forecasts as launched.
+        """
+        procurements = [procurement for batch in batches for procurement in batch[0]]
         if procurements:
             self.env['procurement.group'].with_context(skip_lead_time=True).run(procurements)
-
-        forecasts_to_set_as_launched.write({
+        self.env['mrp.product.forecast'].concat(*[batch[1] for batch in batches]).write({
             'procurement_launched': True,
         })
+        forecasts_values = [values for batch in batches for values in batch[2]]
         if forecasts_values:
             self.env['mrp.product.forecast'].create(forecasts_values)
 
+    def _get_kit_components(self):
+        """ Find the kit BoM of all the schedules in self at once.
+
+        return: for each schedule of a kit, a list of tuple with the BoM lines
+        of the components without schedule and their ratio
+        rtype: dict
+        """
+        kit_components = {}
+        for company in self.company_id:
+            production_schedules = self.filtered(lambda s: s.company_id == company)
+            boms = self.env['mrp.bom']._bom_find(production_schedules.product_id, company_id=company.id, bom_type='phantom')
+            bom_lines_by_schedule = {}
+            for production_schedule in production_schedules:
+                bom = boms[production_schedule.product_id]
+                if bom:
+                    dummy, bom_lines = bom.explode(production_schedule.product_id, 1)
+                    bom_lines_by_schedule[production_schedule] = bom_lines
+            if not bom_lines_by_schedule:
+                continue
+            component_ids = {line[0].product_id.id for bom_lines in bom_lines_by_schedule.values() for line in bom_lines}
+            schedules_with_forecast = {
+                (values['warehouse_id'][0], values['product_id'][0])
+                for values in self.env['mrp.production.schedule'].search_read([
+                    ('company_id', '=', company.id),
+                    ('warehouse_id', 'in', production_schedules.warehouse_id.ids),
+                    ('product_id', 'in', list(component_ids))
+                ], ['warehouse_id', 'product_id'])
+            }
+            for production_schedule, bom_lines in bom_lines_by_schedule.items():
+                kit_components[production_schedule.id] = [
+                    (l[0], l[0].product_qty * l[1]['qty'])
+                    for l in bom_lines if (production_schedule.warehouse_id.id, l[0].product_id.id) not in schedules_with_forecast
+                ]
+        return kit_components
+
     @api.model
-    def get_mps_view_state(self, domain=False, offset=0, limit=False):
+    def get_mps_view_state(self, domain=False, offset=0, limit=False, until=False):
         """ Return the global information about MPS and a list of production
         schedules values with the domain.
 
         :param domain: domain for mrp.production.schedule
+        :param until: with virtual scrolling, key (warehouse id, product id) of
+        the last row already loaded by the client, in order to load again all
+        the rows until it instead of the first chunk
         :return: values used by the client action in order to render the MPS.
             - dates: list of period name
             - production_schedule_ids: list of production schedules values
@@ -218,8 +358,19 @@ class MrpProductionSchedule(models.Model):
             - groups: company settings that hide/display different rows
         :rtype: dict
         """
-        productions_schedules = self.env['mrp.production.schedule'].search(domain or [], offset=offset, limit=limit)
-        count = self.env['mrp.production.schedule'].search_count(domain or [])
+        virtual_scrolling = self._use_virtual_scrolling()
+        next_key = False
+        if virtual_scrolling and until:
+            productions_schedules = self._search_mps_rows(domain, until=until)
+            count = self.env['mrp.production.schedule'].search_count(domain or [])
+            next_key = until
+        elif virtual_scrolling:
+            productions_schedules = self._search_mps_rows(domain, limit=limit)
+            count = self.env['mrp.production.schedule'].search_count(domain or [])
+            next_key = productions_schedules._get_mps_next_key(limit)
+        else:
+            productions_schedules = self.env['mrp.production.schedule'].search(domain or [], offset=offset, limit=limit)
+            count = self.env['mrp.production.schedule'].search_count(domain or [])
         productions_schedules_states = productions_schedules.get_production_schedule_view_state()
         company_groups = self.env.company.read([
             'mrp_mps_show_starting_inventory',
@@ -240,8 +391,56 @@ class MrpProductionSchedule(models.Model):
             'company_id': self.env.company.id,
             'groups': company_groups,
             'count': count,
+            'virtual_scrolling': virtual_scrolling,
+            'next': next_key,
         }
 
+    @api.model
+    def get_mps_rows(self, domain=False, after=False, limit=False):
+        """ Return the next rows of the MPS when the rows are loaded while
+        scrolling (see _use_virtual_scrolling).
+
+        :param domain: domain for mrp.production.schedule
+        :param after: key (warehouse id, product id) of the last loaded row,
+        returned as `next` by get_mps_view_state or by the previous call
+        :param limit: number of rows to load
+        :return: the production schedules values and the key of the next rows
+        (False on the last rows)
+        :rtype: dict
+        """
+        productions_schedules = self._search_mps_rows(domain, after=after, limit=limit)
+        return {
+            'production_schedule_ids': productions_schedules.get_production_schedule_view_state(),
+            'next': productions_schedules._get_mps_next_key(limit),
+        }
+
+    @api.model
+    def _search_mps_rows(self, domain=False, after=False, limit=False, until=False):
+        """ Search the schedules ordered by warehouse and product ids, after
+        the given key instead of skipping an offset, so each chunk of rows is
+        read from the (warehouse_id, product_id) index. The rows are searched
+        until the given key included if any.
+        """
+        query = self._search(domain or [], limit=limit)
+        if after:
+            query.add_where('("mrp_production_schedule"."warehouse_id", "mrp_production_schedule"."product_id") > (%s, %s)', list(after))
+        if until:
+            query.add_where('("mrp_production_schedule"."warehouse_id", "mrp_production_schedule"."product_id") <= (%s, %s)', list(until))
+        query.order = '"mrp_production_schedule"."warehouse_id", "mrp_production_schedule"."product_id"'
+        return self.browse(query)
+
+    def _get_mps_next_key(self, limit):
+        if not self or not limit or len(self) < limit:
+            return False
+        return [self[-1].warehouse_id.id, self[-1].product_id.id]
+
+    @api.model
+    def _use_virtual_scrolling(self):
+        """ The MPS rows are loaded by chunks while scrolling, instead of pages,
+        when the system parameter `mrp_mps.virtual_scrolling` is set.
+        """
+        return str2bool(self.env['ir.config_parameter'].sudo().get_param('mrp_mps.virtual_scrolling', 'False'))
+
     @api.model_create_multi
     def create(self, vals_list):
         """ If the BoM is pass at the creation, create MPS for its components """
@@ -292,8 +491,22 @@ class MrpProductionSchedule(models.Model):
             })
         if components_vals:
             self.env['mrp.production.schedule'].create(components_vals)
+        # The new schedules add indirect demand to their components.
+        self._invalidate_view_state(mps.product_id)
         return mps
 
+    def write(self, vals):
+        if VIEW_STATE_FIELDS & vals.keys():
+            self._invalidate_view_state(self.product_id)
+        res = super().write(vals)
+        if {'product_id', 'bom_id'} & vals.keys():
+            self._invalidate_view_state(self.product_id)
+        return res
+
+    def unlink(self):
+        self._invalidate_view_state(self.product_id)
+        return super().unlink()
+
     def get_production_schedule_view_state(self):
         """ Prepare and returns the fields used by the MPS client action.
         For each schedule returns the fields on the model. And prepare the cells
@@ -318,16 +531,226 @@ class MrpProductionSchedule(models.Model):
         - safety_stock_qty:
         starting_inventory_qty - forecast_qty - indirect_demand_qty + replenish_qty
         """
+        if self._use_view_state_cache():
+            return self._get_cached_production_schedule_view_state()
+        return self._get_production_schedule_view_state()
+
+    @api.depends('product_id')
+    def _compute_state_version(self):
+        versions = self.env['mrp.mps.state.invalidation']._get_versions(self.product_id.ids)
+        for production_schedule in self:
+            production_schedule.state_version = versions.get(production_schedule.product_id.id, 0)
+
+    def _get_cached_production_schedule_view_state(self):
+        """ Same as _get_production_schedule_view_state but the state of each
+        schedule is kept by the worker until the schedule is invalidated (its
+        state_version changes, see _invalidate_view_state) or the settings
+        used to compute it change (see _get_view_state_cache_key). Only the
+        schedules without a valid state are computed.
+
+        The computed states are only added to the worker store once the
+        transaction is committed, so a state read from uncommitted data is
+        never kept.
+        """
+        store = self._get_view_state_store()
+        pending_states = self._get_pending_view_states()
+        cache_key = self._get_view_state_cache_key()
+        states_by_id = {}
+        schedules_to_compute = self.env['mrp.production.schedule']
+        for production_schedule in self:
+            key = (production_schedule.id, production_schedule.state_version, cache_key)
+            state = pending_states.get(key, store.get(key))
+            if state is None:
+                schedules_to_compute |= production_schedule
+            else:
+                states_by_id[production_schedule.id] = state
+        if schedules_to_compute:
+            # The cached states of the other schedules give their quantities to
+            # replenish, so they are not computed again for the indirect demand
+            # of the schedules to compute.
+            precomputed_states = {}
+            for production_schedule in self.browse(schedules_to_compute.get_impacted_schedule()) - schedules_to_compute:
+                key = (production_schedule.id, production_schedule.state_version, cache_key)
+                state = pending_states.get(key, store.get(key))
+                if state is not None:
+                    precomputed_states[production_schedule.id] = state
+            for state in schedules_to_compute._get_production_schedule_view_state(precomputed_states=precomputed_states):
+                production_schedule = self.browse(state['id'])
+                pending_states[(production_schedule.id, production_schedule.state_version, cache_key)] = state
+                states_by_id[state['id']] = state
+        # The states are modified by some callers.
+        return [copy.deepcopy(states_by_id[_id]) for _id in self.ids if _id in states_by_id]
+
+    @api.model
+    def _get_pending_view_states(self):
+        """ States computed by the current transaction, added to the worker
+        store once it is committed.
+        """
+        store = self._get_view_state_store()
+        pending_states = self.env.cr.postcommit.data.get(('mrp_mps.view_states', id(store)))
+        if pending_states is None:
+            pending_states = self.env.cr.postcommit.data[('mrp_mps.view_states', id(store))] = {}
+
+            @self.env.cr.postcommit.add
+            def store_states():
+                for key, state in pending_states.items():
+                    store[key] = state
+        return pending_states
+
+    def _set_cached_view_states(self, states_by_id):
+        """ Keep the states of the schedules in self, computed for their
+        current state_version, as _get_cached_production_schedule_view_state
+        would.
+        """
+        pending_states = self._get_pending_view_states()
+        cache_key = self._get_view_state_cache_key()
+        for production_schedule in self:
+            if production_schedule.id in states_by_id:
+                pending_states[(production_schedule.id, production_schedule.state_version, cache_key)] = copy.deepcopy(states_by_id[production_schedule.id])
+
+    def _get_view_state_cache_key(self):
+        """ Everything, except the schedules themselves, changing the computed
+        state of a schedule: the companies, the periods, the BoMs, the
+        displayed rows and the user reading the schedules, since the moves and
+        the RFQ are read with the record rules of the user.
+        """
+        company = self.env.company
+        return (
+            tuple(self.env.companies.ids),
+            fields.Date.today(),
+            tuple(company._get_date_range()),
+            self.env['mrp.mps.bom.graph.invalidation']._get_version(),
+            company.mrp_mps_show_actual_demand_year_minus_1,
+            company.mrp_mps_show_actual_demand_year_minus_2,
+            self.env.lang,
+            self.env.uid,
+            self.env.user.has_group('stock.group_stock_multi_warehouses'),
+            self.env.user.has_group('uom.group_uom'),
+        )
+
+    @api.model
+    @tools.ormcache()
+    def _get_view_state_store(self):
+        """ States of the schedules computed by this worker. The store itself
+        is dropped with the caches of the registry, i.e. when the lead times or
+        the settings are modified.
+        """
+        return LRU(VIEW_STATE_CACHE_SIZE)
+
+    @api.model
+    def _use_view_state_cache(self):
+        """ The states of the schedules are cached when the system parameter
+        `mrp_mps.view_state_cache` is set.
+        """
+        return str2bool(self.env['ir.config_parameter'].sudo().get_param('mrp_mps.view_state_cache', 'False'))
+
+    @api.model
+    def _use_stored_indirect_demand(self):
+        """ The indirect demand is stored (see mrp.mps.indirect.demand) when
+        the system parameter `mrp_mps.stored_indirect_demand` is set.
+        """
+        return str2bool(self.env['ir.config_parameter'].sudo().get_param('mrp_mps.stored_indirect_demand', 'False'))
+
+    @api.model
+    def _use_view_state_invalidation(self):
+        """ The modifications of the schedules, the moves and the RFQ are only
+        logged (see _invalidate_view_state) when the states or the indirect
+        demand are kept.
+        """
+        return self._use_view_state_cache() or self._use_stored_indirect_demand()
+
+    def _update_stored_indirect_demand(self):
+        """ Update the stored indirect demand after a cell of the schedules in
+        self was modified. Only the schedules of their components (at any BoM
+        level) get a new indirect demand, the schedules using them as component
+        are not impacted. The stored rows of the other periods are kept.
+        """
+        if not self._use_stored_indirect_demand() or self.env.context.get('mrp_mps_skip_stored_indirect_demand'):
+            return
+        production_schedules = self | self._get_component_schedules()
+        self.env['mrp.mps.indirect.demand']._update_indirect_demand(production_schedules, incremental=True)
+
+    @api.model
+    def _invalidate_stored_indirect_demand(self, products=None):
+        """ Outdate the stored indirect demand after a change of the BoMs,
+        the UoM or the lead times: the one of the schedules of products and of
+        their components, or all of it without products.
+        """
+        if not self._use_stored_indirect_demand():
+            return
+        if products is not None:
+            self._invalidate_view_state(products)
+            return
+        self.env['mrp.mps.indirect.demand'].flush_model()
+        self.env.cr.execute("DELETE FROM mrp_mps_indirect_demand")
+        self.env['mrp.mps.indirect.demand'].invalidate_model()
+
+    @api.model
+    def _invalidate_view_state(self, products):
+        """ Outdate the cached state of the schedules of products, and of the
+        schedules of their components (at any BoM level) since the quantities
+        to replenish of products are their indirect demand.
+
+        The products are appended to the invalidation log (see
+        mrp.mps.state.invalidation) instead of updating the schedules, so the
+        business transactions do not lock the schedule rows.
+        """
+        if not products or not self._use_view_state_invalidation():
+            return
+        product_ids = set(products.ids) | self._get_component_product_ids(products)
+        self.env['mrp.mps.state.invalidation']._log_products(product_ids)
+        self.env['mrp.production.schedule'].invalidate_model(['state_version'])
+
+    @api.model
+    def _get_component_product_ids(self, products):
+        """ Return the ids of the components of products at any BoM level,
+        whatever the variants the BoM lines apply to.
+        """
+        bom_graph = self._get_bom_graph()
+        template_by_product = dict(bom_graph['template_by_product'])
+        template_by_product.update((product.id, product.product_tmpl_id.id) for product in products)
+        component_ids = set()
+        new_product_ids = set(products.ids)
+        while new_product_ids:
+            new_product_ids = {
+                component_id
+                for product_id in new_product_ids
+                for component_id, line_id in bom_graph['components'].get(template_by_product.get(product_id), ())
+            } - component_ids
+            component_ids |= new_product_ids
+        return component_ids
+
+    def _get_production_schedule_view_state(self, aggregates=None, precomputed_states=None):
+        """ See get_production_schedule_view_state.
+
+        param aggregates: values returned by _get_view_state_aggregates for the
+        schedules in self, used instead of reading the moves and the RFQ again.
+        param precomputed_states: states of schedules not in self by id, their
+        quantities to replenish are used for the indirect demand of the
+        schedules in self instead of being computed again.
+        """
+        precomputed_states = precomputed_states or {}
         company_id = self.env.company
         date_range = company_id._get_date_range()
         date_range_year_minus_1 = company_id._get_date_range(years=1)
         date_range_year_minus_2 = company_id._get_date_range(years=2)
 
+        # The indirect demand of the schedules in self is read when it's stored
+        # and still valid for all of them.
+        stored_indirect_demand = {}
+        if aggregates is None and not precomputed_states and self._use_stored_indirect_demand():
+            stored_indirect_demand = self.env['mrp.mps.indirect.demand']._get_indirect_demand(self, date_range)
+            if len(stored_indirect_demand) < len(self):
+                stored_indirect_demand = {}
+
         # We need to get the schedule that impact the schedules in self. Since
         # the state is not saved, it needs to recompute the quantity to
         # replenish of finished products. It will modify the indirect
         # demand and replenish_qty of schedules in self.
-        schedules_to_compute = self.env['mrp.production.schedule'].browse(self.get_impacted_schedule()) | self
+        if stored_indirect_demand:
+            schedules_to_compute = self
+        else:
+            schedules_to_compute = self.env['mrp.production.schedule'].browse(self.get_impacted_schedule()) | self
 
         # Dependencies between schedules
         indirect_demand_trees = schedules_to_compute._get_indirect_demand_tree()
@@ -338,10 +761,17 @@ class MrpProductionSchedule(models.Model):
         # order to compute the schedule state only once.
         indirect_demand_order = schedules_to_compute._get_indirect_demand_order(indirect_demand_trees)
         indirect_demand_qty = defaultdict(float)
-        incoming_qty, incoming_qty_done = self._get_incoming_qty(date_range)
-        outgoing_qty, outgoing_qty_done = self._get_outgoing_qty(date_range)
-        dummy, outgoing_qty_year_minus_1 = self._get_outgoing_qty(date_range_year_minus_1)
-        dummy, outgoing_qty_year_minus_2 = self._get_outgoing_qty(date_range_year_minus_2)
+        for production_schedule in self:
+            for period, quantity in zip(date_range, stored_indirect_demand.get(production_schedule.id, ())):
+                indirect_demand_qty[period, production_schedule.product_id, production_schedule.warehouse_id] = quantity
+        forecasts_by_period = schedules_to_compute._get_forecasts_by_period(date_range)
+        if aggregates is None:
+            aggregates = self._get_view_state_aggregates(date_range, schedules_to_compute, precomputed_ids=precomputed_states.keys())
+        lead_days = aggregates['lead_days']
+        incoming_qty, incoming_qty_done = aggregates['incoming_qty'], aggregates['incoming_qty_done']
+        outgoing_qty, outgoing_qty_done = aggregates['outgoing_qty'], aggregates['outgoing_qty_done']
+        outgoing_qty_year_minus_1 = aggregates['outgoing_qty_year_minus_1']
+        outgoing_qty_year_minus_2 = aggregates['outgoing_qty_year_minus_2']
         read_fields = [
             'forecast_target_qty',
             'min_to_replenish_qty',
@@ -354,14 +784,25 @@ class MrpProductionSchedule(models.Model):
             read_fields.append('product_uom_id')
         production_schedule_states = schedules_to_compute.read(read_fields)
         production_schedule_states_by_id = {mps['id']: mps for mps in production_schedule_states}
+        projection = None
+        if self._use_numpy_projection() and not precomputed_states and not stored_indirect_demand:
+            projection = schedules_to_compute._get_projection(date_range, indirect_demand_order, indirect_ratio_mps, forecasts_by_period, aggregates)
         for production_schedule in indirect_demand_order:
             # Bypass if the schedule is only used in order to compute indirect
             # demand.
+            if projection is not None and production_schedule not in self:
+                continue
             rounding = production_schedule.product_id.uom_id.rounding
-            lead_time = production_schedule._get_lead_times()
+            lead_time = production_schedule._get_lead_times(lead_days=lead_days)
             # Ignore "Days to Supply Components" when set demand for components since it's normally taken care by the
             # components themselves
             lead_time_ignore_components = lead_time - production_schedule.product_id.product_tmpl_id.days_to_prepare_mo
+            precomputed_state = precomputed_states.get(production_schedule.id)
+            if precomputed_state:
+                for (date_start, date_stop), forecast_values in zip(date_range, precomputed_state['forecast_ids']):
+                    if forecast_values['replenish_qty']:
+                        production_schedule._add_indirect_demand(indirect_demand_qty, indirect_ratio_mps, date_range, date_start, lead_time_ignore_components, forecast_values['replenish_qty'])
+                continue
             production_schedule_state = production_schedule_states_by_id[production_schedule['id']]
             if production_schedule in self:
                 procurement_date = add(fields.Date.today(), days=lead_time)
@@ -369,7 +810,9 @@ class MrpProductionSchedule(models.Model):
                 production_schedule_state['precision_digits'] = precision_digits
                 production_schedule_state['forecast_ids'] = []
 
-            starting_inventory_qty = production_schedule.product_id.with_context(warehouse=production_schedule.warehouse_id.id).qty_available
+            starting_inventory_qty = aggregates['qty_available'].get(production_schedule.id)
+            if starting_inventory_qty is None:
+                starting_inventory_qty = production_schedule.product_id.with_context(warehouse=production_schedule.warehouse_id.id).qty_available
             if len(date_range):
                 starting_inventory_qty -= incoming_qty_done.get((date_range[0], production_schedule.product_id, production_schedule.warehouse_id), 0.0)
                 starting_inventory_qty += outgoing_qty_done.get((date_range[0], production_schedule.product_id, production_schedule.warehouse_id), 0.0)
@@ -379,7 +822,7 @@ class MrpProductionSchedule(models.Model):
                 key = ((date_start, date_stop), production_schedule.product_id, production_schedule.warehouse_id)
                 key_y_1 = (date_range_year_minus_1[index], *key[1:])
                 key_y_2 = (date_range_year_minus_2[index], *key[1:])
-                existing_forecasts = production_schedule.forecast_ids.filtered(lambda p: p.date >= date_start and p.date <= date_stop)
+                existing_forecasts = forecasts_by_period.get((production_schedule.id, index))
                 if production_schedule in self:
                     forecast_values['date_start'] = date_start
                     forecast_values['date_stop'] = date_stop
@@ -388,15 +831,20 @@ class MrpProductionSchedule(models.Model):
                     forecast_values['outgoing_qty_year_minus_1'] = float_round(outgoing_qty_year_minus_1.get(key_y_1, 0.0), precision_rounding=rounding)
                     forecast_values['outgoing_qty_year_minus_2'] = float_round(outgoing_qty_year_minus_2.get(key_y_2, 0.0), precision_rounding=rounding)
 
+                if projection is not None:
+                    forecast_values.update(projection[production_schedule.id][index])
+                    production_schedule_state['forecast_ids'].append(forecast_values)
+                    continue
+
                 forecast_values['indirect_demand_qty'] = float_round(indirect_demand_qty.get(key, 0.0), precision_rounding=rounding, rounding_method='UP')
                 replenish_qty_updated = False
                 if existing_forecasts:
-                    forecast_values['forecast_qty'] = float_round(sum(existing_forecasts.mapped('forecast_qty')), precision_rounding=rounding)
-                    forecast_values['replenish_qty'] = float_round(sum(existing_forecasts.mapped('replenish_qty')), precision_rounding=rounding)
+                    forecast_values['forecast_qty'] = float_round(existing_forecasts['forecast_qty'], precision_rounding=rounding)
+                    forecast_values['replenish_qty'] = float_round(existing_forecasts['replenish_qty'], precision_rounding=rounding)
 
                     # Check if the to replenish quantity has been manually set or
                     # if it needs to be computed.
-                    replenish_qty_updated = any(existing_forecasts.mapped('replenish_qty_updated'))
+                    replenish_qty_updated = existing_forecasts['replenish_qty_updated']
                     forecast_values['replenish_qty_updated'] = replenish_qty_updated
                 else:
                     forecast_values['forecast_qty'] = 0.0
@@ -412,19 +860,17 @@ class MrpProductionSchedule(models.Model):
                 if production_schedule in self:
                     production_schedule_state['forecast_ids'].append(forecast_values)
                 starting_inventory_qty = forecast_values['safety_stock_qty']
-                if not forecast_values['replenish_qty']:
+                # The stored indirect demand already includes the demand of
+                # the other schedules in self.
+                if not forecast_values['replenish_qty'] or stored_indirect_demand:
                     continue
                 # Set the indirect demand qty for children schedules.
-                for (product, ratio) in indirect_ratio_mps[(production_schedule.warehouse_id, production_schedule.product_id)].items():
-                    related_date = max(subtract(date_start, days=lead_time_ignore_components), fields.Date.today())
-                    index = next(i for i, (dstart, dstop) in enumerate(date_range) if related_date <= dstart or (related_date >= dstart and related_date <= dstop))
-                    related_key = (date_range[index], product, production_schedule.warehouse_id)
-                    indirect_demand_qty[related_key] += ratio * forecast_values['replenish_qty']
+                production_schedule._add_indirect_demand(indirect_demand_qty, indirect_ratio_mps, date_range, date_start, lead_time_ignore_components, forecast_values['replenish_qty'])
 
             if production_schedule in self:
                 # The state is computed after all because it needs the final
                 # quantity to replenish.
-                forecasts_state = production_schedule._get_forecasts_state(production_schedule_states_by_id, date_range, procurement_date)
+                forecasts_state = production_schedule._get_forecasts_state(production_schedule_states_by_id, date_range, procurement_date, forecasts_by_period=forecasts_by_period)
                 forecasts_state = forecasts_state[production_schedule.id]
                 for index, forecast_state in enumerate(forecasts_state):
                     production_schedule_state['forecast_ids'][index].update(forecast_state)
@@ -435,6 +881,232 @@ class MrpProductionSchedule(models.Model):
                 production_schedule_state['has_indirect_demand'] = has_indirect_demand
         return [production_schedule_states_by_id[_id] for _id in self.ids if _id in production_schedule_states_by_id]
 
+    def _add_indirect_demand(self, indirect_demand_qty, indirect_ratio_mps, date_range, date_start, lead_time_ignore_components, replenish_qty):
+        """ Add the demand generated by replenishing replenish_qty of self in
+        the period starting at date_start to the indirect demand of its
+        components schedules.
+        """
+        related_date = max(subtract(date_start, days=lead_time_ignore_components), fields.Date.today())
+        index = next(i for i, (dstart, dstop) in enumerate(date_range) if related_date <= dstart or (related_date >= dstart and related_date <= dstop))
+        for (product, ratio) in indirect_ratio_mps[(self.warehouse_id, self.product_id)].items():
+            related_key = (date_range[index], product, self.warehouse_id)
+            indirect_demand_qty[related_key] += ratio * replenish_qty
+
+    def _get_indirect_demand_by_schedule(self, date_range=None, use_stored=True):
+        """ Only compute the indirect demand of the schedules in self: the
+        quantities to replenish are propagated through the BoMs as in
+        _get_production_schedule_view_state, but the incoming and outgoing
+        quantities are only read for the first period, where they adjust the
+        quantity on hand, and the other cells are not computed.
+
+        A schedule is yielded as soon as all the schedules using it as a
+        component are computed, so its indirect demand is final and can be
+        consumed before the next BoM levels are computed.
+
+        param date_range: periods of the indirect demand, the periods of the
+        company by default
+        param use_stored: read the stored indirect demand when it's valid for
+        all the schedules in self (see mrp.mps.indirect.demand)
+        return: a generator of tuples (production schedule, list of the
+        indirect demand quantity of each period)
+        """
+        if date_range is None:
+            date_range = self.env.company._get_date_range()
+        if use_stored and self._use_stored_indirect_demand():
+            stored_indirect_demand = self.env['mrp.mps.indirect.demand']._get_indirect_demand(self, date_range)
+            if len(stored_indirect_demand) == len(self):
+                for production_schedule in self:
+                    yield production_schedule, stored_indirect_demand[production_schedule.id]
+                return
+        schedules_to_compute = self.env['mrp.production.schedule'].browse(self.get_impacted_schedule()) | self
+        indirect_demand_trees = schedules_to_compute._get_indirect_demand_tree()
+        indirect_ratio_mps = schedules_to_compute._get_indirect_demand_ratio_mps(indirect_demand_trees)
+        indirect_demand_order = schedules_to_compute._get_indirect_demand_order(indirect_demand_trees)
+        forecasts_by_period = schedules_to_compute._get_forecasts_by_period(date_range)
+        lead_days = schedules_to_compute._get_lead_days_map()
+        incoming_qty_done = outgoing_qty_done = {}
+        if date_range:
+            incoming_qty_done = schedules_to_compute._get_incoming_qty(date_range[:1], lead_days=lead_days)[1]
+            outgoing_qty_done = schedules_to_compute._get_outgoing_qty_by_horizon([date_range[:1]], lead_days=lead_days)[0][1]
+        indirect_demand_qty = defaultdict(float)
+        for production_schedule in indirect_demand_order:
+            rounding = production_schedule.product_id.uom_id.rounding
+            lead_time = production_schedule._get_lead_times(lead_days=lead_days)
+            lead_time_ignore_components = lead_time - production_schedule.product_id.product_tmpl_id.days_to_prepare_mo
+            starting_inventory_qty = production_schedule.product_id.with_context(warehouse=production_schedule.warehouse_id.id).qty_available
+            if date_range:
+                key = (date_range[0], production_schedule.product_id, production_schedule.warehouse_id)
+                starting_inventory_qty += outgoing_qty_done.get(key, 0.0) - incoming_qty_done.get(key, 0.0)
+            schedule_indirect_demand = []
+            for index, (date_start, date_stop) in enumerate(date_range):
+                key = ((date_start, date_stop), production_schedule.product_id, production_schedule.warehouse_id)
+                period_indirect_demand = float_round(indirect_demand_qty.get(key, 0.0), precision_rounding=rounding, rounding_method='UP')
+                schedule_indirect_demand.append(period_indirect_demand)
+                existing_forecasts = forecasts_by_period.get((production_schedule.id, index), {})
+                forecast_qty = float_round(existing_forecasts.get('forecast_qty', 0.0), precision_rounding=rounding)
+                if existing_forecasts.get('replenish_qty_updated'):
+                    replenish_qty = float_round(existing_forecasts['replenish_qty'], precision_rounding=rounding)
+                else:
+                    replenish_qty = float_round(production_schedule._get_replenish_qty(starting_inventory_qty - forecast_qty - period_indirect_demand), precision_rounding=rounding)
+                starting_inventory_qty = float_round(starting_inventory_qty - forecast_qty - period_indirect_demand + replenish_qty, precision_rounding=rounding)
+                if replenish_qty:
+                    production_schedule._add_indirect_demand(indirect_demand_qty, indirect_ratio_mps, date_range, date_start, lead_time_ignore_components, replenish_qty)
+            if production_schedule in self:
+                yield production_schedule, schedule_indirect_demand
+
+    def _get_view_state_aggregates(self, date_range, schedules_to_compute, precomputed_ids=()):
+        """ Read the quantities that only depend on the moves and the RFQ:
+        the incoming and outgoing quantities of the schedules in self and the
+        quantity on hand of schedules_to_compute. They do not change when a
+        cell is edited, so they can be shared by several computations of the
+        state of the same schedules.
+
+        param precomputed_ids: ids of the schedules of schedules_to_compute of
+        which the state is already known, only their lead days are read.
+
+        return: a dict with the lead days (see _get_lead_days_map), the
+        incoming, outgoing and on hand quantities
+        rtype: dict
+        """
+        # Resolve the stock rules of each schedule only once for the lead
+        # times, the moves and the RFQ domains.
+        lead_days = schedules_to_compute._get_lead_days_map()
+        incoming_qty, incoming_qty_done = self._get_incoming_qty(date_range, lead_days=lead_days)
+        outgoing_qty, outgoing_qty_done, outgoing_qty_year_minus_1, outgoing_qty_year_minus_2 = self._get_actual_demand(date_range, lead_days=lead_days)
+        # The quantity on hand of the other schedules is adjusted as well,
+        # so their indirect demand does not depend on the schedules in self.
+        other_schedules = schedules_to_compute - self - self.browse(precomputed_ids)
+        if other_schedules and date_range:
+            incoming_qty_done.update(other_schedules._get_incoming_qty(date_range[:1], lead_days=lead_days)[1])
+            outgoing_qty_done.update(other_schedules._get_outgoing_qty_by_horizon([date_range[:1]], lead_days=lead_days)[0][1])
+        return {
+            'lead_days': lead_days,
+            'incoming_qty': incoming_qty,
+            'incoming_qty_done': incoming_qty_done,
+            'outgoing_qty': outgoing_qty,
+            'outgoing_qty_done': outgoing_qty_done,
+            'outgoing_qty_year_minus_1': outgoing_qty_year_minus_1,
+            'outgoing_qty_year_minus_2': outgoing_qty_year_minus_2,
+            'qty_available': {
+                schedule.id: schedule.product_id.with_context(warehouse=schedule.warehouse_id.id).qty_available
+                for schedule in schedules_to_compute - self.browse(precomputed_ids)
+            },
+        }
+
+    def _get_projection(self, date_range, indirect_demand_order, indirect_ratio_mps, forecasts_by_period, aggregates):
+        """ Compute the quantities of the forecast cells of the schedules in
+        self with arrays of (schedules x periods) instead of cell by cell. The
+        schedules of a same BoM level do not depend on each other, so each
+        period is computed at once for all the schedules of a level, from the
+        top level to the lowest one. The result is the same as the one of the
+        loop of get_production_schedule_view_state.
+
+        return: for each schedule id, a list of dict by period with the
+        indirect demand, forecast, replenish, starting inventory and safety
+        stock quantities
+        rtype: dict
+        """
+        schedules = list(indirect_demand_order)
+        row_by_key = {(schedule.warehouse_id, schedule.product_id): row for row, schedule in enumerate(schedules)}
+        periods_count = len(date_range)
+        today = fields.Date.today().toordinal()
+        period_starts = np.array([date_start.toordinal() for date_start, dummy in date_range])
+
+        forecast_qty = np.zeros((len(schedules), periods_count))
+        manual_replenish_qty = np.zeros((len(schedules), periods_count))
+        replenish_qty_updated = np.zeros((len(schedules), periods_count), dtype=bool)
+        indirect_demand_qty = np.zeros((len(schedules), periods_count))
+        starting_inventory = np.zeros(len(schedules))
+        levels = [0] * len(schedules)
+        indirect_period_index = []
+        for row, schedule in enumerate(schedules):
+            for index in range(periods_count):
+                existing_forecasts = forecasts_by_period.get((schedule.id, index))
+                if existing_forecasts:
+                    forecast_qty[row, index] = existing_forecasts['forecast_qty']
+                    manual_replenish_qty[row, index] = existing_forecasts['replenish_qty']
+                    replenish_qty_updated[row, index] = existing_forecasts['replenish_qty_updated']
+            starting_inventory_qty = aggregates['qty_available'].get(schedule.id)
+            if starting_inventory_qty is None:
+                starting_inventory_qty = schedule.product_id.with_context(warehouse=schedule.warehouse_id.id).qty_available
+            if periods_count:
+                key = (date_range[0], schedule.product_id, schedule.warehouse_id)
+                starting_inventory_qty -= aggregates['incoming_qty_done'].get(key, 0.0)
+                starting_inventory_qty += aggregates['outgoing_qty_done'].get(key, 0.0)
+            starting_inventory[row] = starting_inventory_qty
+            # The indirect demand is set on the period starting at the
+            # beginning of the period minus the lead time, see
+            # get_production_schedule_view_state.
+            lead_time = schedule._get_lead_times(lead_days=aggregates['lead_days']) - schedule.product_id.product_tmpl_id.days_to_prepare_mo
+            related_dates = np.maximum(period_starts - lead_time, today)
+            indirect_period_index.append(np.maximum(np.searchsorted(period_starts, related_dates, side='right') - 1, 0))
+            # A component is always computed after the products using it.
+            for product in indirect_ratio_mps[(schedule.warehouse_id, schedule.product_id)]:
+                child_row = row_by_key.get((schedule.warehouse_id, product))
+                if child_row is not None and child_row > row:
+                    levels[child_row] = max(levels[child_row], levels[row] + 1)
+
+        rounding = np.array([schedule.product_id.uom_id.rounding for schedule in schedules])
+        forecast_qty = _float_round_array(forecast_qty, rounding)
+        manual_replenish_qty = _float_round_array(manual_replenish_qty, rounding)
+        target_qty = np.array([schedule.forecast_target_qty for schedule in schedules])
+        min_qty = np.array([schedule.min_to_replenish_qty for schedule in schedules])
+        max_qty = np.array([schedule.max_to_replenish_qty for schedule in schedules])
+        replenish_qty = np.zeros((len(schedules), periods_count))
+        starting_inventory_qty = np.zeros((len(schedules), periods_count))
+        safety_stock_qty = np.zeros((len(schedules), periods_count))
+
+        rows_by_level = defaultdict(list)
+        for row, level in enumerate(levels):
+            rows_by_level[level].append(row)
+        for level in sorted(rows_by_level):
+            rows = np.array(rows_by_level[level])
+            # The products using the schedules of the level are already
+            # computed, their indirect demand is complete.
+            indirect_demand_qty[rows] = _float_round_array(indirect_demand_qty[rows], rounding[rows], rounding_method='UP')
+            inventory_qty = starting_inventory[rows]
+            for index in range(periods_count):
+                forecasts = forecast_qty[rows, index]
+                indirect_demands = indirect_demand_qty[rows, index]
+                # Same clamping as _get_replenish_qty.
+                optimal_qty = target_qty[rows] - (inventory_qty - forecasts - indirect_demands)
+                computed_qty = np.where(optimal_qty > max_qty[rows], max_qty[rows],
+                    np.where(optimal_qty <= 0, 0.0,
+                        np.where(optimal_qty < min_qty[rows], min_qty[rows], optimal_qty)))
+                replenish = np.where(
+                    replenish_qty_updated[rows, index],
+                    manual_replenish_qty[rows, index],
+                    _float_round_array(computed_qty, rounding[rows]))
+                replenish_qty[rows, index] = replenish
+                starting_inventory_qty[rows, index] = _float_round_array(inventory_qty, rounding[rows])
+                inventory_qty = _float_round_array(inventory_qty - forecasts - indirect_demands + replenish, rounding[rows])
+                safety_stock_qty[rows, index] = inventory_qty
+            for row in rows:
+                schedule = schedules[row]
+                for product, ratio in indirect_ratio_mps[(schedule.warehouse_id, schedule.product_id)].items():
+                    child_row = row_by_key.get((schedule.warehouse_id, product))
+                    if child_row is not None and child_row > row:
+                        np.add.at(indirect_demand_qty[child_row], indirect_period_index[row], ratio * replenish_qty[row])
+
+        projection = {}
+        for row, schedule in enumerate(schedules):
+            projection[schedule.id] = [{
+                'indirect_demand_qty': indirect_demand,
+                'forecast_qty': forecast,
+                'replenish_qty': replenish,
+                'replenish_qty_updated': updated,
+                'starting_inventory_qty': starting_inventory_value,
+                'safety_stock_qty': safety_stock,
+            } for indirect_demand, forecast, replenish, updated, starting_inventory_value, safety_stock in zip(
+                indirect_demand_qty[row].tolist(),
+                forecast_qty[row].tolist(),
+                replenish_qty[row].tolist(),
+                replenish_qty_updated[row].tolist(),
+                starting_inventory_qty[row].tolist(),
+                safety_stock_qty[row].tolist(),
+            )]
+        return projection
+
     def get_impacted_schedule(self, domain=False):
         """ When the user modify the demand forecast on a schedule. The new
         replenish quantity is computed from schedules that use the product in
@@ -448,44 +1120,109 @@ class MrpProductionSchedule(models.Model):
         """
         if not domain:
             domain = []
+        bom_graph = self._get_bom_graph()
 
-        def _used_in_bom(products, related_products):
+        def _used_in_bom(product_ids):
             """ Bottom up from bom line to finished products in order to get
-            all the finished products that use 'products' as component.
+            all the finished products that use 'product_ids' as component.
             """
-            if not products:
-                return related_products
-            boms = products.bom_line_ids.mapped('bom_id')
-            products = boms.mapped('product_id') | boms.mapped('product_tmpl_id.product_variant_ids')
-            products -= related_products
-            related_products |= products
-            return _used_in_bom(products, related_products)
+            related_product_ids = set()
+            while product_ids:
+                product_ids = {
+                    finished_product_id
+                    for product_id in product_ids
+                    for finished_product_id in bom_graph['used_in'].get(product_id, ())
+                } - related_product_ids
+                related_product_ids |= product_ids
+            return related_product_ids
 
         supplying_mps = self.env['mrp.production.schedule'].search(
             AND([domain, [
                 ('warehouse_id', 'in', self.mapped('warehouse_id').ids),
-                ('product_id', 'in', _used_in_bom(self.mapped('product_id'), self.env['product.product']).ids)
+                ('product_id', 'in', list(_used_in_bom(set(self.product_id.ids))))
             ]]))
 
-        def _use_boms(products, related_products):
+        def _use_boms(product_ids):
             """ Explore bom line from products's BoMs in order to get components
             used.
             """
-            if not products:
-                return related_products
-            components = products.mapped(lambda product: product.bom_ids.bom_line_ids.filtered(lambda line: not line._skip_bom_line(product)).mapped('product_id'))
-
-            components -= related_products
-            related_products |= components
-            return _use_boms(components, related_products)
+            related_product_ids = set()
+            template_by_product = dict(bom_graph['template_by_product'])
+            template_by_product.update((product.id, product.product_tmpl_id.id) for product in self.product_id)
+            while product_ids:
+                components = set()
+                for product_id in product_ids:
+                    for component_id, line_id in bom_graph['components'].get(template_by_product.get(product_id), ()):
+                        # Only the lines restricted to some variants need the
+                        # product attributes.
+                        if line_id and self.env['mrp.bom.line'].browse(line_id)._skip_bom_line(self.env['product.product'].browse(product_id)):
+                            continue
+                        components.add(component_id)
+                product_ids = components - related_product_ids
+                related_product_ids |= product_ids
+            return related_product_ids
 
         supplied_mps = self.env['mrp.production.schedule'].search(
             AND([domain, [
                 ('warehouse_id', 'in', self.mapped('warehouse_id').ids),
-                ('product_id', 'in', _use_boms(self.mapped('product_id'), self.env['product.product']).ids)
+                ('product_id', 'in', list(_use_boms(set(self.product_id.ids))))
             ]]))
         return (supplying_mps | supplied_mps).ids
 
+    @api.model
+    def _invalidate_bom_graph(self):
+        """ Outdate the BoM graph of all the workers after a BoM, a BoM line,
+        a variant or a UoM is modified (see _get_bom_graph).
+        """
+        self.env['mrp.mps.bom.graph.invalidation']._log()
+
+    @api.model
+    @tools.ormcache('tuple(self.env.companies.ids)', "self.env['mrp.mps.bom.graph.invalidation']._get_version()")
+    def _get_bom_graph(self):
+        """ Index the BoMs by product ids in order to walk through them without
+        reading the BoMs and their lines at each level. The index is kept until
+        a BoM, a BoM line or a product variant is modified, i.e. until the
+        version logged by _invalidate_bom_graph changes.
+
+        return: a dict with
+        - used_in: for a component, the products manufactured with it, all the
+        variants of the template even for a BoM of a variant (as the former
+        search through the BoM lines)
+        - components: for a product template, the components of its BoMs with
+        the line when it only applies to some variants
+        - template_by_product: the template of each component
+        rtype: dict
+        """
+        boms = self.env['mrp.bom'].with_context(active_test=False).search_read([], ['product_id', 'product_tmpl_id', 'active'])
+        lines = self.env['mrp.bom.line'].search_read([], ['bom_id', 'product_id', 'bom_product_template_attribute_value_ids'])
+        variant_ids_by_template = defaultdict(list)
+        for variant in self.env['product.product'].search_read([('product_tmpl_id', 'in', list({bom['product_tmpl_id'][0] for bom in boms}))], ['product_tmpl_id']):
+            variant_ids_by_template[variant['product_tmpl_id'][0]].append(variant['id'])
+        boms_by_id = {bom['id']: bom for bom in boms}
+
+        used_in = defaultdict(set)
+        components = defaultdict(list)
+        for line in lines:
+            bom = boms_by_id.get(line['bom_id'][0])
+            if not bom:
+                continue
+            component_id = line['product_id'][0]
+            if bom['product_id']:
+                used_in[component_id].add(bom['product_id'][0])
+            used_in[component_id].update(variant_ids_by_template[bom['product_tmpl_id'][0]])
+            if bom['active']:
+                components[bom['product_tmpl_id'][0]].append((component_id, line['bom_product_template_attribute_value_ids'] and line['id']))
+        template_by_product = {
+            product['id']: product['product_tmpl_id'][0]
+            for product in self.env['product.product'].with_context(active_test=False).search_read(
+                [('id', 'in', list(used_in))], ['product_tmpl_id'])
+        }
+        return {
+            'used_in': {product_id: frozenset(product_ids) for product_id, product_ids in used_in.items()},
+            'components': {template_id: tuple(lines) for template_id, lines in components.items()},
+            'template_by_product': template_by_product,
+        }
+
     def remove_replenish_qty(self, date_index):
         """ Remove the quantity to replenish on the forecast cell.
 
@@ -499,6 +1236,7 @@ class MrpProductionSchedule(models.Model):
             'replenish_qty': 0.0,
             'replenish_qty_updated': False,
         })
+        self._update_stored_indirect_demand()
         return True
 
     def set_forecast_qty(self, date_index, quantity):
@@ -525,6 +1263,7 @@ class MrpProductionSchedule(models.Model):
                 'replenish_qty': 0,
                 'production_schedule_id': self.id
             })
+        self._update_stored_indirect_demand()
         return True
 
     def set_replenish_qty(self, date_index, quantity):
@@ -555,26 +1294,285 @@ class MrpProductionSchedule(models.Model):
                 'replenish_qty_updated': True,
                 'production_schedule_id': self.id
             })
+        self._update_stored_indirect_demand()
         return True
 
+    def update_forecast_cell(self, date_index, field_name, quantity=0.0, domain=False, loaded_ids=None, loaded_state=None):
+        """ Save a cell of the schedule in self and return only the values
+        that changed on it and on the schedules of its components, instead of
+        their whole state.
+
+        The schedules using self as component are not impacted. The cells of
+        self and of its components are only computed again from the first
+        period they are impacted by the modification, starting from their
+        previous state (see _get_forecast_cell_states), so the moves and the
+        RFQ are not read again.
+
+        param date_index: the manufacturing period
+        param field_name: 'forecast_qty', 'replenish_qty' or
+        'remove_replenish_qty'
+        param quantity: the new quantity
+        param domain: filter the impacted schedules with the domain
+        param loaded_ids: schedules already displayed by the client. The whole
+        state is returned for the impacted schedules not displayed.
+        param loaded_state: state of self displayed by the client, used as
+        previous state of self when the view states are not cached. The new
+        states are then neither cached nor stored.
+        return: a list of dict with the id of the schedule and either its
+        state ('state') or the values that changed ('values') and the forecast
+        cells that changed ('forecast_ids', list of dict with the index of the
+        period and the values that changed)
+        rtype: list
+        """
+        self.ensure_one()
+        if field_name not in ('forecast_qty', 'replenish_qty', 'remove_replenish_qty'):
+            raise UserError(_('The field %s cannot be modified from the Master Production Schedule.', field_name))
+        loaded_ids = set(loaded_ids or [])
+        schedules = self | self._get_component_schedules()
+        loaded_state = self._get_loaded_view_state(loaded_state)
+        old_states = self._get_previous_view_states(schedules, loaded_state)
+        # The states derived from the state sent by the client are only
+        # returned to it, they are never cached nor stored.
+        trusted_states = self._use_view_state_cache() or not loaded_state
+
+        production_schedule = self
+        if trusted_states:
+            # The stored indirect demand is updated from the new states.
+            production_schedule = self.with_context(mrp_mps_skip_stored_indirect_demand=True)
+        if field_name == 'forecast_qty':
+            production_schedule.set_forecast_qty(date_index, quantity)
+        elif field_name == 'replenish_qty':
+            production_schedule.set_replenish_qty(date_index, quantity)
+        else:
+            production_schedule.remove_replenish_qty(date_index)
+        new_states = self._get_forecast_cell_states(date_index, schedules, old_states)
+        if trusted_states:
+            all_states = dict(old_states, **{state['id']: state for state in new_states})
+            if self._use_view_state_cache():
+                schedules._set_cached_view_states(all_states)
+            if self._use_stored_indirect_demand():
+                self.env['mrp.mps.indirect.demand']._update_indirect_demand(schedules, incremental=True, indirect_demand={
+                    state_id: [forecast['indirect_demand_qty'] for forecast in state['forecast_ids']]
+                    for state_id, state in all_states.items()
+                })
+        if loaded_state:
+            old_states[self.id] = loaded_state
+
+        displayed_ids = set(schedules.filtered_domain(domain or []).ids) | {self.id}
+        new_states = [state for state in new_states if state['id'] in displayed_ids]
+        result = [{'id': state['id'], 'state': state} for state in new_states if state['id'] not in loaded_ids]
+        result += self._get_view_state_delta([old_states[_id] for _id in loaded_ids if _id in old_states], new_states)
+        return result
+
+    def _get_component_schedules(self):
+        """ Return the schedules of the components of the schedules in self,
+        at any BoM level, in the same warehouses.
+        """
+        return self.search([
+            ('warehouse_id', 'in', self.warehouse_id.ids),
+            ('product_id', 'in', list(self._get_component_product_ids(self.product_id))),
+        ]) - self
+
+    def _get_loaded_view_state(self, loaded_state):
+        """ Return a copy of the state of self sent by the client with the
+        dates of the periods, or False if it is not a state of self for the
+        current periods.
+        """
+        date_range = self.env.company._get_date_range()
+        if not loaded_state or loaded_state.get('id') != self.id or len(loaded_state.get('forecast_ids', ())) != len(date_range):
+            return False
+        loaded_state = copy.deepcopy(loaded_state)
+        # The dates are serialized by the client.
+        for (date_start, date_stop), forecast_values in zip(date_range, loaded_state['forecast_ids']):
+            forecast_values.update(date_start=date_start, date_stop=date_stop)
+        return loaded_state
+
+    def _get_previous_view_states(self, schedules, loaded_state=False):
+        """ States of schedules before a cell of self is modified. The cached
+        states (see _get_cached_production_schedule_view_state) are used when
+        the cache is enabled. Otherwise the state loaded by the client is the
+        one of self, to not read the moves and the RFQ again, and the other
+        states are computed from it.
+
+        return: the states by schedule id
+        rtype: dict
+        """
+        if self._use_view_state_cache():
+            states = schedules._get_cached_production_schedule_view_state()
+            return {state['id']: state for state in states}
+        precomputed_states = {self.id: loaded_state} if loaded_state else {}
+        states = (schedules - self.browse(precomputed_states))._get_production_schedule_view_state(precomputed_states=precomputed_states)
+        return dict(precomputed_states, **{state['id']: state for state in states})
+
+    def _get_forecast_cell_states(self, date_index, schedules, old_states):
+        """ Compute the states of schedules, the schedule in self and the
+        schedules of its components, after a cell of self was modified, from
+        their states before the modification. The quantities to replenish
+        only change from the period date_index for self, so the differences of
+        the quantities to replenish are propagated to the indirect demand of
+        the components, of which the cells are only computed again from the
+        first period with a different indirect demand. The starting inventory
+        of that period, the incoming and outgoing quantities are the previous
+        ones.
+
+        return: the new states of the schedules with a modified cell
+        rtype: list
+        """
+        self.ensure_one()
+        date_range = self.env.company._get_date_range()
+        indirect_demand_trees = schedules._get_indirect_demand_tree()
+        indirect_ratio_mps = schedules._get_indirect_demand_ratio_mps(indirect_demand_trees)
+        indirect_demand_order = schedules._get_indirect_demand_order(indirect_demand_trees)
+        forecasts_by_period = schedules._get_forecasts_by_period(date_range)
+        lead_days = schedules._get_lead_days_map()
+        # Difference of the indirect demand by period, product and warehouse.
+        indirect_demand_delta = defaultdict(float)
+        new_states = []
+        for production_schedule in indirect_demand_order:
+            old_state = old_states[production_schedule.id]
+            if production_schedule == self:
+                first_index = date_index
+            else:
+                first_index = next((
+                    index for index, period in enumerate(date_range)
+                    if indirect_demand_delta.get((period, production_schedule.product_id, production_schedule.warehouse_id))
+                ), None)
+                if first_index is None:
+                    continue
+            rounding = production_schedule.product_id.uom_id.rounding
+            lead_time = production_schedule._get_lead_times(lead_days=lead_days)
+            lead_time_ignore_components = lead_time - production_schedule.product_id.product_tmpl_id.days_to_prepare_mo
+            state = copy.deepcopy(old_state)
+            starting_inventory_qty = old_state['forecast_ids'][first_index]['starting_inventory_qty']
+            for index in range(first_index, len(date_range)):
+                date_start, date_stop = date_range[index]
+                old_forecast_values = old_state['forecast_ids'][index]
+                forecast_values = state['forecast_ids'][index]
+                key = ((date_start, date_stop), production_schedule.product_id, production_schedule.warehouse_id)
+                forecast_values['indirect_demand_qty'] = float_round(old_forecast_values['indirect_demand_qty'] + indirect_demand_delta.get(key, 0.0), precision_rounding=rounding, rounding_method='UP')
+                existing_forecasts = forecasts_by_period.get((production_schedule.id, index))
+                replenish_qty_updated = bool(existing_forecasts) and existing_forecasts['replenish_qty_updated']
+                forecast_values['forecast_qty'] = float_round(existing_forecasts['forecast_qty'], precision_rounding=rounding) if existing_forecasts else 0.0
+                if replenish_qty_updated:
+                    forecast_values['replenish_qty'] = float_round(existing_forecasts['replenish_qty'], precision_rounding=rounding)
+                else:
+                    replenish_qty = production_schedule._get_replenish_qty(starting_inventory_qty - forecast_values['forecast_qty'] - forecast_values['indirect_demand_qty'])
+                    forecast_values['replenish_qty'] = float_round(replenish_qty, precision_rounding=rounding)
+                forecast_values['replenish_qty_updated'] = replenish_qty_updated
+                forecast_values['starting_inventory_qty'] = float_round(starting_inventory_qty, precision_rounding=rounding)
+                forecast_values['safety_stock_qty'] = float_round(starting_inventory_qty - forecast_values['forecast_qty'] - forecast_values['indirect_demand_qty'] + forecast_values['replenish_qty'], precision_rounding=rounding)
+                starting_inventory_qty = forecast_values['safety_stock_qty']
+                replenish_qty_delta = forecast_values['replenish_qty'] - old_forecast_values['replenish_qty']
+                if replenish_qty_delta:
+                    production_schedule._add_indirect_demand(indirect_demand_delta, indirect_ratio_mps, date_range, date_start, lead_time_ignore_components, replenish_qty_delta)
+
+            procurement_date = add(fields.Date.today(), days=lead_time)
+            forecasts_state = production_schedule._get_forecasts_state({production_schedule.id: state}, date_range, procurement_date, forecasts_by_period=forecasts_by_period)
+            for forecast_values, forecast_state in zip(state['forecast_ids'], forecasts_state[production_schedule.id]):
+                forecast_values.update(forecast_state)
+            state['has_indirect_demand'] = any(forecast['indirect_demand_qty'] != 0 for forecast in state['forecast_ids'])
+            new_states.append(state)
+        return new_states
+
+    @api.model
+    def _get_view_state_delta(self, old_states, new_states):
+        """ Compare the states computed by get_production_schedule_view_state
+        and return the values that changed, see update_forecast_cell.
+        """
+        old_states_by_id = {state['id']: state for state in old_states}
+        deltas = []
+        for new_state in new_states:
+            old_state = old_states_by_id.get(new_state['id'])
+            if old_state is None:
+                continue
+            values = {
+                fname: value for fname, value in new_state.items()
+                if fname != 'forecast_ids' and old_state.get(fname) != value
+            }
+            forecast_deltas = []
+            for index, (old_forecast, new_forecast) in enumerate(zip(old_state['forecast_ids'], new_state['forecast_ids'])):
+                forecast_values = {
+                    fname: value for fname, value in new_forecast.items()
+                    if old_forecast.get(fname) != value
+                }
+                if forecast_values:
+                    forecast_deltas.append({'index': index, 'values': forecast_values})
+            if values or forecast_deltas:
+                deltas.append({'id': new_state['id'], 'values': values, 'forecast_ids': forecast_deltas})
+        return deltas
+
     def _filter_moves(self, moves_by_date, date_start, date_stop):
         return self.env['stock.move'].concat(*[m[0] for m in moves_by_date if m[1] >= date_start and m[1] <= date_stop])
 
     def _filter_rfq(self, rfq_by_date_planned, date_start, date_stop):
         return self.env['purchase.order.line'].concat(*[pl[0] for pl in rfq_by_date_planned if pl[1] >= date_start and pl[1] <= date_stop])
 
+    @api.model
+    def _get_period_index(self, date_range, date):
+        """ Return the index of the period in date_range that contains date,
+        -1 if the date is outside of the date range. The periods are contiguous
+        and sorted, so a bisection on their start dates is enough.
+        """
+        index = bisect_right([date_start for date_start, dummy in date_range], date) - 1
+        if index < 0 or date > date_range[index][1]:
+            return -1
+        return index
+
     def _get_procurement_extra_values(self, forecast_values):
         """ Extra values that could be added in the vals for procurement.
 
         return values pass to the procurement run method.
         rtype dict
         """
-        return {
+        values = {
             'date_planned': forecast_values['date_start'],
             'warehouse_id': self.warehouse_id,
         }
-
-    def _get_forecasts_state(self, production_schedule_states, date_range, procurement_date):
+        if self.env.context.get('mps_replenish_job_id'):
+            values['mps_replenish_job_id'] = self.env.context['mps_replenish_job_id']
+        return values
+
+    def _get_forecasts_by_period(self, date_range):
+        """ Read the forecasts of all the schedules in self at once and group
+        them by period. The periods are contiguous, so a forecast is assigned
+        to its period with a bisection on the sorted start dates instead of
+        filtering the forecasts of each schedule for each period.
+
+        param date_range: list of periods used in order to group the forecasts
+        return: a dict with as key a tuple (production schedule id, period
+        index) and as values the summed forecast_qty and replenish_qty, the
+        replenish_qty_updated and procurement_launched flags and the ids of the
+        forecasts in the period.
+        rtype: dict
+        """
+        forecasts_by_period = {}
+        if not self or not date_range:
+            return forecasts_by_period
+        forecasts = self.env['mrp.product.forecast'].search_read([
+            ('production_schedule_id', 'in', self.ids),
+            ('date', '>=', date_range[0][0]),
+            ('date', '<=', date_range[-1][1]),
+        ], ['production_schedule_id', 'date', 'forecast_qty', 'replenish_qty', 'replenish_qty_updated', 'procurement_launched'])
+        for forecast in forecasts:
+            index = self._get_period_index(date_range, forecast['date'])
+            if index < 0:
+                continue
+            key = (forecast['production_schedule_id'][0], index)
+            values = forecasts_by_period.setdefault(key, {
+                'forecast_qty': 0.0,
+                'replenish_qty': 0.0,
+                'replenish_qty_updated': False,
+                'procurement_launched': False,
+                'ids': [],
+            })
+            values['forecast_qty'] += forecast['forecast_qty']
+            values['replenish_qty'] += forecast['replenish_qty']
+            values['replenish_qty_updated'] |= forecast['replenish_qty_updated']
+            values['procurement_launched'] |= forecast['procurement_launched']
+            values['ids'].append(forecast['id'])
+        return forecasts_by_period
+
+    def _get_forecasts_state(self, production_schedule_states, date_range, procurement_date, forecasts_by_period=None):
         """ Return the state for each forecast cells.
         - to_relaunch: A procurement has been launched for the same date range
         but a replenish modification require a new procurement.
@@ -594,10 +1592,14 @@ class MrpProductionSchedule(models.Model):
         param production_schedule_states: schedules with a state to compute
         param date_range: list of period where a state should be computed
         param procurement_date: today + lead times for products in self
+        param forecasts_by_period: forecasts grouped by period as returned by
+        _get_forecasts_by_period, read from self if not given
         return: the state for each time slot in date_range for each schedule in
         production_schedule_states
         rtype: dict
         """
+        if forecasts_by_period is None:
+            forecasts_by_period = self._get_forecasts_by_period(date_range)
         forecasts_state = defaultdict(list)
         for production_schedule in self:
             forecast_values = production_schedule_states[production_schedule.id]['forecast_ids']
@@ -605,8 +1607,8 @@ class MrpProductionSchedule(models.Model):
             for index, (date_start, date_stop) in enumerate(date_range):
                 forecast_state = {}
                 forecast_value = forecast_values[index]
-                existing_forecasts = production_schedule.forecast_ids.filtered(lambda p: p.date >= date_start and p.date <= date_stop)
-                procurement_launched = any(existing_forecasts.mapped('procurement_launched'))
+                existing_forecasts = forecasts_by_period.get((production_schedule.id, index))
+                procurement_launched = bool(existing_forecasts) and existing_forecasts['procurement_launched']
 
                 replenish_qty = forecast_value['replenish_qty']
                 incoming_qty = forecast_value['incoming_qty']
@@ -634,12 +1636,80 @@ class MrpProductionSchedule(models.Model):
                 forecasts_state[production_schedule.id].append(forecast_state)
         return forecasts_state
 
-    def _get_lead_times(self):
+    def _get_lead_times(self, lead_days=None):
         """ Get the lead time for each product in self. The lead times are
         based on rules lead times + produce delay or supplier info delay.
+
+        param lead_days: lead days already resolved by _get_lead_days_map
         """
-        rules = self.product_id._get_rules_from_location(self.warehouse_id.lot_stock_id)
-        return rules._get_lead_days(self.product_id)[0]
+        return self._get_schedule_lead_days('all', lead_days=lead_days)
+
+    def _get_schedule_lead_days(self, rule_filter, lead_days=None):
+        """ Return the lead days of the schedule in self for rule_filter
+        ('all' or 'transit', see _get_lead_days_map), from lead_days if given.
+        """
+        self.ensure_one()
+        key = (self.product_id.id, self.warehouse_id.id, rule_filter)
+        if lead_days is None or key not in lead_days:
+            lead_days = self._get_lead_days_map()
+        return lead_days[key]
+
+    def _get_lead_days_map(self):
+        """ Resolve the stock rules of the schedules in self once and return
+        the lead days of each of them:
+        - 'all': with all the rules, used for the lead times and the RFQ.
+        - 'transit': without the buy and manufacture rules, used for the
+        moves.
+
+        The result is meant to be passed to every method using the lead days
+        during the same computation. If the system parameter
+        `mrp_mps.lead_days_cache` is set, the lead days are also kept between
+        requests, until a rule, a route, a vendor pricelist or a BoM changes.
+
+        return: a dict with as key a tuple (product id, warehouse id, rule
+        filter) and as value the lead days
+        rtype: dict
+        """
+        use_cache = self._use_lead_days_cache()
+        lead_days = {}
+        for schedule in self:
+            product, warehouse = schedule.product_id, schedule.warehouse_id
+            if (product.id, warehouse.id, 'all') in lead_days:
+                continue
+            if use_cache:
+                all_lead_days, transit_lead_days = self._get_lead_days_cached(product.id, warehouse.id)
+            else:
+                all_lead_days, transit_lead_days = self._compute_lead_days(product, warehouse)
+            lead_days[product.id, warehouse.id, 'all'] = all_lead_days
+            lead_days[product.id, warehouse.id, 'transit'] = transit_lead_days
+        return lead_days
+
+    @api.model
+    def _compute_lead_days(self, product, warehouse):
+        rules = product._get_rules_from_location(warehouse.lot_stock_id)
+        all_lead_days = rules._get_lead_days(product)[0]
+        transit_lead_days = rules.filtered(lambda r: r.action not in ['buy', 'manufacture'])._get_lead_days(product)[0]
+        return all_lead_days, transit_lead_days
+
+    @api.model
+    @tools.ormcache('product_id', 'warehouse_id', 'self.env.company.id')
+    def _get_lead_days_cached(self, product_id, warehouse_id):
+        return self._compute_lead_days(self.env['product.product'].browse(product_id), self.env['stock.warehouse'].browse(warehouse_id))
+
+    @api.model
+    def _use_lead_days_cache(self):
+        return str2bool(self.env['ir.config_parameter'].sudo().get_param('mrp_mps.lead_days_cache', 'False'))
+
+    @api.model
+    def _invalidate_lead_days_cache(self, products=None):
+        """ Called when a record used to compute the lead days is modified.
+
+        param products: the products of which the lead days changed, all of
+        them if None
+        """
+        if self._use_lead_days_cache() or self._use_view_state_cache():
+            self.clear_caches()
+        self._invalidate_stored_indirect_demand(products)
 
     def _get_replenish_qty(self, after_forecast_qty):
         """ Modify the quantity to replenish depending the min/max and targeted
@@ -663,19 +1733,24 @@ class MrpProductionSchedule(models.Model):
 
         return replenish_qty
 
-    def _get_incoming_qty(self, date_range):
+    def _get_incoming_qty(self, date_range, lead_days=None):
         """ Get the incoming quantity from RFQ and existing moves.
 
         param: list of time slots used in order to group incoming quantity.
+        param lead_days: lead days already resolved by _get_lead_days_map
         return: a dict with as key a production schedule and as values a list
         of incoming quantity for each date range.
         """
+        if lead_days is None:
+            lead_days = self._get_lead_days_map()
+        if self._use_sql_aggregates():
+            return self._get_incoming_qty_grouped(date_range, lead_days=lead_days)
         incoming_qty = defaultdict(float)
         incoming_qty_done = defaultdict(float)
         after_date = date_range[0][0]
         before_date = date_range[-1][1]
         # Get quantity in RFQ
-        rfq_domain = self._get_rfq_domain(after_date, before_date)
+        rfq_domain = self._get_rfq_domain(after_date, before_date, lead_days=lead_days)
         rfq_lines_date_planned = self._get_rfq_and_planned_date(rfq_domain, order='date_planned')
         rfq_lines_date_planned = sorted(rfq_lines_date_planned, key=lambda i: i[1])
         index = 0
@@ -697,7 +1772,7 @@ class MrpProductionSchedule(models.Model):
         # Get quantity on incoming moves
         # TODO: issue since it will use one search by move. Should use a
         # read_group with a group by location.
-        domain_moves = self._get_moves_domain(after_date, before_date, 'incoming')
+        domain_moves = self._get_moves_domain(after_date, before_date, 'incoming', lead_days=lead_days)
         stock_moves_and_date = self._get_moves_and_date(domain_moves)
         stock_moves_and_date = sorted(stock_moves_and_date, key=lambda m: m[1])
         index = 0
@@ -716,6 +1791,47 @@ class MrpProductionSchedule(models.Model):
 
         return incoming_qty, incoming_qty_done
 
+    def _get_actual_demand(self, date_range, lead_days=None):
+        """ Get the outgoing quantity for the periods of date_range and the
+        actual demand for the same periods the previous years. The actual
+        demand of the previous years is only computed if it's displayed. It is
+        read from the history of the closed periods, the schedules without a
+        complete history are computed from the moves, in the same search than
+        the current periods when possible.
+
+        return: a tuple (outgoing_qty, outgoing_qty_done,
+        outgoing_qty_year_minus_1, outgoing_qty_year_minus_2)
+        rtype: tuple
+        """
+        company = self.env.company
+        history = self.env['mrp.mps.demand.history']
+        outgoing_qty_year_minus = {1: {}, 2: {}}
+        schedules_without_history = self.env['mrp.production.schedule']
+        date_ranges_without_history = {}
+        for years in outgoing_qty_year_minus:
+            if not company['mrp_mps_show_actual_demand_year_minus_%d' % years]:
+                continue
+            date_range_year_minus = company._get_date_range(years=years)
+            outgoing_qty_year_minus[years], missing_schedules = history._get_outgoing_qty(self, date_range_year_minus)
+            if missing_schedules:
+                schedules_without_history |= missing_schedules
+                date_ranges_without_history[years] = date_range_year_minus
+
+        date_ranges = {0: date_range}
+        if schedules_without_history == self:
+            date_ranges.update(date_ranges_without_history)
+        outgoing_qty_by_years = dict(zip(date_ranges, self._get_outgoing_qty_by_horizon(list(date_ranges.values()), lead_days=lead_days)))
+        if schedules_without_history and schedules_without_history != self:
+            outgoing_qty_by_years.update(zip(
+                date_ranges_without_history,
+                schedules_without_history._get_outgoing_qty_by_horizon(list(date_ranges_without_history.values()), lead_days=lead_days)
+            ))
+        for years in date_ranges_without_history:
+            outgoing_qty_year_minus[years].update(outgoing_qty_by_years[years][1])
+
+        outgoing_qty, outgoing_qty_done = outgoing_qty_by_years[0]
+        return outgoing_qty, outgoing_qty_done, outgoing_qty_year_minus[1], outgoing_qty_year_minus[2]
+
     def _get_indirect_demand_order(self, indirect_demand_trees):
         """ return a new order for record in self. The order returned ensure
         that the indirect demand from a record in the set could only be modified
@@ -723,62 +1839,117 @@ class MrpProductionSchedule(models.Model):
         states of multiple schedules only once by schedule and avoid to
         recompute a state because its indirect demand was a depend from another
         schedule.
-        """
-        product_ids = self.mapped('product_id')
-
-        def _get_pre_order(node):
-            order_list = []
-            if node.product in product_ids:
-                order_list.append(node.product)
-            for child in node.children:
-                order_list += _get_pre_order(child)
-            return order_list
-
-        product_order_by_tree = []
-        for node in indirect_demand_trees:
-            product_order_by_tree += _get_pre_order(node)
 
-        product_order = OrderedDict()
-        for product in reversed(product_order_by_tree):
-            if product not in product_order:
-                product_order[product] = True
+        The schedules are sorted by the low level code of their product (see
+        _get_low_level_codes), the order of self is kept inside a level.
+        """
+        low_level_codes = self._get_low_level_codes(indirect_demand_trees)
+        return self.sorted(lambda mps: low_level_codes.get(mps.product_id, 0))
 
-        mps_order_by_product = defaultdict(lambda: self.env['mrp.production.schedule'])
-        for mps in self:
-            mps_order_by_product[mps.product_id] |= mps
+    def _get_low_level_codes(self, indirect_demand_trees):
+        """ Return the low level code of each product of the trees: the
+        deepest BoM level where the product is used, 0 for the finished
+        products. A product is only computed after all the products using it,
+        at any level, since their level is lower. Each product is visited once
+        whatever the number of BoMs using it (topological sort of Kahn).
 
-        mps_order = self.env['mrp.production.schedule']
-        for product in reversed(product_order.keys()):
-            mps_order |= mps_order_by_product[product]
-        return mps_order
+        The products of recursive BoMs get the level after the deepest one, so
+        only their indirect demand is wrong instead of failing all the
+        schedules.
 
-    def _get_indirect_demand_ratio_mps(self, indirect_demand_trees):
-        """ Return {(warehouse, product): {product: ratio}} dict containing the indirect ratio
-        between two products.
+        :return: a dict with the level by product
+        :rtype: dict
+        """
+        children_by_product = {}
+        in_degree = defaultdict(int)
+        nodes = list(indirect_demand_trees)
+        while nodes:
+            node = nodes.pop()
+            if node.product in children_by_product:
+                continue
+            children_by_product[node.product] = [child.product for child in node.children]
+            for child in node.children:
+                in_degree[child.product] += 1
+                nodes.append(child)
+
+        low_level_codes = {product: 0 for product in children_by_product if not in_degree[product]}
+        products_to_visit = list(low_level_codes)
+        while products_to_visit:
+            product = products_to_visit.pop()
+            for child in children_by_product[product]:
+                low_level_codes[child] = max(low_level_codes.get(child, 0), low_level_codes[product] + 1)
+                in_degree[child] -= 1
+                if not in_degree[child]:
+                    products_to_visit.append(child)
+        # The remaining products are used by themselves at some level, as well
+        # as the products of self missing from the trees.
+        recursive_products = [product for product in children_by_product if product not in low_level_codes]
+        recursive_products += [product for product in self.product_id if product not in children_by_product]
+        if recursive_products:
+            _logger.warning('The bills of materials of the following products are recursive: %s', ', '.join(product.display_name for product in recursive_products))
+            recursive_level = max(low_level_codes.values(), default=-1) + 1
+            low_level_codes.update((product, recursive_level) for product in recursive_products)
+        return low_level_codes
+
+    def _get_indirect_demand_ratio_mps(self, indirect_demand_trees=None):
+        """ Return {(warehouse, product): {product: ratio}} dict containing the
+        effective ratios between the schedules in self and the schedules of
+        their components in the same warehouse: the quantity of a component
+        schedule needed to replenish one unit of the product, through the BoM
+        levels without a schedule (e.g. B1 -2-> B2 -3-> B3 with schedules for
+        B1 and B3 only gives a ratio of 6 between B1 and B3).
+
+        Only the products reachable from self are explored (see
+        _get_indirect_demand_tree), so a recursive BoM elsewhere does not
+        prevent the computation.
+
+        param indirect_demand_trees: the trees of self if already computed
         """
-        by_warehouse_mps = defaultdict(lambda: self.env['mrp.production.schedule'])
+        if indirect_demand_trees is None:
+            indirect_demand_trees = self._get_indirect_demand_tree()
+        low_level_codes = self._get_low_level_codes(indirect_demand_trees)
+
+        lines_by_product = {}
+        nodes = list(indirect_demand_trees)
+        while nodes:
+            node = nodes.pop()
+            if node.product in lines_by_product:
+                continue
+            lines_by_product[node.product] = [(child.product, child.ratio) for child in node.children]
+            nodes += node.children
+        for product in low_level_codes.keys() - lines_by_product.keys():
+            lines_by_product[product] = []
+        # The components before the products using them.
+        products = sorted(low_level_codes, key=lambda product: -low_level_codes[product])
+
+        products_by_warehouse = defaultdict(set)
+        for values in self.env['mrp.production.schedule'].search_read([
+            ('warehouse_id', 'in', self.warehouse_id.ids),
+            ('product_id', 'in', [product.id for product in products]),
+        ], ['warehouse_id', 'product_id']):
+            products_by_warehouse[values['warehouse_id'][0]].add(values['product_id'][0])
+
+        ratios_by_warehouse = {}
+        for warehouse in self.warehouse_id:
+            mps_product_ids = products_by_warehouse[warehouse.id]
+            # Ratios of each product to the schedules below it, the levels
+            # without schedule being collapsed.
+            ratios_by_product = {}
+            for product in products:
+                ratios = defaultdict(float)
+                for component, ratio in lines_by_product[product]:
+                    if component.id in mps_product_ids:
+                        ratios[component] += ratio
+                        continue
+                    # The components of a recursive BoM may not be computed.
+                    for mps_component, component_ratio in ratios_by_product.get(component, {}).items():
+                        ratios[mps_component] += ratio * component_ratio
+                ratios_by_product[product] = ratios
+            ratios_by_warehouse[warehouse] = ratios_by_product
+
+        result = defaultdict(dict)
         for mps in self:
-            by_warehouse_mps[mps.warehouse_id] |= mps
-
-        result = defaultdict(lambda: defaultdict(float))
-        for warehouse_id, other_mps in by_warehouse_mps.items():
-            other_mps_product_ids = other_mps.mapped('product_id')
-            subtree_visited = set()
-
-            def _dfs_ratio_search(current_node, ratio, node_indirect=False):
-                for child in current_node.children:
-                    if child.product in other_mps_product_ids:
-                        result[(warehouse_id, node_indirect and node_indirect.product or current_node.product)][child.product] += ratio * child.ratio
-                        if child.product in subtree_visited:  # Don't visit the same subtree twice
-                            continue
-                        subtree_visited.add(child.product)
-                        _dfs_ratio_search(child, 1.0, node_indirect=False)
-                    else:  # Hidden Bom => continue DFS and set node_indirect
-                        _dfs_ratio_search(child, child.ratio * ratio, node_indirect=current_node)
-
-            for tree in indirect_demand_trees:
-                _dfs_ratio_search(tree, tree.ratio)
-
+            result[(mps.warehouse_id, mps.product_id)] = dict(ratios_by_warehouse[mps.warehouse_id].get(mps.product_id, {}))
         return result
 
     def _get_indirect_demand_tree(self):
@@ -793,46 +1964,87 @@ class MrpProductionSchedule(models.Model):
         Return a list of namedtuple that represent on top the schedules without
         indirect demand and on lowest leaves the schedules that are the most
         influenced by the others.
-        """
-        bom_by_product = self.env['mrp.bom']._bom_find(self.product_id)
 
+        The children of a product are shared by all the nodes of the product,
+        so a sub-assembly is only expanded once, and the BoM lines of the
+        products are read from _get_indirect_demand_lines.
+        """
         Node = namedtuple('Node', ['product', 'ratio', 'children'])
-        indirect_demand_trees = {}
-        product_visited = {}
-
-        def _get_product_tree(product, ratio):
-            product_tree = product_visited.get(product)
-            if product_tree:
-                return Node(product_tree.product, ratio, product_tree.children)
-
-            product_tree = Node(product, ratio, [])
-            product_bom = bom_by_product.get(product)
-            if product not in bom_by_product and not product_bom:
-                product_bom = self.env['mrp.bom']._bom_find(product)[product]
-            for line in product_bom.bom_line_ids:
-                if line._skip_bom_line(product):
-                    continue
-                line_qty = line.product_uom_id._compute_quantity(line.product_qty, line.product_id.uom_id)
-                bom_qty = line.bom_id.product_uom_id._compute_quantity(line.bom_id.product_qty, line.bom_id.product_tmpl_id.uom_id)
-                ratio = line_qty / bom_qty
-                tree = _get_product_tree(line.product_id, ratio)
-                product_tree.children.append(tree)
-                if line.product_id in indirect_demand_trees:
-                    del indirect_demand_trees[line.product_id]
-            product_visited[product] = product_tree
-            return product_tree
-
-        for product in self.mapped('product_id'):
-            if product in product_visited:
-                continue
-            indirect_demand_trees[product] = _get_product_tree(product, 1.0)
+        lines_by_product = self._get_indirect_demand_lines(self.product_id)
+        Product = self.env['product.product']
+        children_by_product = {product_id: [] for product_id in lines_by_product}
+        components = set()
+        for product_id, lines in lines_by_product.items():
+            for component_id, ratio in lines:
+                children_by_product[product_id].append(Node(Product.browse(component_id), ratio, children_by_product[component_id]))
+                components.add(component_id)
+        return [Node(product, 1.0, children_by_product[product.id]) for product in self.product_id if product.id not in components]
 
-        return [tree for tree in indirect_demand_trees.values()]
+    @api.model
+    def _get_indirect_demand_lines(self, products):
+        """ Return the components of products and of their components at any
+        level, with the quantity of each component for one unit of its
+        product, in the UoM of the products.
+
+        The BoMs are explored level by level, the BoMs of a level are found at
+        once. The lines of each product are kept by
+        _get_indirect_demand_lines_store, so only the products never explored
+        are searched.
+
+        return: {product id: ((component id, ratio), ...)} for products and
+        all the components reachable from them
+        rtype: dict
+        """
+        known_lines = self._get_indirect_demand_lines_store()
+        lines_by_product = {}
+        products_to_explore = products
+        while products_to_explore:
+            missing_products = products_to_explore.filtered(lambda product: product.id not in known_lines)
+            if missing_products:
+                bom_by_product = self.env['mrp.bom']._bom_find(missing_products)
+                for product in missing_products:
+                    lines = []
+                    for line in bom_by_product.get(product, self.env['mrp.bom']).bom_line_ids:
+                        if line._skip_bom_line(product):
+                            continue
+                        line_qty = line.product_uom_id._compute_quantity(line.product_qty, line.product_id.uom_id)
+                        bom_qty = line.bom_id.product_uom_id._compute_quantity(line.bom_id.product_qty, line.bom_id.product_tmpl_id.uom_id)
+                        lines.append((line.product_id.id, line_qty / bom_qty))
+                    known_lines[product.id] = tuple(lines)
+            component_ids = set()
+            for product in products_to_explore:
+                lines_by_product[product.id] = known_lines[product.id]
+                component_ids.update(component_id for component_id, ratio in known_lines[product.id])
+            products_to_explore = self.env['product.product'].browse(component_ids - lines_by_product.keys())
+        return lines_by_product
+
+    @api.model
+    @tools.ormcache('tuple(self.env.companies.ids)', 'self.env.company.id', 'self.env.uid', "self.env['mrp.mps.bom.graph.invalidation']._get_version()")
+    def _get_indirect_demand_lines_store(self):
+        """ Lines of the products explored by _get_indirect_demand_lines. The
+        BoMs found depend on the company and on the records the user can
+        read, and the store is replaced when a BoM, a BoM line, a product or
+        a UoM is modified (see _invalidate_bom_graph).
+        """
+        return {}
 
-    def _get_moves_domain(self, date_start, date_stop, type):
+    def _get_moves_domain(self, date_start, date_stop, type, lead_days=None):
         """ Return domain for incoming or outgoing moves """
+        return self._get_moves_domain_by_intervals([(date_start, date_stop)], type, lead_days=lead_days)
+
+    def _get_moves_domain_by_intervals(self, intervals, type, lead_days=None):
+        """ Return domain for incoming or outgoing moves in any of the
+        intervals. It allows to fetch the moves for several horizons (e.g. the
+        same periods the previous years) in a single search.
+
+        :param intervals: list of tuple (date_start, date_stop)
+        :param type: 'incoming' or 'outgoing'
+        :param lead_days: lead days already resolved by _get_lead_days_map
+        """
         if not self:
             return [('id', '=', False)]
+        if lead_days is None:
+            lead_days = self._get_lead_days_map()
         location = type == 'incoming' and 'location_dest_id' or 'location_id'
         location_dest = type == 'incoming' and 'location_id' or 'location_dest_id'
         domain = []
@@ -846,12 +2058,10 @@ class MrpProductionSchedule(models.Model):
                 '!',
                     (location_dest, 'child_of', self.mapped('warehouse_id.view_location_id').ids),
             ('is_inventory', '=', False),
-            ('date', '<=', date_stop),
         ]
         groupby_delay = defaultdict(list)
         for schedule in self:
-            rules = schedule.product_id._get_rules_from_location(schedule.warehouse_id.lot_stock_id)
-            delay, dummy = rules.filtered(lambda r: r.action not in ['buy', 'manufacture'])._get_lead_days(schedule.product_id)
+            delay = schedule._get_schedule_lead_days('transit', lead_days=lead_days)
             groupby_delay[delay].append((schedule.product_id, schedule.warehouse_id))
         for delay in groupby_delay:
             products, warehouses = zip(*groupby_delay[delay])
@@ -860,31 +2070,76 @@ class MrpProductionSchedule(models.Model):
             specific_domain = [
                 (location, 'child_of', warehouses.mapped('view_location_id').ids),
                 ('product_id', 'in', products.ids),
-                ('date', '>=', date_start - relativedelta(days=delay)),
             ]
-            domain = OR([domain, AND([common_domain, specific_domain])])
+            dates_domain = OR([[
+                ('date', '>=', date_start - relativedelta(days=delay)),
+                ('date', '<=', date_stop),
+            ] for date_start, date_stop in intervals])
+            domain = OR([domain, AND([common_domain, specific_domain, dates_domain])])
         return domain
 
     @api.model
     def _get_dest_moves_delay(self, move, delay=0):
-        if move.origin_returned_move_id:
-            return delay
-        elif not move.move_dest_ids:
-            return delay + move.rule_id.delay
-        else:
-            delays = []
-            additional_delay = move.rule_id.delay
-            for move_dest in move.move_dest_ids:
-                delays.append(self._get_dest_moves_delay(
-                    move_dest, delay=delay + additional_delay))
-            return max(delays)
+        return delay + self._get_dest_moves_delays(move)[move.id]
+
+    @api.model
+    def _get_dest_moves_delays(self, moves):
+        """ Return the delay to add to the date of each move in order to get
+        the date at which its product is available at the end of its chain of
+        destination moves: the maximum of the cumulated rule delays over the
+        destination moves.
+
+        The move graph is read level by level for all the moves at once and
+        the delay of each move is computed only once, even if it's shared
+        between several chains (e.g. 3 steps reception or resupply from another
+        warehouse). The graph is walked with an explicit stack in order to not
+        depend on the recursion limit for long chains.
+
+        param moves: stock.move recordset
+        return: a dict with as key a move id and as value its delay in days
+        rtype: dict
+        """
+        # move id: (is a return, rule delay, destination move ids)
+        graph = {}
+        level = moves
+        while level:
+            for move in level:
+                graph[move.id] = (bool(move.origin_returned_move_id), move.rule_id.delay, move.move_dest_ids.ids)
+            level = level.filtered(lambda m: not m.origin_returned_move_id).move_dest_ids
+            level = level.filtered(lambda m: m.id not in graph)
+
+        delays = {}
+        visiting = set()
+        for move_id in moves.ids:
+            stack = [move_id]
+            while stack:
+                current_id = stack[-1]
+                if current_id in delays:
+                    stack.pop()
+                    continue
+                is_return, rule_delay, dest_ids = graph[current_id]
+                if is_return:
+                    stack.pop()
+                    delays[current_id] = 0
+                    continue
+                if current_id not in visiting:
+                    # First visit, compute the destination moves before. A
+                    # destination move being visited means a cycle, it's
+                    # ignored.
+                    visiting.add(current_id)
+                    stack.extend(dest_id for dest_id in dest_ids if dest_id not in delays and dest_id not in visiting)
+                    continue
+                stack.pop()
+                visiting.discard(current_id)
+                delays[current_id] = rule_delay + max((delays.get(dest_id, 0) for dest_id in dest_ids), default=0)
+        return delays
 
     def _get_moves_and_date(self, moves_domain, order=False):
         moves = self.env['stock.move'].search(moves_domain, order=order)
+        delays = self._get_dest_moves_delays(moves)
         res_moves = []
         for move in moves:
-            delay = self._get_dest_moves_delay(move)
-            date = fields.Date.to_date(move.date) + relativedelta(days=delay)
+            date = fields.Date.to_date(move.date) + relativedelta(days=delays[move.id])
             res_moves.append((move, date))
         return res_moves
 
@@ -893,44 +2148,66 @@ class MrpProductionSchedule(models.Model):
         return a dict with as key a production schedule and as values a list
         of outgoing quantity for each date range.
         """
-        outgoing_qty = defaultdict(float)
-        outgoing_qty_done = defaultdict(float)
-        after_date = date_range[0][0]
-        before_date = date_range[-1][1]
-        # Get quantity on incoming moves
-
-        domain_moves = self._get_moves_domain(after_date, before_date, 'outgoing')
+        return self._get_outgoing_qty_by_horizon([date_range])[0]
+
+    def _get_outgoing_qty_by_horizon(self, date_ranges, lead_days=None):
+        """ Get the outgoing quantity from existing moves for several date
+        ranges, e.g. the current periods and the same periods the previous
+        years. The moves of all the date ranges are fetched at once and the
+        lead times are only computed once, then the quantities are split by
+        date range.
+
+        param date_ranges: list of date ranges (list of time slots)
+        param lead_days: lead days already resolved by _get_lead_days_map
+        return: a list with for each date range the same tuple of dicts than
+        _get_outgoing_qty
+        rtype: list
+        """
+        intervals = [(date_range[0][0], date_range[-1][1]) for date_range in date_ranges]
+        domain_moves = self._get_moves_domain_by_intervals(intervals, 'outgoing', lead_days=lead_days)
         domain_moves = AND([domain_moves, [('raw_material_production_id', '=', False)]])
-        stock_moves_by_date = self._get_moves_and_date(domain_moves)
-        stock_moves_by_date = sorted(stock_moves_by_date, key=lambda m: m[1])
-        index = 0
-        for (move, date) in stock_moves_by_date:
-            # There are cases when we want to consider moves where their (scheduled) date occurs before the after_date
-            # if lead times make their stock delivery at a relevant time. Therefore we need to ignore the lines that have
-            # date + lead time < after_date. Similar logic with before_date
-            if date < after_date or date > before_date:
-                continue
-            # Skip to the next time range if the planned date is not in the
-            # current time interval.
-            while not (date_range[index][0] <= date and date_range[index][1] >= date):
-                index += 1
-            key = (date_range[index], move.product_id, move.location_id.warehouse_id)
-            if move.state == 'done':
-                outgoing_qty_done[key] += move.product_qty
-            else:
-                outgoing_qty[key] += move.product_qty
+        if self._use_sql_aggregates():
+            moves_qty = [
+                (self.env['product.product'].browse(product_id), self.env['stock.warehouse'].browse(warehouse_id), date, is_done, quantity)
+                for product_id, warehouse_id, date, is_done, quantity in self._read_moves_qty_grouped(domain_moves, 'location_id')
+            ]
+        else:
+            moves_qty = [
+                (move.product_id, move.location_id.warehouse_id, date, move.state == 'done', move.product_qty)
+                for move, date in self._get_moves_and_date(domain_moves)
+            ]
 
-        return outgoing_qty, outgoing_qty_done
+        res = []
+        for date_range in date_ranges:
+            outgoing_qty = defaultdict(float)
+            outgoing_qty_done = defaultdict(float)
+            for product, warehouse, date, is_done, quantity in moves_qty:
+                # There are cases when we want to consider moves where their (scheduled) date occurs before the after_date
+                # if lead times make their stock delivery at a relevant time. Therefore we need to ignore the lines that have
+                # date + lead time < after_date. Similar logic with before_date
+                index = self._get_period_index(date_range, date)
+                if index < 0:
+                    continue
+                key = (date_range[index], product, warehouse)
+                if is_done:
+                    outgoing_qty_done[key] += quantity
+                else:
+                    outgoing_qty[key] += quantity
+            res.append((outgoing_qty, outgoing_qty_done))
+        return res
 
-    def _get_rfq_domain(self, date_start, date_stop):
+    def _get_rfq_domain(self, date_start, date_stop, lead_days=None):
         """ Return a domain used to compute the incoming quantity for a given
         product/warehouse/company.
 
         :param date_start: start date of the forecast domain
         :param date_stop: end date of the forecast domain
+        :param lead_days: lead days already resolved by _get_lead_days_map
         """
         if not self:
             return [('id', '=', False)]
+        if lead_days is None:
+            lead_days = self._get_lead_days_map()
         domain = []
         common_domain = [
             ('state', 'in', ('draft', 'sent', 'to approve')),
@@ -938,8 +2215,7 @@ class MrpProductionSchedule(models.Model):
         ]
         groupby_delay = defaultdict(list)
         for schedule in self:
-            rules = schedule.product_id._get_rules_from_location(schedule.warehouse_id.lot_stock_id)
-            delay, dummy = rules._get_lead_days(schedule.product_id)
+            delay = schedule._get_schedule_lead_days('all', lead_days=lead_days)
             groupby_delay[delay].append((schedule.product_id, schedule.warehouse_id))
 
         for delay in groupby_delay:
@@ -956,17 +2232,169 @@ class MrpProductionSchedule(models.Model):
 
     def _get_rfq_and_planned_date(self, rfq_domain, order=False):
         purchase_lines = self.env['purchase.order.line'].search(rfq_domain, order=order)
+        delays = self._get_dest_moves_delays(purchase_lines.move_dest_ids)
         res_purchase_lines = []
         for line in purchase_lines:
             if not line.move_dest_ids:
                 res_purchase_lines.append((line, fields.Date.to_date(line.date_planned)))
                 continue
-            delay = max(map(self._get_dest_moves_delay, line.move_dest_ids))
+            delay = max(delays[move.id] for move in line.move_dest_ids)
             date = fields.Date.to_date(line.date_planned) + relativedelta(days=delay)
             res_purchase_lines.append((line, date))
 
         return res_purchase_lines
 
+    @api.model
+    def _use_numpy_projection(self):
+        """ The forecast cells are computed by _get_projection when NumPy is
+        installed and the system parameter `mrp_mps.use_numpy_projection` is
+        set.
+        """
+        return np is not None and str2bool(self.env['ir.config_parameter'].sudo().get_param('mrp_mps.use_numpy_projection', 'False'))
+
+    @api.model
+    def _use_sql_aggregates(self):
+        """ Incoming and outgoing quantities are aggregated with grouped SQL
+        queries instead of browsing the moves and RFQ lines one by one when the
+        system parameter `mrp_mps.use_sql_aggregates` is set.
+        """
+        return str2bool(self.env['ir.config_parameter'].sudo().get_param('mrp_mps.use_sql_aggregates', 'False'))
+
+    def _get_incoming_qty_grouped(self, date_range, lead_days=None):
+        """ Same as _get_incoming_qty but the RFQ lines and the moves are
+        summed by the database, grouped by product, warehouse, state and date
+        shifted by the delay of their destination moves.
+        """
+        incoming_qty = defaultdict(float)
+        incoming_qty_done = defaultdict(float)
+        after_date = date_range[0][0]
+        before_date = date_range[-1][1]
+        rfq_domain = self._get_rfq_domain(after_date, before_date, lead_days=lead_days)
+        for product_id, warehouse_id, date, quantity in self._read_rfq_qty_grouped(rfq_domain):
+            index = self._get_period_index(date_range, date)
+            if index < 0:
+                continue
+            key = (date_range[index], self.env['product.product'].browse(product_id), self.env['stock.warehouse'].browse(warehouse_id))
+            incoming_qty[key] += quantity
+
+        domain_moves = self._get_moves_domain(after_date, before_date, 'incoming', lead_days=lead_days)
+        for product_id, warehouse_id, date, is_done, quantity in self._read_moves_qty_grouped(domain_moves, 'location_dest_id'):
+            index = self._get_period_index(date_range, date)
+            if index < 0:
+                continue
+            key = (date_range[index], self.env['product.product'].browse(product_id), self.env['stock.warehouse'].browse(warehouse_id))
+            if is_done:
+                incoming_qty_done[key] += quantity
+            else:
+                incoming_qty[key] += quantity
+        return incoming_qty, incoming_qty_done
+
+    @api.model
+    def _get_dest_moves_delay_cte(self):
+        """ SQL equivalent of _get_dest_moves_delay. Return two common table
+        expressions that compute the delay of each move listed in a `root_move`
+        CTE (that must be defined before): `move_path` walks the destination
+        moves from each root, cumulating the delays of their rules, and
+        `dest_delay` keeps the longest path by root.
+        """
+        return """
+            move_path(root_id, move_id, delay, depth) AS (
+                SELECT id, id, 0, 0
+                  FROM root_move
+                 UNION ALL
+                SELECT path.root_id, rel.move_dest_id, path.delay + COALESCE(rule.delay, 0), path.depth + 1
+                  FROM move_path path
+                  JOIN stock_move move ON move.id = path.move_id
+                  JOIN stock_move_move_rel rel ON rel.move_orig_id = path.move_id
+             LEFT JOIN stock_rule rule ON rule.id = move.rule_id
+                 WHERE move.origin_returned_move_id IS NULL
+                   AND path.depth < %s
+            ),
+            dest_delay(root_id, delay) AS (
+                SELECT path.root_id,
+                       MAX(CASE WHEN move.origin_returned_move_id IS NOT NULL THEN path.delay
+                                ELSE path.delay + COALESCE(rule.delay, 0) END)
+                  FROM move_path path
+                  JOIN stock_move move ON move.id = path.move_id
+             LEFT JOIN stock_rule rule ON rule.id = move.rule_id
+                 WHERE move.origin_returned_move_id IS NOT NULL
+                    OR NOT EXISTS (SELECT 1 FROM stock_move_move_rel rel WHERE rel.move_orig_id = path.move_id)
+              GROUP BY path.root_id
+            )
+        """
+
+    def _read_moves_qty_grouped(self, moves_domain, location_field):
+        """ Sum the quantity of the moves matching moves_domain.
+
+        param moves_domain: domain on stock.move
+        param location_field: 'location_dest_id' for incoming moves or
+        'location_id' for outgoing ones. The warehouse of this location is used
+        in the grouping.
+        return: list of tuple (product id, warehouse id, date + destination
+        moves delay, move is done, quantity in the product UoM)
+        rtype: list
+        """
+        assert location_field in ('location_id', 'location_dest_id')
+        self.env.flush_all()
+        Move = self.env['stock.move']
+        query = Move._where_calc(moves_domain)
+        Move._apply_ir_rules(query, 'read')
+        moves_query, moves_params = query.select('"stock_move"."id"')
+        self.env.cr.execute(f"""
+            WITH RECURSIVE root_move(id) AS ({moves_query}),
+            {self._get_dest_moves_delay_cte()}
+            SELECT move.product_id,
+                   location.warehouse_id,
+                   move.date::date + COALESCE(dest_delay.delay, 0) AS date,
+                   move.state = 'done' AS is_done,
+                   SUM(move.product_qty)
+              FROM root_move
+              JOIN stock_move move ON move.id = root_move.id
+         LEFT JOIN dest_delay ON dest_delay.root_id = move.id
+         LEFT JOIN stock_location location ON location.id = move.{location_field}
+          GROUP BY 1, 2, 3, 4
+        """, list(moves_params) + [MAX_DEST_MOVES_DEPTH])
+        return self.env.cr.fetchall()
+
+    def _read_rfq_qty_grouped(self, rfq_domain):
+        """ Sum the quantity of the RFQ lines matching rfq_domain.
+
+        return: list of tuple (product id, warehouse id, planned date +
+        destination moves delay, quantity in the product UoM)
+        rtype: list
+        """
+        self.env.flush_all()
+        PurchaseLine = self.env['purchase.order.line']
+        query = PurchaseLine._where_calc(rfq_domain)
+        PurchaseLine._apply_ir_rules(query, 'read')
+        lines_query, lines_params = query.select('"purchase_order_line"."id"')
+        self.env.cr.execute(f"""
+            WITH RECURSIVE selected_line(id) AS ({lines_query}),
+            root_move(id) AS (
+                SELECT move.id
+                  FROM stock_move move
+                  JOIN selected_line ON selected_line.id = move.created_purchase_line_id
+            ),
+            {self._get_dest_moves_delay_cte()},
+            line_delay(line_id, delay) AS (
+                SELECT move.created_purchase_line_id, MAX(dest_delay.delay)
+                  FROM dest_delay
+                  JOIN stock_move move ON move.id = dest_delay.root_id
+              GROUP BY move.created_purchase_line_id
+            )
+            SELECT line.product_id,
+                   picking_type.warehouse_id,
+                   line.date_planned::date + COALESCE(line_delay.delay, 0) AS date,
+                   SUM(line.product_uom_qty)
+              FROM selected_line
+              JOIN purchase_order_line line ON line.id = selected_line.id
+              JOIN purchase_order po ON po.id = line.order_id
+         LEFT JOIN stock_picking_type picking_type ON picking_type.id = po.picking_type_id
+         LEFT JOIN line_delay ON line_delay.line_id = line.id
+          GROUP BY 1, 2, 3
+        """, list(lines_params) + [MAX_DEST_MOVES_DEPTH])
+        return self.env.cr.fetchall()
+
 class MrpProductForecast(models.Model):
     _name = 'mrp.product.forecast'
     _order = 'date'
@@ -981,3 +2409,20 @@ class MrpProductForecast(models.Model):
     replenish_qty_updated = fields.Boolean('Replenish_qty has been manually updated')
 
     procurement_launched = fields.Boolean('Procurement has been run for this forecast')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        forecasts = super().create(vals_list)
+        self.env['mrp.production.schedule']._invalidate_view_state(forecasts.production_schedule_id.product_id)
+        return forecasts
+
+    def write(self, vals):
+        self.env['mrp.production.schedule']._invalidate_view_state(self.production_schedule_id.product_id)
+        res = super().write(vals)
+        if 'production_schedule_id' in vals:
+            self.env['mrp.production.schedule']._invalidate_view_state(self.production_schedule_id.product_id)
+        return res
+
+    def unlink(self):
+        self.env['mrp.production.schedule']._invalidate_view_state(self.production_schedule_id.product_id)
+        return super().unlink()
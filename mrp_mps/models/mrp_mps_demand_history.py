@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import logging
+from collections import defaultdict
+
+from odoo import api, fields, models
+from odoo.tools.float_utils import float_compare
+
+_logger = logging.getLogger(__name__)
+
+
+class MrpMpsDemandHistory(models.Model):
+    """ Actual demand (done outgoing quantity) of the periods of the previous
+    years displayed by the MPS. Once a period is over its actual demand does
+    not change anymore, so it's stored instead of being recomputed from the
+    moves on each rendering.
+
+    The history is updated by _cron_update_history for the products with a
+    move done since its last run. The rules, the routes and the destination
+    moves also change the actual demand without writing the done moves, so
+    their modifications remove the history of the products concerned (see
+    _invalidate_history), computed again by the next run.
+    """
+    _name = 'mrp.mps.demand.history'
+    _order = 'warehouse_id, product_id, period_type, date_start'
+    _description = 'Actual Demand History of the Master Production Schedule'
+
+    product_id = fields.Many2one('product.product', string='Product', required=True, index=True, ondelete='cascade')
+    warehouse_id = fields.Many2one('stock.warehouse', 'Production Warehouse', required=True, ondelete='cascade')
+    company_id = fields.Many2one('res.company', 'Company', related='warehouse_id.company_id', store=True)
+    period_type = fields.Selection([
+        ('month', 'Monthly'),
+        ('week', 'Weekly'),
+        ('day', 'Daily')], string='Manufacturing Period', required=True)
+    date_start = fields.Date('Period Start', required=True)
+    date_stop = fields.Date('Period End', required=True)
+    outgoing_qty = fields.Float('Actual Demand')
+
+    _sql_constraints = [
+        ('period_uniq', 'unique (product_id, warehouse_id, period_type, date_start)', 'The actual demand of a product in a warehouse is stored once by period.'),
+    ]
+
+    @api.model
+    def _get_closed_date_ranges(self, company):
+        """ Return the date ranges of the previous years displayed by the MPS
+        of company, limited to the periods that are over.
+        """
+        today = fields.Date.today()
+        date_ranges = []
+        for years in (1, 2):
+            date_range = [period for period in company._get_date_range(years=years) if period[1] < today]
+            if date_range:
+                date_ranges.append(date_range)
+        return date_ranges
+
+    @api.model
+    def _get_outgoing_qty(self, production_schedules, date_range):
+        """ Return the stored actual demand of production_schedules during the
+        periods of date_range.
+
+        return: a tuple with a dict using the same keys than the done quantity
+        of mrp.production.schedule._get_outgoing_qty and the schedules without
+        a stored value for each period of date_range (e.g. a period not over
+        yet or a schedule created after the last update).
+        rtype: tuple
+        """
+        outgoing_qty = defaultdict(float)
+        if not production_schedules or not date_range:
+            return outgoing_qty, production_schedules
+        period_by_start = {period[0]: period for period in date_range}
+        history = self.search_read([
+            ('product_id', 'in', production_schedules.product_id.ids),
+            ('warehouse_id', 'in', production_schedules.warehouse_id.ids),
+            ('period_type', '=', self.env.company.manufacturing_period),
+            ('date_start', 'in', list(period_by_start)),
+        ], ['product_id', 'warehouse_id', 'date_start', 'date_stop', 'outgoing_qty'])
+        periods_found = defaultdict(int)
+        for values in history:
+            period = period_by_start[values['date_start']]
+            if values['date_stop'] != period[1]:
+                continue
+            product = self.env['product.product'].browse(values['product_id'][0])
+            warehouse = self.env['stock.warehouse'].browse(values['warehouse_id'][0])
+            outgoing_qty[period, product, warehouse] = values['outgoing_qty']
+            periods_found[product, warehouse] += 1
+        schedules_without_history = production_schedules.filtered(
+            lambda s: periods_found[s.product_id, s.warehouse_id] < len(period_by_start))
+        return outgoing_qty, schedules_without_history
+
+    @api.model
+    def _update_history(self, production_schedules):
+        """ Compute from the moves the actual demand of production_schedules
+        during the closed periods of the current company and store it. A value
+        is stored for every period, even without demand, in order to know that
+        the period has been computed.
+        """
+        company = self.env.company
+        date_ranges = self._get_closed_date_ranges(company)
+        if not production_schedules or not date_ranges:
+            return
+        production_schedules = production_schedules.with_company(company)
+        values_by_key = {}
+        outgoing_qty_by_horizon = production_schedules._get_outgoing_qty_by_horizon(date_ranges)
+        for date_range, (dummy, outgoing_qty_done) in zip(date_ranges, outgoing_qty_by_horizon):
+            for period in date_range:
+                for production_schedule in production_schedules:
+                    key = (production_schedule.product_id.id, production_schedule.warehouse_id.id, period[0])
+                    values_by_key[key] = {
+                        'date_stop': period[1],
+                        'outgoing_qty': outgoing_qty_done.get((period, production_schedule.product_id, production_schedule.warehouse_id), 0.0),
+                    }
+
+        existing_history = self.search([
+            ('product_id', 'in', production_schedules.product_id.ids),
+            ('warehouse_id', 'in', production_schedules.warehouse_id.ids),
+            ('period_type', '=', company.manufacturing_period),
+            ('date_start', 'in', list({key[2] for key in values_by_key})),
+        ])
+        for history in existing_history:
+            values = values_by_key.pop((history.product_id.id, history.warehouse_id.id, history.date_start), None)
+            if values and (history.date_stop != values['date_stop'] or history.outgoing_qty != values['outgoing_qty']):
+                history.write(values)
+        self.create([dict(values, **{
+            'product_id': product_id,
+            'warehouse_id': warehouse_id,
+            'period_type': company.manufacturing_period,
+            'date_start': date_start,
+        }) for (product_id, warehouse_id, date_start), values in values_by_key.items()])
+
+    @api.model
+    def _get_production_schedules_by_company(self, company_ids=None):
+        domain = company_ids and [('company_id', 'in', company_ids)] or []
+        production_schedules_by_company = defaultdict(lambda: self.env['mrp.production.schedule'])
+        for production_schedule in self.env['mrp.production.schedule'].search(domain):
+            production_schedules_by_company[production_schedule.company_id] |= production_schedule
+        return production_schedules_by_company
+
+    @api.model
+    def _invalidate_history(self, products=None):
+        """ Remove the stored actual demand of products, or all of it without
+        products. The schedules have no complete history anymore, so
+        _cron_update_history computes it again.
+        """
+        if products is not None and not products:
+            return
+        self.flush_model()
+        if products is None:
+            self.env.cr.execute("DELETE FROM mrp_mps_demand_history")
+        else:
+            self.env.cr.execute("DELETE FROM mrp_mps_demand_history WHERE product_id IN %s", [tuple(products.ids)])
+        self.invalidate_model()
+
+    @api.model
+    def _cron_update_history(self):
+        """ Store the actual demand of the closed periods for the schedules
+        without a complete history (new schedule or period closed since the
+        last run) and for the schedules whose product had a move done since the
+        last run.
+        """
+        config_parameter = self.env['ir.config_parameter'].sudo()
+        last_run = config_parameter.get_param('mrp_mps.demand_history_last_run')
+        now = fields.Datetime.now()
+        for company, production_schedules in self._get_production_schedules_by_company().items():
+            history = self.with_company(company)
+            date_ranges = history._get_closed_date_ranges(company)
+            if not date_ranges:
+                continue
+            periods = {period[0] for date_range in date_ranges for period in date_range}
+            periods_count = {
+                (group['product_id'][0], group['warehouse_id'][0]): group['__count']
+                for group in history.read_group([
+                    ('product_id', 'in', production_schedules.product_id.ids),
+                    ('warehouse_id', 'in', production_schedules.warehouse_id.ids),
+                    ('period_type', '=', company.manufacturing_period),
+                    ('date_start', 'in', list(periods)),
+                ], ['product_id', 'warehouse_id'], ['product_id', 'warehouse_id'], lazy=False)
+            }
+            to_update = production_schedules.filtered(
+                lambda s: periods_count.get((s.product_id.id, s.warehouse_id.id), 0) < len(periods))
+            if last_run:
+                moved_product_ids = {
+                    group['product_id'][0]
+                    for group in self.env['stock.move'].read_group([
+                        ('state', '=', 'done'),
+                        ('write_date', '>=', last_run),
+                        ('product_id', 'in', production_schedules.product_id.ids),
+                    ], ['product_id'], ['product_id'])
+                }
+                to_update |= production_schedules.filtered(lambda s: s.product_id.id in moved_product_ids)
+            if to_update:
+                _logger.info('Update the actual demand history of %d production schedule(s) for %s', len(to_update), company.name)
+                history._update_history(to_update)
+        config_parameter.set_param('mrp_mps.demand_history_last_run', fields.Datetime.to_string(now))
+
+    @api.model
+    def rebuild_history(self, company_ids=None):
+        """ Remove the stored actual demand and compute it again from the
+        moves for all the schedules of the companies (all of them by default).
+        """
+        for company, production_schedules in self._get_production_schedules_by_company(company_ids).items():
+            self.search([('company_id', '=', company.id)]).unlink()
+            self.with_company(company)._update_history(production_schedules)
+        return True
+
+    @api.model
+    def check_history(self, company_ids=None):
+        """ Compare the stored actual demand with the one computed from the
+        moves.
+
+        return: a list of dict with the product, the warehouse, the period and
+        both quantities for each difference
+        rtype: list
+        """
+        differences = []
+        for company, production_schedules in self._get_production_schedules_by_company(company_ids).items():
+            history = self.with_company(company)
+            date_ranges = history._get_closed_date_ranges(company)
+            if not date_ranges:
+                continue
+            outgoing_qty_by_horizon = production_schedules.with_company(company)._get_outgoing_qty_by_horizon(date_ranges)
+            for date_range, (dummy, outgoing_qty_done) in zip(date_ranges, outgoing_qty_by_horizon):
+                stored_qty, dummy = history._get_outgoing_qty(production_schedules, date_range)
+                for period in date_range:
+                    for production_schedule in production_schedules:
+                        key = (period, production_schedule.product_id, production_schedule.warehouse_id)
+                        if float_compare(stored_qty.get(key, 0.0), outgoing_qty_done.get(key, 0.0), precision_rounding=production_schedule.product_uom_id.rounding):
+                            differences.append({
+                                'product_id': production_schedule.product_id.id,
+                                'warehouse_id': production_schedule.warehouse_id.id,
+                                'period_type': company.manufacturing_period,
+                                'date_start': period[0],
+                                'stored_qty': stored_qty.get(key, 0.0),
+                                'computed_qty': outgoing_qty_done.get(key, 0.0),
+                            })
+        if differences:
+            _logger.warning('%d difference(s) found between the MPS actual demand history and the moves', len(differences))
+        return differences
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import logging
+from collections import defaultdict
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# Number of rows created at once when the indirect demand is stored.
+INDIRECT_DEMAND_BATCH_SIZE = 1000
+
+
+class MrpMpsIndirectDemand(models.Model):
+    """ Indirect demand of the schedules by period, i.e. the demand coming
+    from the quantities to replenish of the schedules using them as component.
+    It's stored so the state of a component is computed without computing the
+    state of the finished products first.
+
+    A value is only used on the day it was computed and while the version of
+    its schedule did not change (see mrp.production.schedule._invalidate_view_state),
+    otherwise the indirect demand is computed again from the finished products.
+
+    The values are computed company by company, with only the company of the
+    schedules enabled, and as superuser: they bypass the record rules and
+    are served to all the users of the company, and only when this company is
+    the only one enabled.
+    """
+    _name = 'mrp.mps.indirect.demand'
+    _order = 'production_schedule_id, date_start'
+    _description = 'Indirect Demand of the Master Production Schedule'
+
+    production_schedule_id = fields.Many2one('mrp.production.schedule', required=True, index=True, ondelete='cascade')
+    company_id = fields.Many2one('res.company', 'Company', related='production_schedule_id.company_id', store=True)
+    date_start = fields.Date('Period Start', required=True)
+    date_stop = fields.Date('Period End', required=True)
+    indirect_demand_qty = fields.Float('Indirect Demand')
+    state_version = fields.Integer('Schedule Version')
+    compute_date = fields.Date('Computed On', required=True)
+
+    _sql_constraints = [
+        ('period_uniq', 'unique (production_schedule_id, date_start)', 'The indirect demand of a schedule is stored once by period.'),
+    ]
+
+    @api.model
+    def _get_indirect_demand(self, production_schedules, date_range):
+        """ Return the stored indirect demand of production_schedules during
+        the periods of date_range.
+
+        return: a dict with as key a production schedule id and as value the
+        list of the indirect demand quantity of each period, only for the
+        schedules with a valid stored value for every period.
+        rtype: dict
+        """
+        if not production_schedules or not date_range or len(self.env.companies) > 1:
+            return {}
+        period_by_start = {period[0]: period for period in date_range}
+        stored = self.search_read([
+            ('production_schedule_id', 'in', production_schedules.ids),
+            ('company_id', '=', self.env.company.id),
+            ('date_start', 'in', list(period_by_start)),
+            ('compute_date', '=', fields.Date.today()),
+        ], ['production_schedule_id', 'date_start', 'date_stop', 'indirect_demand_qty', 'state_version'])
+        values_by_schedule = defaultdict(dict)
+        for values in stored:
+            values_by_schedule[values['production_schedule_id'][0]][values['date_start']] = values
+
+        indirect_demand = {}
+        for production_schedule in production_schedules:
+            values_by_start = values_by_schedule.get(production_schedule.id, {})
+            if len(values_by_start) != len(date_range) or any(
+                    values['date_stop'] != period_by_start[date_start][1] or values['state_version'] != production_schedule.state_version
+                    for date_start, values in values_by_start.items()):
+                continue
+            indirect_demand[production_schedule.id] = [values_by_start[period[0]]['indirect_demand_qty'] for period in date_range]
+        return indirect_demand
+
+    @api.model
+    def _update_indirect_demand(self, production_schedules, incremental=False, indirect_demand=None):
+        """ Compute the indirect demand of production_schedules for the
+        periods of the current company and store it. The schedules are
+        computed BoM level by BoM level and stored by batches.
+
+        param incremental: keep the rows stored today for the periods of the
+        company, and only write the quantities that changed, instead of
+        replacing all the rows of the schedules
+        param indirect_demand: the indirect demand of each period by schedule
+        id, already computed by the caller with only the company of the
+        schedules enabled, instead of computing it again
+        """
+        if not production_schedules:
+            return
+        companies = production_schedules.company_id
+        if companies != self.env.companies:
+            # Each company is computed alone, see the model description.
+            for company in companies:
+                self.with_company(company).with_context(allowed_company_ids=company.ids)._update_indirect_demand(
+                    production_schedules.filtered(lambda production_schedule: production_schedule.company_id == company),
+                    incremental=incremental)
+            return
+        company = self.env.company
+        date_range = company._get_date_range()
+        production_schedules = production_schedules.with_company(company).sudo()
+        today = fields.Date.today()
+        existing_rows = {}
+        if incremental:
+            for row in self.sudo().search_read([
+                ('production_schedule_id', 'in', production_schedules.ids),
+                ('date_start', 'in', [period[0] for period in date_range]),
+                ('compute_date', '=', today),
+            ], ['production_schedule_id', 'date_start', 'date_stop', 'indirect_demand_qty']):
+                existing_rows[row['production_schedule_id'][0], row['date_start']] = row
+        rows_to_unlink = self.sudo().search([
+            ('production_schedule_id', 'in', production_schedules.ids),
+            ('id', 'not in', [row['id'] for row in existing_rows.values()]),
+        ])
+        rows_to_unlink.unlink()
+
+        vals_list = []
+        row_ids_by_values = defaultdict(list)
+        if indirect_demand is None:
+            indirect_demand_by_schedule = production_schedules._get_indirect_demand_by_schedule(date_range, use_stored=False)
+        else:
+            indirect_demand_by_schedule = [
+                (production_schedule, indirect_demand[production_schedule.id])
+                for production_schedule in production_schedules if production_schedule.id in indirect_demand
+            ]
+        for production_schedule, quantities in indirect_demand_by_schedule:
+            for (date_start, date_stop), quantity in zip(date_range, quantities):
+                row = existing_rows.get((production_schedule.id, date_start))
+                if not row:
+                    vals_list.append({
+                        'production_schedule_id': production_schedule.id,
+                        'date_start': date_start,
+                        'date_stop': date_stop,
+                        'indirect_demand_qty': quantity,
+                        'state_version': production_schedule.state_version,
+                        'compute_date': today,
+                    })
+                elif row['date_stop'] != date_stop or row['indirect_demand_qty'] != quantity:
+                    row_ids_by_values[date_stop, quantity, production_schedule.state_version].append(row['id'])
+                else:
+                    row_ids_by_values[None, None, production_schedule.state_version].append(row['id'])
+            if len(vals_list) >= INDIRECT_DEMAND_BATCH_SIZE:
+                self.sudo().create(vals_list)
+                vals_list = []
+        if vals_list:
+            self.sudo().create(vals_list)
+        # The unchanged periods only get the new version of their schedule.
+        for (date_stop, quantity, state_version), row_ids in row_ids_by_values.items():
+            values = {'state_version': state_version}
+            if date_stop:
+                values.update(date_stop=date_stop, indirect_demand_qty=quantity)
+            self.sudo().browse(row_ids).write(values)
+
+    @api.model
+    def _cron_update_indirect_demand(self):
+        """ Compute again the indirect demand of all the schedules, e.g. after
+        the day changed or moves were done.
+        """
+        if not self.env['mrp.production.schedule']._use_stored_indirect_demand():
+            return
+        production_schedules_by_company = self.env['mrp.mps.demand.history']._get_production_schedules_by_company()
+        for company, production_schedules in production_schedules_by_company.items():
+            _logger.info('Update the indirect demand of %d production schedule(s) for %s', len(production_schedules), company.name)
+            self.with_company(company)._update_indirect_demand(production_schedules)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import logging
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+
+class MrpMpsReplenishJob(models.Model):
+    """ Replenishment of many schedules ("Replenish All") run in background by
+    batches of schedules. Each batch is committed, so a failing schedule does
+    not cancel the replenishment of the others, and the progress is read by
+    the MPS client action.
+    """
+    _name = 'mrp.mps.replenish.job'
+    _order = 'id desc'
+    _description = 'Replenishment Job of the Master Production Schedule'
+
+    user_id = fields.Many2one('res.users', 'User', required=True, default=lambda self: self.env.user)
+    company_id = fields.Many2one('res.company', 'Company', required=True, default=lambda self: self.env.company)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed')], string='Status', default='pending', required=True)
+    based_on_lead_time = fields.Boolean('Based on Lead Time')
+    production_schedule_ids = fields.Many2many('mrp.production.schedule', string='Schedules to Replenish')
+    remaining_schedule_ids = fields.Many2many(
+        'mrp.production.schedule', 'mrp_mps_replenish_job_remaining_rel',
+        string='Remaining Schedules')
+    total_count = fields.Integer('Schedules')
+    done_count = fields.Integer('Replenished')
+    failed_count = fields.Integer('Failed')
+    production_count = fields.Integer('Manufacturing Orders')
+    purchase_count = fields.Integer('Purchase Order Lines')
+    error_log = fields.Text('Errors')
+
+    @api.model
+    def _create_job(self, production_schedules, based_on_lead_time=False):
+        job = self.sudo().create({
+            'based_on_lead_time': based_on_lead_time,
+            'production_schedule_ids': [(6, 0, production_schedules.ids)],
+            'remaining_schedule_ids': [(6, 0, production_schedules.ids)],
+            'total_count': len(production_schedules),
+        })
+        self.env.ref('mrp_mps.ir_cron_mrp_mps_replenish_job').sudo()._trigger()
+        return job.sudo(False)
+
+    def get_status(self):
+        """ Progress of the job read by the MPS client action. """
+        self.ensure_one()
+        return self.read([
+            'state', 'total_count', 'done_count', 'failed_count',
+            'production_count', 'purchase_count', 'error_log',
+        ])[0]
+
+    @api.model
+    def _cron_process_jobs(self, use_new_cursor=True):
+        for job in self.search([('state', 'in', ('pending', 'running'))], order='id'):
+            job.with_user(job.user_id).with_company(job.company_id)._process(use_new_cursor=use_new_cursor)
+
+    def _process(self, use_new_cursor=False):
+        """ Replenish the remaining schedules by batches (system parameter
+        `mrp_mps.replenish_job_batch_size`). A failing batch is replenished
+        again schedule by schedule in order to only skip the failing ones.
+        The job is set as failed on any other error, so the cron does not
+        process it again and again.
+        """
+        self.ensure_one()
+        try:
+            self._process_batches(use_new_cursor=use_new_cursor)
+        except Exception as error:
+            if not use_new_cursor:
+                raise
+            self.env.cr.rollback()
+            self.env.invalidate_all()
+            _logger.exception('MPS replenishment job %d failed', self.id)
+            self.sudo().write({
+                'state': 'failed',
+                'error_log': '\n'.join(filter(None, [self.error_log, str(error)])),
+            })
+            self.env.cr.commit()
+
+    def _process_batches(self, use_new_cursor=False):
+        batch_size = int(self.env['ir.config_parameter'].sudo().get_param('mrp_mps.replenish_job_batch_size', 50)) or 50
+        # The job is processed as its user, who could only read it.
+        self.sudo().state = 'running'
+        while self.remaining_schedule_ids:
+            # The created manufacturing orders and purchase order lines are
+            # linked to the job by the procurement values.
+            production_schedules = self.remaining_schedule_ids[:batch_size].with_context(mps_replenish_job_id=self.id)
+            failed = self.env['mrp.production.schedule']
+            errors = []
+            try:
+                with self.env.cr.savepoint():
+                    production_schedules._replenish(based_on_lead_time=self.based_on_lead_time, chunk_size=0)
+            except Exception:
+                for production_schedule in production_schedules:
+                    try:
+                        with self.env.cr.savepoint():
+                            production_schedule._replenish(based_on_lead_time=self.based_on_lead_time, chunk_size=0)
+                    except Exception as error:
+                        _logger.warning('MPS replenishment job %d: schedule %d failed: %s', self.id, production_schedule.id, error,
+                                        exc_info=not isinstance(error, UserError))
+                        failed |= production_schedule
+                        errors.append('%s: %s' % (production_schedule.product_id.display_name, error))
+            self.sudo().write({
+                'remaining_schedule_ids': [(3, schedule_id) for schedule_id in production_schedules.ids],
+                'done_count': self.done_count + len(production_schedules - failed),
+                'failed_count': self.failed_count + len(failed),
+                'error_log': '\n'.join(filter(None, [self.error_log] + errors)) or False,
+            })
+            self._update_created_counts()
+            _logger.info('MPS replenishment job %d: %d/%d schedule(s) processed', self.id, self.done_count + self.failed_count, self.total_count)
+            if use_new_cursor:
+                self.env.cr.commit()
+        self.sudo().state = 'done'
+        if use_new_cursor:
+            self.env.cr.commit()
+
+    def _update_created_counts(self):
+        self.sudo().write({
+            'production_count': self.env['mrp.production'].sudo().search_count([('mps_replenish_job_id', '=', self.id)]),
+            'purchase_count': self.env['purchase.order.line'].sudo().search_count([('mps_replenish_job_id', '=', self.id)]),
+        })
+
+    def unlink(self):
+        if any(job.state == 'running' for job in self):
+            raise UserError(_('A running replenishment cannot be deleted.'))
+        return super().unlink()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import api, fields, models
+
+
+class MrpMpsStateInvalidation(models.Model):
+    """ Append-only log of the products whose schedules have an outdated
+    state. The version of a schedule is the last id logged for its product
+    (see mrp.production.schedule._compute_state_version), so the business
+    transactions only insert rows instead of updating the schedules, and a
+    version rolled back is never reused since the ids come from a sequence.
+    """
+    _name = 'mrp.mps.state.invalidation'
+    _description = 'Outdated States of the Master Production Schedule'
+    _log_access = False
+
+    product_id = fields.Many2one('product.product', required=True, index=True, ondelete='cascade')
+
+    @api.model
+    def _log_products(self, product_ids):
+        self.env.cr.execute("""
+            INSERT INTO mrp_mps_state_invalidation (product_id)
+                 SELECT unnest(%s)
+        """, [list(product_ids)])
+
+    @api.model
+    def _get_versions(self, product_ids):
+        """ Return the last id logged for each of the product ids. """
+        if not product_ids:
+            return {}
+        self.env.cr.execute("""
+            SELECT product_id, MAX(id)
+              FROM mrp_mps_state_invalidation
+             WHERE product_id IN %s
+          GROUP BY product_id
+        """, [tuple(product_ids)])
+        return dict(self.env.cr.fetchall())
+
+    @api.autovacuum
+    def _gc_invalidations(self):
+        """ Only keep the last row of each product, giving its version. """
+        self.env.cr.execute("""
+            DELETE FROM mrp_mps_state_invalidation invalidation
+             WHERE EXISTS (
+                SELECT 1
+                  FROM mrp_mps_state_invalidation newer
+                 WHERE newer.product_id = invalidation.product_id
+                   AND newer.id > invalidation.id)
+        """)
+
+
+class MrpMpsBomGraphInvalidation(models.Model):
+    """ Append-only log of the modifications of the BoMs, the variants and
+    the UoM. Its last id is the version of the BoM graph (see
+    mrp.production.schedule._get_bom_graph), so the workers build the graph
+    again once the modification is committed without clearing the caches
+    of the registry.
+    """
+    _name = 'mrp.mps.bom.graph.invalidation'
+    _description = 'Outdated BoM Graphs of the Master Production Schedule'
+    _log_access = False
+
+    @api.model
+    def _log(self):
+        self.env.cr.execute("INSERT INTO mrp_mps_bom_graph_invalidation DEFAULT VALUES")
+
+    @api.model
+    def _get_version(self):
+        self.env.cr.execute("SELECT MAX(id) FROM mrp_mps_bom_graph_invalidation")
+        return self.env.cr.fetchone()[0] or 0
+
+    @api.autovacuum
+    def _gc_invalidations(self):
+        """ Only keep the last row, giving the version. """
+        self.env.cr.execute("""
+            DELETE FROM mrp_mps_bom_graph_invalidation
+             WHERE id < (SELECT MAX(id) FROM mrp_mps_bom_graph_invalidation)
+        """)
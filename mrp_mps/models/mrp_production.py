@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import fields, models
+
+
+class MrpProduction(models.Model):
+    _inherit = 'mrp.production'
+
+    mps_replenish_job_id = fields.Many2one(
+        'mrp.mps.replenish.job', 'MPS Replenishment Job', readonly=True, copy=False, index='btree_not_null')
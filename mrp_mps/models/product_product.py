@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
-from odoo import fields, models
+from odoo import api, fields, models
 
 class ProductProduct(models.Model):
     _inherit = 'product.product'
@@ -16,3 +16,24 @@ class ProductProduct(models.Model):
             schedule_counts[data['product_id'][0]] = data['product_id_count']
         for product in self:
             product.schedule_count = schedule_counts.get(product.id, 0)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        products = super().create(vals_list)
+        # New variants are manufactured by the BoMs of their template, they
+        # cannot be a component of an existing BoM yet.
+        if self.env['mrp.bom'].with_context(active_test=False).search_count(
+                [('product_tmpl_id', 'in', products.product_tmpl_id.ids)], limit=1):
+            self.env['mrp.production.schedule']._invalidate_bom_graph()
+        return products
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'active' in vals:
+            self.env['mrp.production.schedule']._invalidate_bom_graph()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env['mrp.production.schedule']._invalidate_bom_graph()
+        return res
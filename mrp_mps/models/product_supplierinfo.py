@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import api, models
+
+
+class SupplierInfo(models.Model):
+    _inherit = 'product.supplierinfo'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        sellers = super().create(vals_list)
+        self.env['mrp.production.schedule']._invalidate_lead_days_cache(sellers._get_mps_products())
+        return sellers
+
+    def write(self, vals):
+        self.env['mrp.production.schedule']._invalidate_lead_days_cache(self._get_mps_products())
+        res = super().write(vals)
+        if {'product_id', 'product_tmpl_id'} & vals.keys():
+            self.env['mrp.production.schedule']._invalidate_lead_days_cache(self._get_mps_products())
+        return res
+
+    def unlink(self):
+        self.env['mrp.production.schedule']._invalidate_lead_days_cache(self._get_mps_products())
+        return super().unlink()
+
+    def _get_mps_products(self):
+        """ Products of which the lead days depend on the sellers in self. """
+        return self.product_id | self.filtered(lambda seller: not seller.product_id).product_tmpl_id.product_variant_ids
@@ -20,6 +20,18 @@ class ProductTemplate(models.Model):
                 schedule_count += product_schedule_counts.get(product_id, 0)
             template.schedule_count = schedule_count
 
+    def write(self, vals):
+        if {'produce_delay', 'days_to_prepare_mo', 'route_ids'} & vals.keys():
+            self.env['mrp.production.schedule']._invalidate_lead_days_cache(self.product_variant_ids)
+        if 'route_ids' in vals:
+            self.env['mrp.mps.demand.history']._invalidate_history(self.product_variant_ids)
+        res = super().write(vals)
+        if 'uom_id' in vals:
+            # The BoM ratios are converted to the UoM of the products.
+            self.env['mrp.production.schedule']._invalidate_bom_graph()
+            self.env['mrp.production.schedule']._invalidate_stored_indirect_demand(self.product_variant_ids)
+        return res
+
     def action_open_mps_view(self):
         action = self.env["ir.actions.actions"]._for_xml_id("mrp_mps.action_mrp_mps")
         action['domain'] = [('product_id.product_tmpl_id', 'in', self.ids)]
@@ -3,12 +3,22 @@
 
 from odoo import api, fields, models
 
+# Fields of the purchase order lines used to compute the RFQ quantities of the
+# schedules.
+MPS_PURCHASE_LINE_FIELDS = {'product_id', 'product_qty', 'product_uom', 'date_planned', 'order_id'}
+
 
 class PurchaseOrder(models.Model):
     _inherit = 'purchase.order'
 
     date_planned_mps = fields.Datetime(string='Scheduled Date', compute='_compute_date_planned_mps', store=True, index=True)
 
+    def write(self, vals):
+        res = super().write(vals)
+        if {'state', 'picking_type_id'} & vals.keys() and self.env['mrp.production.schedule']._use_view_state_invalidation():
+            self.env['mrp.production.schedule']._invalidate_view_state(self.order_line.product_id)
+        return res
+
     @api.depends('order_line.date_planned', 'date_order')
     def _compute_date_planned_mps(self):
         for order in self:
@@ -21,3 +31,38 @@ class PurchaseOrder(models.Model):
                 order.date_planned_mps = min_date.date()
             else:
                 order.date_planned_mps = order.date_order.date()
+
+
+class PurchaseOrderLine(models.Model):
+    _inherit = 'purchase.order.line'
+
+    mps_replenish_job_id = fields.Many2one(
+        'mrp.mps.replenish.job', 'MPS Replenishment Job', readonly=True, copy=False, index='btree_not_null')
+
+    @api.model
+    def _prepare_purchase_order_line_from_procurement(self, product_id, product_qty, product_uom, company_id, values, po):
+        line_values = super()._prepare_purchase_order_line_from_procurement(product_id, product_qty, product_uom, company_id, values, po)
+        if values.get('mps_replenish_job_id'):
+            line_values['mps_replenish_job_id'] = values['mps_replenish_job_id']
+        return line_values
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        if self.env['mrp.production.schedule']._use_view_state_invalidation():
+            self.env['mrp.production.schedule']._invalidate_view_state(lines.product_id)
+        return lines
+
+    def write(self, vals):
+        if not MPS_PURCHASE_LINE_FIELDS & vals.keys() or not self.env['mrp.production.schedule']._use_view_state_invalidation():
+            return super().write(vals)
+        self.env['mrp.production.schedule']._invalidate_view_state(self.product_id)
+        res = super().write(vals)
+        if 'product_id' in vals:
+            self.env['mrp.production.schedule']._invalidate_view_state(self.product_id)
+        return res
+
+    def unlink(self):
+        if self.env['mrp.production.schedule']._use_view_state_invalidation():
+            self.env['mrp.production.schedule']._invalidate_view_state(self.product_id)
+        return super().unlink()
@@ -40,6 +40,8 @@ class Company(models.Model):
         'Display Actual Demand Before Year', default=False)
 
     def write(self, vals):
+        if {'po_lead', 'manufacturing_lead', 'security_lead', 'days_to_purchase'} & vals.keys():
+            self.env['mrp.production.schedule']._invalidate_lead_days_cache()
         if len(vals) == 1:
             fname, = vals.keys()
             if self._is_field_mps_display_group(fname) and self.env.user.has_group('mrp.group_mrp_manager'):
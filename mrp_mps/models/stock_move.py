@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import api, models
+
+# Fields of the moves used to compute the incoming and outgoing quantities of
+# the schedules.
+MPS_MOVE_FIELDS = {'state', 'date', 'product_id', 'product_uom_qty', 'product_uom', 'location_id', 'location_dest_id', 'warehouse_id'}
+
+
+class StockMove(models.Model):
+    _inherit = 'stock.move'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        moves = super().create(vals_list)
+        if self.env['mrp.production.schedule']._use_view_state_invalidation():
+            self.env['mrp.production.schedule']._invalidate_view_state(moves.product_id)
+        return moves
+
+    def write(self, vals):
+        if {'move_dest_ids', 'move_orig_ids'} & vals.keys():
+            # The destination moves give the date of the actual demand of the
+            # done moves before them.
+            done_moves = (self | self.move_orig_ids).filtered(lambda move: move.state == 'done')
+            self.env['mrp.mps.demand.history']._invalidate_history(done_moves.product_id)
+        if not MPS_MOVE_FIELDS & vals.keys() or not self.env['mrp.production.schedule']._use_view_state_invalidation():
+            return super().write(vals)
+        self.env['mrp.production.schedule']._invalidate_view_state(self.product_id)
+        res = super().write(vals)
+        if 'product_id' in vals:
+            self.env['mrp.production.schedule']._invalidate_view_state(self.product_id)
+        return res
+
+    def unlink(self):
+        if self.env['mrp.production.schedule']._use_view_state_invalidation():
+            self.env['mrp.production.schedule']._invalidate_view_state(self.product_id)
+        return super().unlink()
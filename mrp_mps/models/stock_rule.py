@@ -1,15 +1,56 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
-from odoo import models
+from odoo import api, models
 
 
 class StockRule(models.Model):
     _inherit = 'stock.rule'
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env['mrp.production.schedule']._invalidate_lead_days_cache()
+        # The transit lead days give the periods of the actual demand.
+        self.env['mrp.mps.demand.history']._invalidate_history()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        self.env['mrp.production.schedule']._invalidate_lead_days_cache()
+        # The transit lead days give the periods of the actual demand.
+        self.env['mrp.mps.demand.history']._invalidate_history()
+        return super().write(vals)
+
+    def unlink(self):
+        self.env['mrp.production.schedule']._invalidate_lead_days_cache()
+        # The transit lead days give the periods of the actual demand.
+        self.env['mrp.mps.demand.history']._invalidate_history()
+        return super().unlink()
+
+    def _prepare_mo_vals(self, product_id, product_qty, product_uom, location_dest_id, name, origin, company_id, values, bom):
+        mo_values = super()._prepare_mo_vals(product_id, product_qty, product_uom, location_dest_id, name, origin, company_id, values, bom)
+        if values.get('mps_replenish_job_id'):
+            mo_values['mps_replenish_job_id'] = values['mps_replenish_job_id']
+        return mo_values
+
     def _make_po_get_domain(self, company_id, values, partner):
         """ Avoid to merge two RFQ for the same MPS replenish. """
         domain = super(StockRule, self)._make_po_get_domain(company_id, values, partner)
         if self.env.context.get('skip_lead_time') and values.get('date_planned'):
             domain += (('date_planned_mps', '=', values['date_planned']),)
         return domain
+
+
+class StockRoute(models.Model):
+    _inherit = 'stock.route'
+
+    def write(self, vals):
+        self.env['mrp.production.schedule']._invalidate_lead_days_cache()
+        # The transit lead days give the periods of the actual demand.
+        self.env['mrp.mps.demand.history']._invalidate_history()
+        return super().write(vals)
+
+    def unlink(self):
+        self.env['mrp.production.schedule']._invalidate_lead_days_cache()
+        # The transit lead days give the periods of the actual demand.
+        self.env['mrp.mps.demand.history']._invalidate_history()
+        return super().unlink()
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import models
+
+
+class UoM(models.Model):
+    _inherit = 'uom.uom'
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {'factor', 'factor_inv', 'uom_type', 'category_id'} & vals.keys():
+            # The BoM ratios are converted with the UoM factors.
+            self.env['mrp.production.schedule']._invalidate_bom_graph()
+            self.env['mrp.production.schedule']._invalidate_stored_indirect_demand()
+        return res
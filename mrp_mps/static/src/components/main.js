@@ -11,7 +11,7 @@ import { getDefaultConfig } from "@web/views/view";
 import { usePager } from "@web/search/pager_hook";
 import { CallbackRecorder, useSetupAction } from "@web/webclient/actions/action_hook";
 
-const { Component, onWillStart, useSubEnv, useChildSubEnv } = owl;
+const { Component, onWillStart, onWillUnmount, useSubEnv, useChildSubEnv } = owl;
 
 class MainComponent extends Component {
     //--------------------------------------------------------------------------
@@ -21,10 +21,12 @@ class MainComponent extends Component {
         this.action = useService("action");
         this.dialog = useService("dialog");
         this.orm = useService("orm");
+        this.notification = useService("notification");
         this.viewService = useService("view");
 
-        const { orm, action, dialog } = this;
-        this.model = new MasterProductionScheduleModel(this.props, { orm, action, dialog });
+        const { orm, action, dialog, notification } = this;
+        this.model = new MasterProductionScheduleModel(this.props, { orm, action, dialog, notification });
+        onWillUnmount(() => this.model.destroy());
 
         useSubEnv({
             manufacturingPeriods: [],
@@ -86,6 +88,10 @@ class MainComponent extends Component {
         });
 
         usePager(() => {
+            // The rows are loaded while scrolling, see onScroll.
+            if (this.model.data && this.model.data.virtual_scrolling) {
+                return null;
+            }
             return {
                 offset: this.env.config.offset,
                 limit: this.env.config.limit,
@@ -100,6 +106,16 @@ class MainComponent extends Component {
         });
     }
 
+    /**
+     * Load the next rows when the bottom of the table gets visible.
+     */
+    onScroll(ev) {
+        const el = ev.target;
+        if (el.scrollTop + el.clientHeight >= el.scrollHeight - el.clientHeight / 2) {
+            this.model.loadMore();
+        }
+    }
+
     get lines() {
         return this.model.data.production_schedule_ids;
     }
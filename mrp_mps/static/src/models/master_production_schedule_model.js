@@ -3,9 +3,15 @@
 import { _t } from "@web/core/l10n/translation";
 import { ConfirmationDialog } from "@web/core/confirmation_dialog/confirmation_dialog";
 import { Mutex } from "@web/core/utils/concurrency";
+import { sprintf } from "@web/core/utils/strings";
 
 const { EventBus } = owl;
 
+// Delay between two reads of the status of a background replenishment, and
+// number of reads before giving up (30 minutes).
+const REPLENISH_JOB_POLL_DELAY = 2000;
+const REPLENISH_JOB_POLL_ATTEMPTS = 900;
+
 export class MasterProductionScheduleModel extends EventBus {
     constructor(params, services) {
         super();
@@ -16,13 +22,34 @@ export class MasterProductionScheduleModel extends EventBus {
         this.orm = services.orm;
         this.action = services.action;
         this.dialog = services.dialog;
+        this.notification = services.notification;
         this.selectedRecords = new Set();
         this.mutex = new Mutex();
+        this.loadingMore = false;
+        this.replenishJobTimeout = null;
+        this.isDestroyed = false;
+    }
+
+    /**
+     * Stop polling the background replenishment once the view is closed.
+     */
+    destroy() {
+        this.isDestroyed = true;
+        clearTimeout(this.replenishJobTimeout);
+        this.replenishJobTimeout = null;
+        // The progress would not be updated anymore.
+        if (this.closeReplenishNotification) {
+            this.closeReplenishNotification();
+            this.closeReplenishNotification = null;
+        }
     }
 
     async load(domain, offset, limit) {
+        // Loading the same rows again keeps the rows loaded while scrolling.
+        let until = this.data && this.data.virtual_scrolling && this.data.next;
         if (domain !== undefined) {
             this.domain = domain;
+            until = false;
         }
         if (offset !== undefined) {
             this.offset = offset;
@@ -30,10 +57,55 @@ export class MasterProductionScheduleModel extends EventBus {
         if (limit !== undefined) {
             this.limit = limit;
         }
-        this.data = await this.orm.call('mrp.production.schedule', 'get_mps_view_state', [this.domain, this.offset, this.limit]);
+        this.data = await this.orm.call('mrp.production.schedule', 'get_mps_view_state', [this.domain, this.offset, this.limit, until]);
         this.notify();
     }
 
+    /**
+     * Replace the values of a loaded schedule, or add the schedule. While
+     * scrolling, the schedules not loaded yet are left to the next rows, so
+     * the rows stay in order.
+     * @private
+     * @param {Object} productionSchedule values of the schedule
+     */
+    _setScheduleState(productionSchedule) {
+        const index = this.data.production_schedule_ids.findIndex(ps => ps.id === productionSchedule.id);
+        if (index >= 0) {
+            this.data.production_schedule_ids.splice(index, 1, productionSchedule);
+        } else if (!this.data.virtual_scrolling) {
+            this.data.production_schedule_ids.push(productionSchedule);
+        }
+    }
+
+    /**
+     * Load the next rows when the rows are loaded while scrolling. The rows
+     * are searched after the key of the last loaded row.
+     * @return {Promise}
+     */
+    async loadMore() {
+        if (!this.data || !this.data.virtual_scrolling || !this.data.next || this.loadingMore) {
+            return;
+        }
+        this.loadingMore = true;
+        try {
+            const rows = await this.orm.call(
+                'mrp.production.schedule',
+                'get_mps_rows',
+                [this.domain, this.data.next, this.limit],
+            );
+            const loadedIds = new Set(this.data.production_schedule_ids.map(ps => ps.id));
+            for (const productionSchedule of rows.production_schedule_ids) {
+                if (!loadedIds.has(productionSchedule.id)) {
+                    this.data.production_schedule_ids.push(productionSchedule);
+                }
+            }
+            this.data.next = rows.next;
+        } finally {
+            this.loadingMore = false;
+        }
+        this.trigger('update');
+    }
+
     async reload(productionScheduleId) {
         return await this.orm.call(
             'mrp.production.schedule',
@@ -47,18 +119,47 @@ export class MasterProductionScheduleModel extends EventBus {
                 [productionScheduleIds],
             );
         }).then((production_schedule_ids) => {
-            for (var i = 0; i < production_schedule_ids.length; i++) {
-                const index = this.data.production_schedule_ids.findIndex(ps => ps.id === production_schedule_ids[i].id);
-                if (index >= 0) {
-                    this.data.production_schedule_ids.splice(index, 1, production_schedule_ids[i]);
-                } else {
-                    this.data.production_schedule_ids.push(production_schedule_ids[i]);
-                }
+            for (const productionSchedule of production_schedule_ids) {
+                this._setScheduleState(productionSchedule);
             }
             this.notify();
         });
     }
 
+    /**
+     * Save a cell and patch only the values that changed on the current
+     * schedule and on the schedules linked to it by BoM.
+     * @private
+     * @param {Integer} productionScheduleId mrp.production.schedule Id.
+     * @param {Integer} dateIndex period to save (column number)
+     * @param {String} fieldName 'forecast_qty', 'replenish_qty' or
+     * 'remove_replenish_qty'
+     * @param {Float} quantity The new quantity
+     * @return {Promise}
+     */
+    async _saveCell(productionScheduleId, dateIndex, fieldName, quantity = 0) {
+        const loadedIds = this.data.production_schedule_ids.map(ps => ps.id);
+        const loadedState = this.data.production_schedule_ids.find(ps => ps.id === productionScheduleId);
+        const changes = await this.orm.call(
+            'mrp.production.schedule',
+            'update_forecast_cell',
+            [productionScheduleId, dateIndex, fieldName, quantity, this.domain, loadedIds, loadedState || false],
+        );
+        for (const change of changes) {
+            if (change.state) {
+                this._setScheduleState(change.state);
+                continue;
+            }
+            const index = this.data.production_schedule_ids.findIndex(ps => ps.id === change.id);
+            const productionSchedule = this.data.production_schedule_ids[index];
+            Object.assign(productionSchedule, change.values);
+            for (const forecast of change.forecast_ids) {
+                Object.assign(productionSchedule.forecast_ids[forecast.index], forecast.values);
+            }
+        }
+        this.notify();
+    }
+
     notify() {
         this.unselectAll();
         this.trigger('update');
@@ -80,7 +181,10 @@ export class MasterProductionScheduleModel extends EventBus {
                 'mrp.production.schedule',
                 'action_replenish',
                 [productionScheduleIds, basedOnLeadTime],
-            ).then(() => {
+            ).then((action) => {
+                if (action) {
+                    this.action.doAction(action);
+                }
                 if (productionScheduleIds.length === 1) {
                     this.reload(productionScheduleIds[0]);
                 } else {
@@ -90,10 +194,71 @@ export class MasterProductionScheduleModel extends EventBus {
         });
     }
 
+    /**
+     * Replenish all the schedules under the current domain. The server could
+     * run it in background, in which case its progress is polled until the
+     * end before reloading the content.
+     * @return {Promise}
+     */
     replenishAll() {
-        this.orm.search("mrp.production.schedule", this.domain).then((ids) => {
-            this._actionReplenish(ids, true);
+        return this.mutex.exec(async () => {
+            const result = await this.orm.call(
+                'mrp.production.schedule',
+                'action_replenish_all',
+                [this.domain, true],
+            );
+            if (result.action) {
+                this.action.doAction(result.action);
+            }
+            if (result.job_id) {
+                this._pollReplenishJob(result.job_id);
+            } else {
+                this.load();
+            }
+        });
+    }
+
+    /**
+     * Display the progress of a background replenishment and reload the
+     * content once it's done. The polling stops when the view is closed, or
+     * after REPLENISH_JOB_POLL_ATTEMPTS reads.
+     * @private
+     * @param {Integer} jobId mrp.mps.replenish.job Id.
+     * @param {Integer} attempt number of the read
+     */
+    async _pollReplenishJob(jobId, attempt = 1) {
+        this.replenishJobTimeout = null;
+        const status = await this.orm.call('mrp.mps.replenish.job', 'get_status', [jobId]);
+        if (this.isDestroyed) {
+            return;
+        }
+        if (this.closeReplenishNotification) {
+            this.closeReplenishNotification();
+        }
+        const message = sprintf(
+            _t("%s/%s schedules replenished, %s failed (%s manufacturing orders, %s purchase order lines)."),
+            status.done_count, status.total_count, status.failed_count,
+            status.production_count, status.purchase_count,
+        );
+        const failed = status.state === 'failed';
+        const done = status.state === 'done' || failed;
+        this.closeReplenishNotification = this.notification.add(failed ? status.error_log : message, {
+            title: failed ? _t("Replenishment failed") : done ? _t("Replenishment done") : _t("Replenishment in progress"),
+            type: failed ? 'danger' : done && status.failed_count ? 'warning' : 'info',
+            sticky: !done || failed || Boolean(status.failed_count),
         });
+        if (done) {
+            this.closeReplenishNotification = null;
+            this.load();
+        } else if (attempt < REPLENISH_JOB_POLL_ATTEMPTS) {
+            this.replenishJobTimeout = setTimeout(() => this._pollReplenishJob(jobId, attempt + 1), REPLENISH_JOB_POLL_DELAY);
+        } else {
+            this.closeReplenishNotification();
+            this.closeReplenishNotification = null;
+            this.notification.add(_t("The replenishment is still running, reload the page to see its result."), {
+                type: 'warning',
+            });
+        }
     }
 
     replenishSelectedRecords() {
@@ -113,13 +278,7 @@ export class MasterProductionScheduleModel extends EventBus {
      */
     _saveForecast(productionScheduleId, dateIndex, forecastQty) {
         return this.mutex.exec(() => {
-            this.orm.call(
-                'mrp.production.schedule',
-                'set_forecast_qty',
-                [productionScheduleId, dateIndex, forecastQty],
-            ).then(() => {
-                return this.reload(productionScheduleId);
-            });
+            return this._saveCell(productionScheduleId, dateIndex, 'forecast_qty', forecastQty);
         });
     }
 
@@ -228,13 +387,7 @@ export class MasterProductionScheduleModel extends EventBus {
      */
     _saveToReplenish(productionScheduleId, dateIndex, replenishQty) {
         return this.mutex.exec(() => {
-            this.orm.call(
-                'mrp.production.schedule',
-                'set_replenish_qty',
-                [productionScheduleId, dateIndex, replenishQty],
-            ).then(() => {
-                return this.reload(productionScheduleId);
-            });
+            return this._saveCell(productionScheduleId, dateIndex, 'replenish_qty', replenishQty);
         });
     }
 
@@ -247,13 +400,7 @@ export class MasterProductionScheduleModel extends EventBus {
      */
     _removeQtyToReplenish(productionScheduleId, dateIndex) {
         return this.mutex.exec(() => {
-            this.orm.call(
-                'mrp.production.schedule',
-                'remove_replenish_qty',
-                [productionScheduleId, dateIndex]
-            ).then(() => {
-                return this.reload(productionScheduleId);
-            });
+            return this._saveCell(productionScheduleId, dateIndex, 'remove_replenish_qty');
         });
     }
 
@@ -1,11 +1,20 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
+import copy
+from collections import namedtuple
 from datetime import date, datetime, timedelta
+from unittest import skipIf
+from unittest.mock import patch
 from odoo.tests import common, Form
 from odoo import Command
 from odoo.tools.date_utils import start_of
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class TestMpsMps(common.TransactionCase):
 
@@ -515,6 +524,89 @@ class TestMpsMps(common.TransactionCase):
         wood_forecast_1 = mps_wood['forecast_ids'][0]
         self.assertEqual(wood_forecast_1['indirect_demand_qty'], 4)
 
+    def test_low_level_codes(self):
+        """ Each product gets the deepest BoM level where it's used and the
+        schedules are ordered by level.
+        """
+        indirect_demand_trees = self.mps._get_indirect_demand_tree()
+        low_level_codes = self.mps._get_low_level_codes(indirect_demand_trees)
+        self.assertEqual(low_level_codes[self.table], 0)
+        self.assertEqual(low_level_codes[self.wardrobe], 0)
+        self.assertEqual(low_level_codes[self.drawer], 1)
+        self.assertEqual(low_level_codes[self.table_leg], 2)
+        self.assertEqual(low_level_codes[self.screw], 3)
+        order = self.mps._get_indirect_demand_order(indirect_demand_trees)
+        self.assertEqual(order[-1], self.mps_screw)
+        self.assertLess(order.ids.index(self.mps_drawer.id), order.ids.index(self.mps_table_leg.id))
+
+    def test_indirect_demand_ratio_matrix(self):
+        """ The ratios between the schedules go through the BoM levels without
+        schedule.
+        """
+        ratio_mps = self.mps._get_indirect_demand_ratio_mps()
+        self.assertEqual(ratio_mps[(self.warehouse, self.table)], {self.drawer: 1, self.table_leg: 2})
+        self.assertEqual(ratio_mps[(self.warehouse, self.drawer)], {self.screw: 4, self.table_leg: 2})
+
+        self.mps_table_leg.unlink()
+        mps = self.mps.exists()
+        ratio_mps = mps._get_indirect_demand_ratio_mps()
+        self.assertEqual(ratio_mps[(self.warehouse, self.table)], {self.drawer: 1, self.screw: 8})
+        self.assertEqual(ratio_mps[(self.warehouse, self.drawer)], {self.screw: 12})
+
+    def test_indirect_demand_lines(self):
+        """ Only the BoMs reachable from the schedules are explored, and the
+        lines follow the modifications of the BoMs.
+        """
+        Schedule = self.env['mrp.production.schedule']
+        lines = Schedule._get_indirect_demand_lines(self.drawer)
+        self.assertEqual(set(lines), {self.drawer.id, self.table_leg.id, self.screw.id, self.bolt.id})
+        self.assertEqual(dict(lines[self.drawer.id]), {self.table_leg.id: 2, self.screw.id: 4})
+
+        self.bom_drawer.bom_line_ids.filtered(lambda line: line.product_id == self.screw).product_qty = 5
+        self.assertEqual(dict(Schedule._get_indirect_demand_lines(self.drawer)[self.drawer.id]), {self.table_leg.id: 2, self.screw.id: 5})
+        ratio_mps = self.mps_drawer._get_indirect_demand_ratio_mps()
+        self.assertEqual(ratio_mps[(self.warehouse, self.drawer)], {self.screw: 5, self.table_leg: 2})
+
+        # Reordering the BoMs changes the BoM found for the product.
+        self.bom_drawer.sequence = 5
+        bom = self.env['mrp.bom'].create({
+            'product_tmpl_id': self.drawer.product_tmpl_id.id,
+            'product_qty': 1,
+            'sequence': 10,
+            'bom_line_ids': [Command.create({'product_id': self.screw.id, 'product_qty': 3})],
+        })
+        self.assertEqual(dict(Schedule._get_indirect_demand_lines(self.drawer)[self.drawer.id]), {self.table_leg.id: 2, self.screw.id: 5})
+        bom.sequence = 1
+        self.assertEqual(dict(Schedule._get_indirect_demand_lines(self.drawer)[self.drawer.id]), {self.screw.id: 3})
+
+    def test_recursive_low_level_codes(self):
+        """ The products of recursive BoMs get the last level instead of
+        failing all the schedules.
+        """
+        Node = namedtuple('Node', ['product', 'ratio', 'children'])
+        drawer_children, table_leg_children = [], []
+        drawer_children.append(Node(self.table_leg, 2, table_leg_children))
+        table_leg_children.append(Node(self.drawer, 1, drawer_children))
+        table_children = [Node(self.drawer, 1, drawer_children), Node(self.screw, 4, [])]
+        trees = [Node(self.table, 1, table_children)]
+        with self.assertLogs('odoo.addons.mrp_mps.models.mrp_mps', level='WARNING'):
+            low_level_codes = self.mps_table._get_low_level_codes(trees)
+        self.assertEqual(low_level_codes[self.table], 0)
+        self.assertEqual(low_level_codes[self.screw], 1)
+        self.assertEqual(low_level_codes[self.drawer], 2)
+        self.assertEqual(low_level_codes[self.table_leg], 2)
+
+    def test_bom_graph_version(self):
+        """ Modifying a BoM outdates the BoM graph without clearing the caches
+        of the registry.
+        """
+        Invalidation = self.env['mrp.mps.bom.graph.invalidation']
+        version = Invalidation._get_version()
+        with patch.object(type(self.env['mrp.production.schedule']), 'clear_caches') as clear_caches:
+            self.bom_drawer.bom_line_ids.filtered(lambda line: line.product_id == self.screw).product_qty = 5
+        clear_caches.assert_not_called()
+        self.assertGreater(Invalidation._get_version(), version)
+
     def test_impacted_schedule(self):
         impacted_schedules = self.mps_screw.get_impacted_schedule()
         self.assertEqual(sorted(impacted_schedules), sorted((self.mps - self.mps_screw).ids))
@@ -727,6 +819,51 @@ class TestMpsMps(common.TransactionCase):
         self.assertEqual(len(mps_impacted), 1)
         self.assertEqual(mps_impacted[0], mps_c2.id)
 
+    def test_impacted_schedule_variant_bom(self):
+        """ A BoM of a variant impacts the schedules of all the variants of
+        its template from its components, as well as the variants created
+        later.
+        """
+        size_attribute = self.env['product.attribute'].create({'name': 'Size', 'sequence': 4})
+        self.env['product.attribute.value'].create([{
+            'name': name,
+            'attribute_id': size_attribute.id,
+            'sequence': 1,
+        } for name in ('M', 'L', 'XL')])
+        product = self.env['product.product'].create({
+            'name': 'Shelf',
+            'type': 'product',
+        })
+        product_template = product.product_tmpl_id
+        self.env['product.template.attribute.line'].create({
+            'product_tmpl_id': product_template.id,
+            'attribute_id': size_attribute.id,
+            'value_ids': [(6, 0, size_attribute.value_ids[:2].ids)]
+        })
+        variant_m, variant_l = product_template.product_variant_ids
+        self.env['mrp.bom'].create({
+            'product_tmpl_id': product_template.id,
+            'product_id': variant_m.id,
+            'product_qty': 1.0,
+            'type': 'normal',
+            'bom_line_ids': [Command.create({'product_id': self.bolt.id, 'product_qty': 1})],
+        })
+        mps_bolt, mps_m, mps_l = self.env['mrp.production.schedule'].create([{
+            'product_id': product.id,
+            'warehouse_id': self.warehouse.id,
+        } for product in (self.bolt | variant_m | variant_l).ids])
+        impacted_schedules = mps_bolt.get_impacted_schedule()
+        self.assertIn(mps_m.id, impacted_schedules)
+        self.assertIn(mps_l.id, impacted_schedules)
+
+        product_template.attribute_line_ids.value_ids = size_attribute.value_ids
+        variant_xl = product_template.product_variant_ids - variant_m - variant_l
+        mps_xl = self.env['mrp.production.schedule'].create({
+            'product_id': variant_xl.id,
+            'warehouse_id': self.warehouse.id,
+        })
+        self.assertIn(mps_xl.id, mps_bolt.get_impacted_schedule())
+
     def test_outgoing_move_with_different_uom(self):
         """
         Test that the outgoing and incoming quantities are computed in the product's UoM.
@@ -773,3 +910,325 @@ class TestMpsMps(common.TransactionCase):
                 self.env.company.with_user(dummy).write({fname: not self.env.company[fname]})
         # no access errors
         self.assertTrue(True)
+
+    def test_grouped_aggregates(self):
+        """ Aggregating the incoming and outgoing quantities with grouped SQL
+        queries gives the same result as browsing the moves and RFQ lines,
+        including the delay of the destination moves.
+        """
+        self.warehouse.manufacture_steps = 'pbm_sam'
+        self.table_leg.write({
+            'route_ids': [(6, 0, [self.ref('mrp.route_warehouse0_manufacture')])]
+        })
+        self.warehouse.pbm_route_id.rule_ids.delay = 1
+        self.env['mrp.product.forecast'].create({
+            'production_schedule_id': self.mps_table_leg.id,
+            'date': date.today(),
+            'forecast_qty': 25
+        })
+        self.mps_table_leg.action_replenish()
+
+        def _non_zero(quantities):
+            return {key: qty for key, qty in quantities.items() if qty}
+
+        date_range = self.env.company._get_date_range()
+        incoming_qty = [_non_zero(qty) for qty in self.mps._get_incoming_qty(date_range)]
+        outgoing_qty = [_non_zero(qty) for qty in self.mps._get_outgoing_qty(date_range)]
+        self.env['ir.config_parameter'].sudo().set_param('mrp_mps.use_sql_aggregates', True)
+        self.assertEqual([_non_zero(qty) for qty in self.mps._get_incoming_qty(date_range)], incoming_qty)
+        self.assertEqual([_non_zero(qty) for qty in self.mps._get_outgoing_qty(date_range)], outgoing_qty)
+
+    def test_demand_history(self):
+        """ The actual demand of the closed periods of the previous years is
+        stored by the cron and read by the MPS instead of the moves.
+        """
+        self.env.company.mrp_mps_show_actual_demand_year_minus_1 = True
+        date_range_year_minus_1 = self.env.company._get_date_range(years=1)
+        self.env['stock.quant']._update_available_quantity(self.screw, self.warehouse.lot_stock_id, 10)
+        move = self.env['stock.move'].create({
+            'name': self.screw.name,
+            'product_id': self.screw.id,
+            'product_uom_qty': 10,
+            'product_uom': self.screw.uom_id.id,
+            'location_id': self.warehouse.lot_stock_id.id,
+            'location_dest_id': self.env.ref('stock.stock_location_customers').id,
+        })
+        move._action_confirm()
+        move._action_assign()
+        move.quantity_done = 10
+        move._action_done()
+        move.date = datetime.combine(date_range_year_minus_1[0][0], datetime.min.time())
+
+        History = self.env['mrp.mps.demand.history']
+        History._cron_update_history()
+        history = History.search([
+            ('product_id', '=', self.screw.id),
+            ('warehouse_id', '=', self.warehouse.id),
+            ('date_start', '=', date_range_year_minus_1[0][0]),
+        ])
+        self.assertEqual(history.outgoing_qty, 10)
+        self.assertFalse(History.check_history())
+
+        state = self.mps_screw.get_production_schedule_view_state()[0]
+        self.assertEqual(state['forecast_ids'][0]['outgoing_qty_year_minus_1'], 10)
+
+        # The MPS reads the stored value, the moves are not searched again.
+        history.outgoing_qty = 4
+        state = self.mps_screw.get_production_schedule_view_state()[0]
+        self.assertEqual(state['forecast_ids'][0]['outgoing_qty_year_minus_1'], 4)
+        self.assertTrue(History.check_history())
+        History.rebuild_history()
+        self.assertFalse(History.check_history())
+
+        # A modified rule removes the history, computed again by the cron.
+        self.warehouse.delivery_route_id.rule_ids[:1].delay = 1
+        self.assertFalse(History.search([('product_id', '=', self.screw.id)]))
+        History._cron_update_history()
+        self.assertFalse(History.check_history())
+
+    def test_update_forecast_cell(self):
+        """ Saving a cell returns only the values that changed, and applying
+        them on the previous states gives the states computed from scratch.
+        """
+        states = {state['id']: state for state in self.mps.get_production_schedule_view_state()}
+        changes = self.mps_table.update_forecast_cell(2, 'forecast_qty', 5, loaded_ids=self.mps.ids)
+        self.assertFalse(any('state' in change for change in changes))
+        self.assertIn(self.mps_table.id, [change['id'] for change in changes])
+        for change in changes:
+            states[change['id']].update(change['values'])
+            for forecast in change['forecast_ids']:
+                self.assertGreaterEqual(forecast['index'], 0)
+                states[change['id']]['forecast_ids'][forecast['index']].update(forecast['values'])
+        for state in self.mps.get_production_schedule_view_state():
+            self.assertEqual(states[state['id']], state)
+
+        # The state loaded by the client is the previous state of the schedule
+        # and the stored indirect demand is written from the new states.
+        self.env['ir.config_parameter'].sudo().set_param('mrp_mps.stored_indirect_demand', True)
+        # The stored indirect demand is only read with a single company.
+        IndirectDemand = self.env['mrp.mps.indirect.demand'].with_context(allowed_company_ids=self.env.company.ids)
+        IndirectDemand._update_indirect_demand(self.mps)
+        changes = self.mps_table.update_forecast_cell(1, 'replenish_qty', 12, loaded_ids=self.mps.ids, loaded_state=states[self.mps_table.id])
+        for change in changes:
+            states[change['id']].update(change['values'])
+            for forecast in change['forecast_ids']:
+                states[change['id']]['forecast_ids'][forecast['index']].update(forecast['values'])
+        date_range = self.env.company._get_date_range()
+        stored_indirect_demand = IndirectDemand._get_indirect_demand(self.mps, date_range)
+        for state in self.mps.get_production_schedule_view_state():
+            self.assertEqual(states[state['id']], state)
+            self.assertEqual(stored_indirect_demand[state['id']], [forecast['indirect_demand_qty'] for forecast in state['forecast_ids']])
+
+        # A wrong state sent by the client is never stored.
+        loaded_state = copy.deepcopy(states[self.mps_table.id])
+        for forecast in loaded_state['forecast_ids']:
+            forecast['replenish_qty'] += 100
+        self.mps_table.update_forecast_cell(3, 'forecast_qty', 2, loaded_ids=self.mps.ids, loaded_state=loaded_state)
+        stored_indirect_demand = IndirectDemand._get_indirect_demand(self.mps, date_range)
+        for state in self.mps.get_production_schedule_view_state():
+            self.assertEqual(stored_indirect_demand[state['id']], [forecast['indirect_demand_qty'] for forecast in state['forecast_ids']])
+
+        # A schedule not loaded by the client gets its whole state.
+        changes = self.mps_table.update_forecast_cell(2, 'replenish_qty', 8, loaded_ids=[])
+        self.assertTrue(all('state' in change for change in changes))
+
+    @skipIf(numpy is None, 'NumPy is not installed')
+    def test_numpy_projection(self):
+        """ The forecast cells computed with NumPy level by level are the same
+        as the ones computed cell by cell.
+        """
+        self.mps_table.write({'forecast_target_qty': 3, 'min_to_replenish_qty': 2, 'max_to_replenish_qty': 40})
+        self.mps_table_leg.forecast_target_qty = 7.5
+        self.env['mrp.product.forecast'].create([{
+            'production_schedule_id': self.mps_table.id,
+            'date': date.today() + timedelta(days=31 * i),
+            'forecast_qty': 17.3 * i,
+        } for i in range(4)])
+        self.mps_screw.set_replenish_qty(2, 55)
+        self.env['stock.quant']._update_available_quantity(self.table_leg, self.warehouse.lot_stock_id, 12)
+
+        states = self.mps.get_production_schedule_view_state()
+        self.env['ir.config_parameter'].sudo().set_param('mrp_mps.use_numpy_projection', True)
+        self.assertEqual(self.mps.get_production_schedule_view_state(), states)
+
+    def test_indirect_demand_by_schedule(self):
+        """ The indirect demand computed alone is the one of the full state
+        and the components are yielded after the schedules using them.
+        """
+        self.mps_table.write({'forecast_target_qty': 3, 'min_to_replenish_qty': 2})
+        self.env['mrp.product.forecast'].create([{
+            'production_schedule_id': self.mps_table.id,
+            'date': date.today() + timedelta(days=31 * i),
+            'forecast_qty': 17.3 * i,
+        } for i in range(4)])
+        self.mps_screw.set_replenish_qty(2, 55)
+
+        states = {state['id']: state for state in self.mps.get_production_schedule_view_state()}
+        indirect_demand = list(self.mps._get_indirect_demand_by_schedule())
+        self.assertEqual(len(indirect_demand), len(self.mps))
+        for production_schedule, quantities in indirect_demand:
+            self.assertEqual(quantities, [forecast['indirect_demand_qty'] for forecast in states[production_schedule.id]['forecast_ids']])
+        computed = [production_schedule for production_schedule, quantities in indirect_demand]
+        self.assertLess(computed.index(self.mps_table), computed.index(self.mps_table_leg))
+        self.assertLess(computed.index(self.mps_table_leg), computed.index(self.mps_screw))
+
+    def test_view_state_cache(self):
+        """ The cached states are the computed ones and the states of the
+        components are computed again when a forecast of a finished product is
+        modified.
+        """
+        self.env['ir.config_parameter'].sudo().set_param('mrp_mps.view_state_cache', True)
+        states = self.mps.get_production_schedule_view_state()
+        self.assertEqual(states, self.mps._get_production_schedule_view_state())
+        screw_version = self.mps_screw.state_version
+
+        self.mps_table.set_forecast_qty(0, 2)
+        self.assertGreater(self.mps_screw.state_version, screw_version)
+        states = self.mps.get_production_schedule_view_state()
+        self.assertEqual(states, self.mps._get_production_schedule_view_state())
+        screw_state = next(state for state in states if state['id'] == self.mps_screw.id)
+        self.assertEqual(screw_state['forecast_ids'][0]['indirect_demand_qty'], 40)
+
+        # Only the states of a committed transaction are kept by the worker.
+        store = self.env['mrp.production.schedule']._get_view_state_store()
+        store_key = (self.mps_screw.id, self.mps_screw.state_version, self.mps_screw._get_view_state_cache_key())
+        self.assertNotIn(store_key, store)
+        self.env.cr.postcommit.run()
+        self.assertEqual(store[store_key], screw_state)
+
+    def test_virtual_scrolling(self):
+        """ The rows loaded while scrolling follow each other without gap nor
+        duplicate.
+        """
+        self.env['ir.config_parameter'].sudo().set_param('mrp_mps.virtual_scrolling', True)
+        domain = [('id', 'in', self.mps.ids)]
+        mps_view_state = self.env['mrp.production.schedule'].get_mps_view_state(domain, 0, 4)
+        self.assertEqual(mps_view_state['count'], len(self.mps))
+        loaded_ids = [state['id'] for state in mps_view_state['production_schedule_ids']]
+        self.assertEqual(len(loaded_ids), 4)
+        rows = self.env['mrp.production.schedule'].get_mps_rows(domain, mps_view_state['next'], 4)
+        loaded_ids += [state['id'] for state in rows['production_schedule_ids']]
+        self.assertFalse(rows['next'])
+        expected = self.mps.sorted(lambda mps: (mps.warehouse_id.id, mps.product_id.id))
+        self.assertEqual(loaded_ids, expected.ids)
+
+        # Loading the view again keeps the rows loaded while scrolling, and the
+        # count follows the new schedules.
+        new_mps = self.env['mrp.production.schedule'].create({
+            'product_id': self.bolt.id,
+            'warehouse_id': self.warehouse.id,
+        })
+        domain = [('id', 'in', (self.mps | new_mps).ids)]
+        mps_view_state = self.env['mrp.production.schedule'].get_mps_view_state(domain, 0, 4, until=mps_view_state['next'])
+        self.assertEqual(mps_view_state['count'], len(self.mps) + 1)
+        self.assertEqual([state['id'] for state in mps_view_state['production_schedule_ids']], loaded_ids[:4])
+
+    def test_stored_indirect_demand(self):
+        """ The stored indirect demand gives the same states, is updated when
+        a cell is modified and is not used anymore once outdated.
+        """
+        self.env['ir.config_parameter'].sudo().set_param('mrp_mps.stored_indirect_demand', True)
+        # The stored indirect demand is only read with a single company.
+        IndirectDemand = self.env['mrp.mps.indirect.demand'].with_context(allowed_company_ids=self.env.company.ids)
+        IndirectDemand._update_indirect_demand(self.mps)
+        self.mps_table.set_forecast_qty(0, 2)
+        date_range = self.env.company._get_date_range()
+        self.assertEqual(len(IndirectDemand._get_indirect_demand(self.mps, date_range)), len(self.mps))
+        states = self.mps_screw.get_production_schedule_view_state()
+        self.assertEqual(states[0]['forecast_ids'][0]['indirect_demand_qty'], 40)
+        self.env['ir.config_parameter'].sudo().set_param('mrp_mps.stored_indirect_demand', False)
+        self.assertEqual(states, self.mps_screw.get_production_schedule_view_state())
+        self.env['ir.config_parameter'].sudo().set_param('mrp_mps.stored_indirect_demand', True)
+
+        # Only the changed periods of the components are written again.
+        rows = IndirectDemand.search([('production_schedule_id', 'in', self.mps.ids)])
+        self.mps_table.set_forecast_qty(0, 3)
+        self.assertEqual(IndirectDemand.search([('production_schedule_id', 'in', self.mps.ids)]), rows)
+        self.assertEqual(len(IndirectDemand._get_indirect_demand(self.mps, date_range)), len(self.mps))
+        self.assertEqual(self.mps_screw.get_production_schedule_view_state()[0]['forecast_ids'][0]['indirect_demand_qty'], 60)
+
+        # A modified BoM outdates the indirect demand of its components.
+        self.bom_drawer.bom_line_ids.filtered(lambda line: line.product_id == self.screw).product_qty = 5
+        self.assertFalse(IndirectDemand._get_indirect_demand(self.mps_screw, date_range))
+        self.assertTrue(IndirectDemand._get_indirect_demand(self.mps_table, date_range))
+
+        self.mps_table.set_forecast_qty(0, 3)
+        self.mps_table.forecast_target_qty = 1
+        self.assertFalse(IndirectDemand._get_indirect_demand(self.mps_screw, date_range))
+
+    def test_replenish_chunks(self):
+        """ With a small `mrp_mps.replenish_chunk_size`, a failing chunk is
+        rolled back and reported without canceling the other chunks, whatever
+        the error.
+        """
+        mps_dates = self.env.company._get_date_range()
+        production_schedules = self.mps_screw | self.mps_table_leg | self.mps_drawer
+        self.env['mrp.product.forecast'].create([{
+            'production_schedule_id': mps.id,
+            'date': mps_dates[0][0],
+            'forecast_qty': 100
+        } for mps in production_schedules])
+        partner = self.env['res.partner'].create({
+            'name': 'Jhon'
+        })
+        self.screw.seller_ids = [(0, 0, {
+            'partner_id': partner.id,
+            'price': 12.0,
+            'delay': 0
+        })]
+
+        ProcurementGroup = type(self.env['procurement.group'])
+        run = ProcurementGroup.run
+
+        def run_failing(group, procurements, raise_user_error=True):
+            if any(procurement.product_id == self.drawer for procurement in procurements):
+                raise ValueError('Drawer procurement failure')
+            return run(group, procurements, raise_user_error=raise_user_error)
+
+        self.env['ir.config_parameter'].sudo().set_param('mrp_mps.replenish_chunk_size', 1)
+        progress = []
+        with patch.object(ProcurementGroup, 'run', run_failing):
+            # The table leg fails with a UserError (no route), the drawer with
+            # an unexpected error.
+            action = production_schedules._replenish(progress_callback=lambda done, total: progress.append((done, total)))
+        self.assertEqual(progress, [(1, 3), (2, 3), (3, 3)])
+        self.assertEqual(action['params']['type'], 'warning')
+        self.assertIn('Drawer procurement failure', action['params']['message'])
+        self.assertIn(self.table_leg.display_name, action['params']['message'])
+        self.assertTrue(self.env['purchase.order.line'].search([('product_id', '=', self.screw.id)]))
+        self.assertTrue(self.mps_screw.forecast_ids.procurement_launched)
+        self.assertFalse(self.mps_table_leg.forecast_ids.procurement_launched)
+        self.assertFalse(self.mps_drawer.forecast_ids.procurement_launched)
+
+    def test_replenish_job(self):
+        """ A background replenishment skips the schedules failing to
+        replenish without canceling the others.
+        """
+        mps_dates = self.env.company._get_date_range()
+        self.env['mrp.product.forecast'].create([{
+            'production_schedule_id': mps.id,
+            'date': mps_dates[0][0],
+            'forecast_qty': 100
+        } for mps in self.mps_screw | self.mps_table_leg])
+        partner = self.env['res.partner'].create({
+            'name': 'Jhon'
+        })
+        self.screw.seller_ids = [(0, 0, {
+            'partner_id': partner.id,
+            'price': 12.0,
+            'delay': 0
+        })]
+
+        self.env['ir.config_parameter'].sudo().set_param('mrp_mps.replenish_all_in_background', True)
+        result = self.env['mrp.production.schedule'].action_replenish_all([('id', 'in', (self.mps_screw | self.mps_table_leg).ids)])
+        job = self.env['mrp.mps.replenish.job'].browse(result['job_id'])
+        self.assertEqual(job.state, 'pending')
+        job._process()
+        status = job.get_status()
+        self.assertEqual(status['state'], 'done')
+        self.assertEqual(status['total_count'], 2)
+        self.assertEqual(status['done_count'], 1)
+        self.assertEqual(status['failed_count'], 1)
+        self.assertEqual(status['purchase_count'], 1)
+        self.assertIn(self.table_leg.display_name, status['error_log'])
+        self.assertEqual(self.env['purchase.order.line'].search([('product_id', '=', self.screw.id)]).mps_replenish_job_id, job)